@@ -4,9 +4,10 @@ These is the implementation for the matches in House of Bamzy
 """
 
 from .abstract import BaseIndividualMatch, BaseQuestion
+from .scoring import ScoreTable, ScoringRules
 from dataclasses import dataclass, field
 from collections.abc import Sequence
-from datetime import datetime, timedelta
+from datetime import timedelta
 from logging import Logger
 
 @dataclass(frozen=True)
@@ -56,68 +57,35 @@ class HouseBamzyMatch(BaseIndividualMatch):
         self.RecessDuration:float = 120.0  # in seconds
         self.PPW:float = 50.0 # Points Per Win
         self.W2S:float = 5.0 # Within 2 Seconds Bonus
+        self.scoring:ScoreTable = self._scoring_rules().compile()
     
     def _pause_match(self):
         return super()._pause_match(recess=self.RecessDuration)
     
-    def _add_bonus_points(self, score_info:MultiChoiceQuestion.Answer, points:float=0.0):
-        # according to Bamzy's specs, answers received within 2 seconds get 5 bonus points
-        if not score_info:
-            return points
-        question = self.current_question
-        if not question:
-            return points
-        question_sent_date = question.sendDate
-        if isinstance(question_sent_date, datetime):
-            time_taken = (score_info.time_received - question_sent_date).total_seconds()
-            if time_taken <= 2:
-                points += self.W2S
-        return points
-    
-    def _add_bonus_points_to_away(self, score_info:MultiChoiceQuestion.Answer, points:float=0.0):
-        points = self._add_bonus_points(score_info, points)
-        super()._add_bonus_points_to_away(score_info, points)
-    
-    def _add_bonus_points_to_home(self, score_info:MultiChoiceQuestion.Answer, points:float=0.0):
-        points = self._add_bonus_points(score_info, points)
-        super()._add_bonus_points_to_home(score_info, points)
-     
+    def _scoring_rules(self) -> ScoringRules:
+        # according to Bamzy's specs, answers received within 2 seconds get W2S bonus points, the third goal in a
+        # row by the same player counts double and the fourth triple, after which the streak starts over
+        return ScoringRules(multipliers=((3, 2), (4, 3)), streak_reset=4,
+                            time_bonuses=((2.0, self.W2S),), carry_points=True)
+
+    def _update_match(self, **kwargs):
+        msg = super()._update_match(**kwargs)
+        if 'W2S' in kwargs:
+            self.scoring = self._scoring_rules().compile()
+        return msg
+
+    def __setstate__(self, state:dict):
+        super().__setstate__(state)
+        if 'scoring' not in state:
+            self.scoring = self._scoring_rules().compile()
+
     def _record_correct_answers(self, correct_answers:list[MultiChoiceQuestion.Answer], points=0.0) -> None:
         if self.state != 2:
             raise ValueError("Match is not active")
         question = self.current_question
         if not question:
             raise ValueError("No current question to record answers for")
-        temp_scorers = self.scorers.copy()[::-1]  # Reverse copy for latest first
-        consecutive_goals = 1
-        for scorer_info in correct_answers:
-            for scorer in temp_scorers:
-                name = scorer.player_info.get('user_name', '')
-                if name == scorer_info.player_info.get('user_name', '') and name != '':
-                    consecutive_goals += 1
-                else:
-                    break
-            affiliation = scorer_info.player_info.get('user_affiliation', '')
-            if affiliation == self.home_team:
-                if consecutive_goals < 3:
-                    points = points or question.points
-                elif consecutive_goals == 3:
-                    points = (points or question.points) * 2
-                elif consecutive_goals >= 4:
-                    points = (points or question.points) * 3
-                    consecutive_goals = 1  # reset after hat-trick
-                self._home_team_scores(scorer_info, points)
-            elif affiliation == self.away_team:
-                if consecutive_goals < 3:
-                    points = points or question.points
-                elif consecutive_goals == 3:
-                    points = (points or question.points) * 2
-                elif consecutive_goals >= 4:
-                    points = (points or question.points) * 3
-                    consecutive_goals = 1  # reset after hat-trick
-                self._away_team_scores(scorer_info, points or question.points)
-            else:
-                continue
+        self.scoring.record(self, question, correct_answers, points)
         self._prep_current_question()
         self.current_answers = {}
 
@@ -136,16 +104,11 @@ class HouseBamzyMatch(BaseIndividualMatch):
         ans = sorted_correct[0] if sorted_correct else None # First correct answer only
         return [ans] if ans else []
 
-    def _fetch_questions_from_bank(self):
-        if self.state != 1:
-            raise ValueError("Match must be in 'standby' to fetch questions")
+    def _build_question(self, tpq:tuple[float, ...], per_tpq:int, position:int) -> MultiChoiceQuestion:
         # Placeholder: In real implementation, fetch from a question bank
-        questions = self.questions[0] # reference to unused questions, not a copy
-        for i, tpqpr in enumerate(self.tpq): # time per question per round
-            for j in range(self.rounds * self.qpr):
-                question = MultiChoiceQuestion(
-                    question_id = f"q-{i+1}-{j+1}", text = f"Sample question {i+1}?", points = 1,
-                    options = [f"Option {j+1}" for j in range(4)], correct_option = 0,
-                    sendDate=None, duration=timedelta(seconds=tpqpr)
-                )
-                questions.append(question)
+        i, j = divmod(position, per_tpq)
+        return MultiChoiceQuestion(
+            question_id = f"q-{i+1}-{j+1}", text = f"Sample question {i+1}?", points = 1,
+            options = [f"Option {k+1}" for k in range(4)], correct_option = 0,
+            sendDate=None, duration=timedelta(seconds=tpq[i])
+        )
@@ -1,8 +1,9 @@
 # adapters/__init__.py
-from .HouseBamzy import HouseBamzyMatch
+from .registry import AdapterRegistry
 
 __all__ = ["ADAPTERS"]
 
-ADAPTERS = {
-    "HouseBamzy": HouseBamzyMatch,
-}
\ No newline at end of file
+# imported on first use, see registry.py
+ADAPTERS = AdapterRegistry({
+    "HouseBamzy": ".HouseBamzy:HouseBamzyMatch",
+}, package=__name__)
@@ -18,8 +18,59 @@ Frontend asks to verify answers after the question time expires.
 Frontend fetches the next current question.
 """
 
+from collections.abc import Callable
+from contextlib import contextmanager
 from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
+from functools import partial
+import threading
+import time
+
+class Clock:
+    # the wall clock matches read, see using_clock
+    def now(self) -> datetime:
+        return datetime.now(tz=timezone.utc)
+
+    def time(self) -> float:
+        return time.time()
+
+class FakeClock(Clock):
+    # runs with the wall clock, plus whatever advance() skipped ahead
+    def __init__(self):
+        self.offset = 0.0
+
+    def now(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(seconds=self.offset)
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def advance(self, seconds:float):
+        self.offset += seconds
+
+SYSTEM_CLOCK = Clock()
+RELAY_CLOCK_SKEW = timedelta(seconds=2)  # how far ahead of ours a relay's clock may run
+CLOCKS = threading.local()
+
+def utcnow() -> datetime:
+    return getattr(CLOCKS, 'clock', SYSTEM_CLOCK).now()
+
+def epoch_now() -> float:
+    return getattr(CLOCKS, 'clock', SYSTEM_CLOCK).time()
+
+@contextmanager
+def using_clock(clock:Clock):
+    # code on this thread reads clock instead of the wall clock; timer threads keep the wall clock, which a
+    # FakeClock is never behind
+    previous = getattr(CLOCKS, 'clock', None)
+    CLOCKS.clock = clock
+    try:
+        yield clock
+    finally:
+        if previous is None:
+            del CLOCKS.clock
+        else:
+            CLOCKS.clock = previous
 
 MatchState = {
     -99: "Invalid",
@@ -35,7 +86,7 @@ class BaseQuestion:
     @dataclass(frozen=True)
     class Answer:
         player_info: dict[str, str] = field(default_factory=dict)
-        time_received: datetime = field(default_factory=lambda: datetime.now(tz=timezone.utc))
+        time_received: datetime = field(default_factory=utcnow)
         base_points: float = 0.0
         bonus_points: float = 0.0
 
@@ -57,7 +108,7 @@ class BaseQuestion:
 
     def from_dict_to_answer(self, ans:dict) -> Answer:
         player_info = ans.get('player_info', {})
-        current_time = datetime.now(tz=timezone.utc)
+        current_time = utcnow()
         time_received = datetime.fromisoformat(current_time.isoformat())
         return self.Answer(player_info=player_info, time_received=time_received,)
 
@@ -81,6 +132,45 @@ class BaseQuestion:
     
     
     
+class QuestionSource:
+    # Serves a match's questions on demand, last built first like the list it replaces.
+    # Only counters are kept: questions are built by build(*args, position) when popped and dropped once used.
+    def __init__(self, build:Callable[..., BaseQuestion]|None=None, total:int=0, args:tuple=()):
+        self.args = args  # plain values, pickled in place of build
+        self.total = total if build else 0
+        self.served = 0  # questions handed out so far
+        self.used = 0  # questions retired after being current
+        self.bind(build)
+
+    def bind(self, build:Callable[..., BaseQuestion]|None):
+        self.factory = partial(build, *self.args) if build is not None else None
+
+    def __getstate__(self):
+        # build is a bound method of the match, pickling it would pickle the whole match a second time;
+        # the match binds it again when it is loaded
+        state = self.__dict__.copy()
+        state['factory'] = None
+        return state
+
+    def __bool__(self):
+        return self.served < self.total
+
+    def __len__(self):
+        return self.total - self.served
+
+    def __iter__(self):
+        while self:
+            yield self.pop()
+
+    def pop(self) -> BaseQuestion:
+        if not self or self.factory is None:
+            raise IndexError("pop from empty question source")
+        self.served += 1
+        return self.factory(self.total - self.served)
+
+    def retire(self, question:BaseQuestion):
+        self.used += 1
+
 class BaseMatch:
     def __init__(self, match_id:str, comp_info:dict[str, str],  home_team:str, away_team:str, home_score=0.0, away_score=0.0,
                 rounds=1, state=0, scorers:list|None=None,
@@ -96,14 +186,23 @@ class BaseMatch:
         self.rounds:int = rounds
         self.state:int = state
         self.scorers:list[BaseQuestion.Answer] = [] if scorers is None else scorers
-        self.questions:tuple[list[BaseQuestion], list[BaseQuestion]] = ([],[]) # [unused, used]
+        self.questions:QuestionSource = QuestionSource()
         self.current_question:BaseQuestion | None = None
         self.current_answers: dict[str, BaseQuestion.Answer] = {}
+        self.answer_window: tuple[float, float] | None = None  # (open, close) of the current question, as epoch seconds
+        self.question_ready = threading.Event()  # set once the current question's sendDate is reached
+        self.question_timer: threading.Timer | None = None
+        self.rendered_question: tuple[BaseQuestion | None, dict] = (None, {})
+        self.prerendered: tuple[int, BaseQuestion | None, bytes] = (-1, None, b'')  # (version, question, extended payload)
+        self.version:int = 0  # bumped on every change that can alter to_dict()
+        self.seq:int = 0  # registration order, assigned when the match is registered
         self.qpr:int = qpr # questions per round
         self.tpq:list[float] = [] if tpq is None else tpq  # time per question per round
         self.ppq:float = ppq  # points per question
         self.cooldown_duration:timedelta = timedelta(seconds=cooldown_duration)  # in seconds
         self.logger = logger
+        self.lock = threading.RLock()
+        self.observers: list = []  # callables invoked as observer(match, event, **details)
 
         if not self.match_id:
             raise ValueError("Match ID cannot be empty")
@@ -130,14 +229,45 @@ class BaseMatch:
         else:
             self.end_time = None
 
-    def log(self, level:str, message:str):
+    def __getstate__(self):
+        # what a match store persists: locks, timers, observers and render caches are rebuilt on load
+        state = self.__dict__.copy()
+        for name in ('logger', 'observers', 'lock', 'question_ready', 'question_timer', 'rendered_question', 'prerendered'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        self.logger = None
+        self.observers = []
+        self.lock = threading.RLock()
+        self.question_ready = threading.Event()
+        self.question_timer = None
+        self.rendered_question = (None, {})
+        self.prerendered = (-1, None, b'')
+        if self.questions.factory is None:
+            self.questions.bind(self._build_question)
+        # no timer here, a store may rebuild the same match many times: wait_for_current_question waits out the cooldown
+        if self._question_opens_in() <= 0:
+            self.question_ready.set()
+
+    def log(self, level:str, message:str, *args):
+        # args are merged into message by the logger, only if the record is emitted
         if self.logger:
             log_func = getattr(self.logger, level, None)
             if callable(log_func):
-                log_func(message)
-
-    def to_dict(self):
-        return {
+                log_func(message, *args)
+
+    def notify(self, event:str, **details):
+        for observer in self.observers:
+            try:
+                observer(self, event, **details)
+            except Exception as e:
+                self.log("error", "Observer failed on '%s' for match %s: %s", event, self.match_id, e)
+
+    def to_dict(self, fields:set[str]|None=None):
+        # fields projects the result; scorers, the expensive part, is only built when requested
+        details = {
             **self.comp_info,
             "match_id": self.match_id,
             "home": self.home_team,
@@ -146,11 +276,17 @@ class BaseMatch:
             "away_score": self.away_score,
             "rounds": self.rounds,
             "state": self.state,
-            "scorers": [scorer.to_dict() for scorer in self.scorers],
+            "scorers": None,
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
-            "progress": f"{len(self.questions[1])}/{self.rounds * self.qpr}",
+            "progress": f"{self.questions.used}/{self.rounds * self.qpr}",
         }
+        if fields is None:
+            details["scorers"] = [scorer.to_dict() for scorer in self.scorers]
+            return details
+        if "scorers" in fields:
+            details["scorers"] = [scorer.to_dict() for scorer in self.scorers]
+        return {key: value for key, value in details.items() if key in fields}
     
     def _increment_home_score(self, points:float=0.0):
         if self.state != 2:
@@ -194,6 +330,7 @@ class BaseMatch:
         self.scorers.append(score_info)
         self._increment_home_score(points)
         score_info = self._add_bonus_points_to_home(score_info)
+        self.notify("scored", team=self.home_team, answer=self.scorers[-1])
         return score_info
     
     def _away_team_scores(self, score_info:BaseQuestion.Answer, points=0.0):
@@ -202,20 +339,23 @@ class BaseMatch:
         self.scorers.append(score_info)
         self._increment_away_score(points)
         score_info = self._add_bonus_points_to_away(score_info)
+        self.notify("scored", team=self.away_team, answer=self.scorers[-1])
         return score_info
     
     def _fetch_questions_from_bank(self):
         if self.state != 1:
             raise ValueError("Match must be in 'standby' to fetch questions")
         # Placeholder: In real implementation, fetch from a question bank
-        questions:list[BaseQuestion] = self.questions[0] # reference to unused questions, not a copy
-        for tpqpr in self.tpq: # time per question per round
-            for i in range(self.rounds * self.qpr):
-                question = BaseQuestion(
-                    question_id = f"q{i+1}", text = f"Sample question {i+1}?", points = 1,
-                    sendDate=None, duration = timedelta(seconds=tpqpr)
-                )
-                questions.append(question)
+        per_tpq = self.rounds * self.qpr
+        self.questions = QuestionSource(self._build_question, len(self.tpq) * per_tpq, (tuple(self.tpq), per_tpq))
+
+    def _build_question(self, tpq:tuple[float, ...], per_tpq:int, position:int) -> BaseQuestion:
+        # position in the bank: per_tpq questions for each time per question per round
+        t, i = divmod(position, per_tpq)
+        return BaseQuestion(
+            question_id = f"q{i+1}", text = f"Sample question {i+1}?", points = 1,
+            sendDate=None, duration = timedelta(seconds=tpq[t])
+        )
 
     def _initialize_match(self):
         # Initialize or reset the match to its starting state
@@ -225,16 +365,19 @@ class BaseMatch:
         self.scorers = []
         self.current_question = None
         self.current_answers = {}
-        self.questions = ([], [])
+        self.answer_window = None
+        self._release_question_waiters()
+        self.questions = QuestionSource()
+        self.notify("reset")
         self._fetch_questions_from_bank()
         start_time = self.start_time.isoformat() if self.start_time else ''
         return f"Match initialized successfully. Start time: {start_time}"
     
     def _start_match(self):
         if not self.start_time:
-            self.start_time = datetime.now(tz=timezone.utc) + self.cooldown_duration
+            self.start_time = utcnow() + self.cooldown_duration
         else:
-            if datetime.now(tz=timezone.utc) < self.start_time:
+            if utcnow() < self.start_time:
                 raise ValueError(f"Cannot start before schedule. Try again at {self.start_time.isoformat()}")
             self.state = 2  # Active
         if not self.home_team or not self.away_team:
@@ -249,12 +392,12 @@ class BaseMatch:
             raise ValueError("No current question available")
         sentDate = self.current_question.sendDate
         if isinstance(sentDate, datetime):
-            if sentDate > datetime.now(tz=timezone.utc):
+            if sentDate > utcnow():
                 sentDate_iso = sentDate.isoformat()
                 raise ValueError(f"Current question is not ready. Try again at {sentDate_iso}")
             duration = self.current_question.duration
             if isinstance(duration, timedelta):
-                if datetime.now(tz=timezone.utc) > (sentDate + duration):
+                if utcnow() > (sentDate + duration):
                     raise ValueError("Current question time has expired")
         else:
             raise ValueError("Current question has no sent time set yet")
@@ -262,19 +405,74 @@ class BaseMatch:
     
     def get_current_question(self):
         question = self._get_current_question()
-        return question.to_dict()
+        rendered_for, rendered = self.rendered_question
+        if rendered_for is not question:
+            # every player asks for the same question at once, render it for the first one only
+            rendered = question.to_dict()
+            self.rendered_question = (question, rendered)
+        return rendered
+
+    def _release_question_waiters(self):
+        if self.question_timer is not None:
+            self.question_timer.cancel()
+            self.question_timer = None
+        self.question_ready.set()
+
+    def _question_opens_in(self) -> float:
+        if self.state != 2 or not self.current_question:
+            return 0
+        sentDate = self.current_question.sendDate
+        # timers run on the wall clock whatever clock this thread reads
+        return (sentDate - datetime.now(tz=timezone.utc)).total_seconds() if isinstance(sentDate, datetime) else 0
+
+    def _schedule_question_ready(self):
+        self._release_question_waiters()
+        self.question_ready = ready = threading.Event()
+        delay = self._question_opens_in()
+        if delay <= 0:
+            self._open_question(ready)
+            return
+        self.question_timer = threading.Timer(delay, self._open_question, args=(ready,))
+        self.question_timer.daemon = True
+        self.question_timer.start()
+
+    def _open_question(self, ready:threading.Event):
+        # observers get to pre-render the question payload before the waiting herd is released
+        if ready is self.question_ready:
+            self.notify("question_opened", question=self.current_question)
+        ready.set()
+
+    def wait_for_current_question(self, timeout:float) -> bool:
+        # parks the caller until the current question opens, at most timeout seconds
+        if self.state != 2 or not self.current_question:
+            return False
+        if self.question_timer is None and not self.question_ready.is_set():
+            # a match rebuilt by a store has no timer of its own, sleep until the question opens
+            delay = self._question_opens_in()
+            ready = self.question_ready.wait(min(timeout, delay)) or delay <= timeout
+        else:
+            ready = self.question_ready.wait(timeout)
+        sentDate = self.current_question.sendDate if self.current_question else None
+        if ready and isinstance(sentDate, datetime):
+            # the timer runs on the monotonic clock, absorb any skew against the wall clock
+            remaining = (sentDate - datetime.now(tz=timezone.utc)).total_seconds()
+            if 0 < remaining < 0.05:
+                time.sleep(remaining)
+        return ready
     
     def _prep_current_question(self, sentDate:datetime|None=None):
         if self.state != 2:
             raise ValueError("Match is not active")
-        if not self.questions[0]:
+        if not self.questions:
             raise ValueError("No more questions available")
         if self.current_question is not None:
-            self.questions[1].append(self.current_question)
-        unused_questions = self.questions[0] # reference to unused questions, not a copy
-        self.current_question = unused_questions.pop() if unused_questions else None
+            self.questions.retire(self.current_question)
+        self.current_question = self.questions.pop() if self.questions else None
         if self.current_question:
-            self.current_question = replace(self.current_question, sendDate=sentDate or datetime.now(tz=timezone.utc) + self.cooldown_duration)
+            self.current_question = replace(self.current_question, sendDate=sentDate or utcnow() + self.cooldown_duration)
+            opens_at = self.current_question.sendDate
+            self.answer_window = (opens_at.timestamp(), (opens_at + self.current_question.duration).timestamp())
+            self._schedule_question_ready()
         else:
             raise ValueError("No more questions available")
     
@@ -291,23 +489,52 @@ class BaseMatch:
             raise ValueError("Current question has no sent time sent yet")
         duration = self.current_question.duration
         if isinstance(sentDate, datetime) and isinstance(duration, timedelta):
-            if datetime.now(tz=timezone.utc) < sentDate:
+            if utcnow() < sentDate:
                 raise ValueError(f"Cannot submit answer yet. Try again at {sentDate.isoformat()}")
             delta = (answer.time_received - sentDate)
             if delta > duration:
                 raise ValueError("Answer submitted after time limit")
             self.current_answers[answer.player_info['user_id']] = answer # store latest answer only
+            self.notify("answer_stored", answer=answer, question=self.current_question)
             return answer.to_dict()
         raise ValueError("Could not store answer")
     
-    def store_answer(self, kwargs:dict, data:dict={}):
-        if self.state != 2:
-            raise ValueError("Match is not active")
-        if not self.current_question:
-            raise ValueError("No current question to submit answer for")
-        ans = {**data, 'player_info': kwargs}
-        answer = self.current_question.from_dict_to_answer(ans)
-        return self._store_answer(answer)
+    def store_answer(self, kwargs:dict, data:dict={}, time_received:datetime|None=None):
+        answer = None
+        try:
+            if self.state != 2:
+                raise ValueError("Match is not active")
+            if not self.current_question:
+                raise ValueError("No current question to submit answer for")
+            ans = {**data, 'player_info': kwargs}
+            answer = self.current_question.from_dict_to_answer(ans)
+            if time_received is not None:
+                # relayed answers carry the time the relay received them, never before the question opened and
+                # never later than now
+                sentDate = self.current_question.sendDate
+                if isinstance(sentDate, datetime) and time_received < sentDate:
+                    raise ValueError("time_received is before the question was sent")
+                if time_received > answer.time_received + RELAY_CLOCK_SKEW:
+                    raise ValueError("time_received is in the future")
+                answer = replace(answer, time_received=min(time_received, answer.time_received))
+            return self._store_answer(answer)
+        except ValueError as ve:
+            self.notify("answer_rejected", player_info=kwargs, data=data, answer=answer,
+                        question=self.current_question, reason=f"{ve}")
+            raise
+
+    def store_answers(self, submissions:list[tuple[dict, dict, datetime|None]]) -> list[dict]:
+        # apply a batch of (player_info, data, time_received) in one critical section
+        results = []
+        with self.lock:
+            for player_info, data, time_received in submissions:
+                try:
+                    self.store_answer(kwargs=player_info, data=data, time_received=time_received)
+                except ValueError as ve:
+                    results.append({"accepted": False, "error": f"{ve}"})
+                else:
+                    results.append({"accepted": True})
+        return results
     
     def _get_correct_answers(self, question:BaseQuestion|None = None) -> list[BaseQuestion.Answer]:
         if self.state != 2:
@@ -321,7 +548,7 @@ class BaseMatch:
             raise ValueError("Cannot verify answers. Question has no sent time sent yet")
         duration = question.duration
         if isinstance(sentDate, datetime) and isinstance(duration, timedelta):
-            if datetime.now(timezone.utc) < (sentDate + duration):
+            if utcnow() < (sentDate + duration):
                 raise ValueError(f"Cannot verify answers. Try again at {(sentDate + duration).isoformat()}")
             correct_answers = question.pick_correct_answers()
             return correct_answers
@@ -367,16 +594,17 @@ class BaseMatch:
         if not isinstance(duration, timedelta):
             raise ValueError("Invalid duration")
 
-        now = datetime.now(tz=timezone.utc)
+        now = utcnow()
         if now < (sentDate + duration):
             raise ValueError(f"Cannot verify yet. Try again at {(sentDate + duration).isoformat()}")
 
         # 5) Grade using all submitted answers (snapshot)
         all_answers = list(self.current_answers.values())
-        self.log("info", f"Verifying answers for question {q.question_id}. Total answers submitted: {len(all_answers)}")
+        self.log("info", "Verifying answers for question %s. Total answers submitted: %s", q.question_id, len(all_answers))
         q_with_all = replace(q, answers=all_answers)
 
         correct_answers = q_with_all.pick_correct_answers()
+        self.notify("graded", question=q, answers=all_answers, correct_answers=correct_answers)
 
         # Cache results on the question and mark graded
         q_graded = replace(q_with_all, answers=list(correct_answers), graded=True)
@@ -393,7 +621,7 @@ class BaseMatch:
         recess_duration = timedelta(seconds=recess)
         if recess <= 0:
             return "Match paused successfully without setting new start time"
-        self.start_time = datetime.now(tz=timezone.utc) + recess_duration
+        self.start_time = utcnow() + recess_duration
         return f"Match paused successfully. It will resume at {self.start_time.isoformat()}"
 
     def _update_match(self, **kwargs):
@@ -406,17 +634,24 @@ class BaseMatch:
                 raise ValueError(f"Invalid attribute: {key}")
         return "Match updated successfully"
     
+    def touch(self):
+        self.version += 1
+
     def update_match(self, **kwargs):
         msg = ''
-        if 'state' in kwargs:
-            new_state = kwargs.pop('state', self.state)
-            msg = self._change_match_state(new_state)
-        elif 'verify' in kwargs:
-            msg = self.verify_answers_for_current_question()
-        else:
-            if self.state != -1:
-                raise ValueError("Match must be suspended to update other attributes")
-            msg = self._update_match(**kwargs)
+        self.touch()
+        try:
+            if 'state' in kwargs:
+                new_state = kwargs.pop('state', self.state)
+                msg = self._change_match_state(new_state)
+            elif 'verify' in kwargs:
+                msg = self.verify_answers_for_current_question()
+            else:
+                if self.state != -1:
+                    raise ValueError("Match must be suspended to update other attributes")
+                msg = self._update_match(**kwargs)
+        finally:
+            self.notify("updated")
         return msg
     
     def _suspend_match(self):
@@ -434,8 +669,9 @@ class BaseMatch:
     def _end_match(self):
         if self.state != 2:
             raise ValueError("Match is not in progress")
-        if not self.end_time: self.end_time = datetime.now(tz=timezone.utc)
+        if not self.end_time: self.end_time = utcnow()
         self.state = 99  # Completed
+        self.notify("ended")
         return "Match ended successfully"
     
     def _restart_match(self):
@@ -448,12 +684,15 @@ class BaseMatch:
     def _reset_match(self):
         self.home_score = self.away_score = 0
         self.scorers = []
-        self.questions = ([], [])
+        self.questions = QuestionSource()
         self.state = 0  # Upcoming
         self.start_time = None
         self.end_time = None
         self.current_question = None
         self.current_answers = {}
+        self.answer_window = None
+        self._release_question_waiters()
+        self.notify("reset")
         return "Match reset to upcoming state successfully"
     
     def _change_match_state(self, new_state:int):
@@ -0,0 +1,90 @@
+"""
+# registry.py
+Match adapters by name, imported on first use.
+
+Adapters are declared as 'module:attribute' targets and imported the first time a match of that type is created,
+so starting a server costs nothing per adapter it ships with. Adapters from other installed distributions are
+discovered through the 'ragnarok.adapters' entry point group; a declared adapter wins over a discovered one of the
+same name. Discovery itself is deferred until a name is not among the declared ones.
+"""
+
+from collections.abc import Iterator, Mapping
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = 'ragnarok.adapters'
+
+class AdapterRegistry(Mapping):
+    def __init__(self, declared:dict[str, str], package:str|None=None, group:str|None=ENTRY_POINT_GROUP):
+        # package resolves relative module paths ('.HouseBamzy:HouseBamzyMatch'); group None disables discovery
+        self.package = package
+        self.group = group
+        self.lock = threading.Lock()
+        self.targets: dict[str, str] = {}
+        self.loaded: dict[str, type] = {}
+        self.discovered: dict[str, object] | None = None  # name -> entry point, None until discovery ran
+        for name, target in declared.items():
+            self.declare(name, target)
+
+    def declare(self, name:str, target:str):
+        module, _, attribute = target.partition(':')
+        if not name or not module or not attribute:
+            raise ValueError(f"Invalid adapter target for '{name}': {target}")
+        with self.lock:
+            self.targets[name] = target
+            self.loaded.pop(name, None)
+
+    def _discover(self) -> dict[str, object]:
+        # called with the lock held
+        if self.discovered is None:
+            self.discovered = {}
+            if self.group is not None:
+                from importlib.metadata import entry_points
+                for entry_point in entry_points(group=self.group):
+                    self.discovered.setdefault(entry_point.name, entry_point)
+        return self.discovered
+
+    def _import(self, target:str) -> type:
+        module, _, attribute = target.partition(':')
+        adapter = importlib.import_module(module, self.package)
+        for part in attribute.split('.'):
+            adapter = getattr(adapter, part)
+        return adapter
+
+    def __getitem__(self, name:str) -> type:
+        adapter = self.loaded.get(name, None)
+        if adapter is not None:
+            return adapter
+        with self.lock:
+            adapter = self.loaded.get(name, None)
+            if adapter is not None:
+                return adapter
+            target = self.targets.get(name, None)
+            if target is not None:
+                adapter = self._import(target)
+            else:
+                entry_point = self._discover().get(name, None)
+                if entry_point is None:
+                    raise KeyError(name)
+                adapter = entry_point.load()
+            self.loaded[name] = adapter
+        return adapter
+
+    def __contains__(self, name) -> bool:
+        # answered without importing the adapter
+        with self.lock:
+            return name in self.targets or name in self._discover()
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            names = list(self.targets)
+            names += [name for name in self._discover() if name not in self.targets]
+        return iter(names)
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"declared": sorted(self.targets), "loaded": sorted(self.loaded),
+                    "discovered": None if self.discovered is None else sorted(self.discovered)}
@@ -0,0 +1,103 @@
+"""
+# scoring.py
+Declarative scoring rules for match adapters.
+
+An adapter describes how a correct answer is scored with a ScoringRules: streak multipliers, when a streak starts
+over, and time bonuses for quick answers. The rules are compiled once, when the match is created, into a
+ScoreTable: a multiplier per streak length and a sorted list of bonus windows. Recording a graded question is
+then one pass over its correct answers that updates scores, scorers and events directly, without going through
+the per-step score and bonus methods of the match.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from .abstract import BaseMatch, BaseQuestion
+
+@dataclass(frozen=True)
+class ScoringRules:
+    multipliers: tuple[tuple[int, float], ...] = ()  # (streak length, multiplier) from that length on
+    streak_reset: int = 0  # a streak that reaches this length starts over at 1, 0 to never start over
+    time_bonuses: tuple[tuple[float, float], ...] = ()  # (answered within seconds of sendDate, bonus points)
+    carry_points: bool = False  # multiplied points carry into the next correct answer of the same question
+
+    def compile(self) -> 'ScoreTable':
+        for length, _ in self.multipliers:
+            if length < 1:
+                raise ValueError("Streak lengths must be positive integers")
+        longest = max([length for length, _ in self.multipliers] + [self.streak_reset, 1])
+        by_streak = [1] * (longest + 1)
+        for length, multiplier in sorted(self.multipliers):
+            by_streak[length:] = [multiplier] * (longest + 1 - length)
+        return ScoreTable(by_streak=tuple(by_streak), streak_reset=self.streak_reset,
+                          time_bonuses=tuple(sorted(self.time_bonuses)), carry_points=self.carry_points)
+
+@dataclass(frozen=True)
+class ScoreTable:
+    by_streak: tuple[float, ...]  # multiplier for a streak of length i, the last entry for anything longer
+    streak_reset: int
+    time_bonuses: tuple[tuple[float, float], ...]  # tightest window first
+    carry_points: bool
+
+    def streak_of(self, scorers:list[BaseQuestion.Answer]) -> tuple[str, int]:
+        # the latest scorer's name and how many of the latest scorers in a row share it
+        if not scorers:
+            return '', 0
+        name = scorers[-1].player_info.get('user_name', '')
+        if name == '':
+            return name, 0
+        run = 0
+        for scorer in reversed(scorers):
+            if scorer.player_info.get('user_name', '') != name:
+                break
+            run += 1
+        return name, run
+
+    def bonus(self, answer:BaseQuestion.Answer, sent:datetime|None) -> float|None:
+        # the bonus of the tightest window the answer falls in, None when it falls in none
+        if sent is None or not self.time_bonuses:
+            return None
+        time_taken = (answer.time_received - sent).total_seconds()
+        for within, points in self.time_bonuses:
+            if time_taken <= within:
+                return points
+        return None
+
+    def record(self, match:BaseMatch, question:BaseQuestion, correct_answers:list[BaseQuestion.Answer], points=0.0):
+        # scores every correct answer of a graded question; the caller checks the match is active
+        last_name, run = self.streak_of(match.scorers)
+        sent = question.sendDate if isinstance(question.sendDate, datetime) else None
+        top = len(self.by_streak) - 1
+        base = points
+        streak = 1
+        for answer in correct_answers:
+            name = answer.player_info.get('user_name', '')
+            if name == last_name and name != '':
+                streak += run
+            affiliation = answer.player_info.get('user_affiliation', '')
+            home = affiliation == match.home_team
+            if not home and affiliation != match.away_team:
+                continue
+            if not self.carry_points:
+                points = base
+            points = points or question.points
+            multiplier = self.by_streak[streak if streak < top else top]
+            if multiplier != 1:
+                points = points * multiplier
+            if self.streak_reset and streak >= self.streak_reset:
+                streak = 1
+            bonus = 0.0
+            extra = self.bonus(answer, sent)
+            match.scorers.append(answer)
+            if home:
+                match.home_score += points
+            else:
+                match.away_score += points
+            if extra is not None:
+                bonus += extra
+                match.notify("bonus", answer=answer, points=extra)
+            if home:
+                match.home_score += bonus
+            else:
+                match.away_score += bonus
+            match.notify("scored", team=match.home_team if home else match.away_team, answer=answer)
@@ -0,0 +1,108 @@
+"""
+# admission.py
+Priority-aware admission control for the request path.
+
+All requests share one concurrency budget. Low priority work (spectator polls, listings, stats) may only
+use part of it, so that when a question opens answer submissions still find free workers. Answers are
+additionally rate limited per caller with token buckets, and while answers run over their latency budget
+the share left to readers is halved. A request parked on something other than work, such as a long-poll
+waiting for a question to open, gives its slot back for as long as it waits.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+PRIORITIES = {"answer": 0, "admin": 0, "read": 1}
+
+class TokenBucket:
+    def __init__(self, rate:float, capacity:float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now:float) -> float:
+        # returns 0 when a token was taken, otherwise the seconds until one is available
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+class AdmissionController:
+    def __init__(self, max_concurrency:int=64, read_share:float=0.75,
+                answer_rate:float=5.0, answer_burst:float=10.0, max_buckets:int=100_000,
+                answer_budget:float=0.25):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive integer")
+        self.max_concurrency = max_concurrency
+        self.limits = {0: max_concurrency, 1: max(1, int(max_concurrency * read_share))}
+        self.answer_rate = answer_rate
+        self.answer_burst = answer_burst
+        self.max_buckets = max_buckets
+        self.answer_budget = answer_budget  # in seconds
+        self.answer_latency = 0.0  # exponentially weighted moving average, in seconds
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.parked = 0  # admitted requests currently waiting outside the budget
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.rejected = {"rate_limited": 0, "shed": 0}
+
+    def try_enter(self, priority:str) -> bool:
+        level = PRIORITIES.get(priority, 1)
+        limit = self.limits[level]
+        with self.lock:
+            if level > 0 and self.answer_latency > self.answer_budget:
+                limit = max(1, limit // 2)
+            if self.in_flight >= limit:
+                self.rejected["shed"] += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self, priority:str, elapsed:float):
+        with self.lock:
+            self.in_flight -= 1
+            if priority == "answer":
+                self.answer_latency += 0.2 * (elapsed - self.answer_latency)
+
+    @contextmanager
+    def parked_slot(self):
+        # for an admitted request; its slot is taken back unconditionally, the rest of it was already admitted
+        with self.lock:
+            self.in_flight -= 1
+            self.parked += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight += 1
+                self.parked -= 1
+
+    def take_token(self, key:str) -> float:
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key, None)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.answer_rate, self.answer_burst)
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            wait = bucket.take(now)
+            if wait:
+                self.rejected["rate_limited"] += 1
+            return wait
+
+    def retry_after(self, priority:str) -> int:
+        # readers back off longer than writers so they do not come back with the next answer burst
+        return 1 if PRIORITIES.get(priority, 1) == 0 else 2
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"in_flight": self.in_flight, "parked": self.parked, "limits": dict(self.limits), "rejected": dict(self.rejected),
+                    "answer_latency": self.answer_latency, "answer_budget": self.answer_budget}
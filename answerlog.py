@@ -0,0 +1,196 @@
+"""
+# answerlog.py
+Append-only log of every answer a match receives, accepted or rejected, and of how each was graded.
+
+Records are written as NDJSON, one file per match, so a dispute or an analytics export can stream a match's
+full history back without holding it in memory. Observers only queue records: one writer thread per process
+appends them in batches and keeps at most max_open files open, closing the least recently written first. Worker processes sharing a match store share the directory too:
+each appends whole lines to the same file in append mode, and reopens its handle once another worker has removed
+the file.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+
+class AnswerLog:
+    def __init__(self, directory:str, max_open:int=64):
+        self.directory = directory
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()  # (operation, match_id, payload) for the writer thread
+        self.files: OrderedDict[str, object] = OrderedDict()  # open handles, least recently written first
+        self.writer: threading.Thread|None = None
+        self.pid = 0
+
+    def __call__(self, match, event:str, **details):
+        question = details.get('question', None)
+        if event == "answer_stored":
+            self.append(match.match_id, self._record("accepted", question, details.get('answer', None)))
+        elif event == "answer_rejected":
+            answer = details.get('answer', None)
+            record = self._record("rejected", question, answer, details.get('player_info', {}))
+            if answer is None:
+                record["selected_option"] = details.get('data', {}).get('selected_option', None)
+            record["reason"] = details.get('reason', '')
+            self.append(match.match_id, record)
+        elif event == "graded":
+            correct_ids = {id(ans) for ans in details.get('correct_answers', [])}
+            for ans in details.get('answers', []):
+                record = self._record("graded", question, ans)
+                record["correct"] = id(ans) in correct_ids
+                self.append(match.match_id, record)
+
+    def _record(self, outcome:str, question, answer, player_info:dict|None=None) -> dict:
+        player_info = answer.player_info if answer is not None else (player_info or {})
+        sent_date = getattr(question, 'sendDate', None)
+        time_received = answer.time_received if answer is not None else None
+        return {
+            "logged_at": datetime.now(tz=timezone.utc).isoformat(),
+            "outcome": outcome,
+            "question_id": getattr(question, 'question_id', None),
+            "user_id": player_info.get('user_id', ''),
+            "user_name": player_info.get('user_name', ''),
+            "team": player_info.get('user_affiliation', ''),
+            "selected_option": getattr(answer, 'selected_option', None),
+            "time_received": time_received.isoformat() if time_received else None,
+            "reaction_time": (time_received - sent_date).total_seconds()
+                if time_received and isinstance(sent_date, datetime) else None,
+        }
+
+    def path(self, match_id:str) -> str:
+        # hashed like the archive's, ids that differ only in punctuation never share a log
+        name = hashlib.sha256(match_id.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.ndjson")
+
+    def append(self, match_id:str, record:dict):
+        self._submit("append", match_id, json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+
+    def _submit(self, operation:str, match_id:str|None, payload=None):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    # started on first use, and again in a worker forked after that: neither the thread nor what was
+                    # queued for it survives the fork
+                    self.queue = queue.SimpleQueue()
+                    self.files = OrderedDict()
+                    self.writer = threading.Thread(target=self._write, name="answer-log", daemon=True)
+                    self.writer.start()
+                    self.pid = os.getpid()
+        self.queue.put((operation, match_id, payload))
+
+    def _write(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while True:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            for operation, match_id, payload in batch:
+                try:
+                    if operation == "append":
+                        self._handle(match_id).write(payload)
+                    elif operation == "release":
+                        self._close(match_id)
+                    elif operation == "remove":
+                        self._close(match_id)
+                        if os.path.exists(self.path(match_id)):
+                            os.remove(self.path(match_id))
+                    elif operation == "close":
+                        for open_id in list(self.files):
+                            self._close(open_id)
+                    elif operation == "clear":
+                        for open_id in list(self.files):
+                            self._close(open_id)
+                        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+                            if name.endswith(".ndjson"):
+                                os.remove(os.path.join(self.directory, name))
+                    elif operation == "flush":
+                        self._flush()
+                        payload.set()
+                except OSError as e:
+                    logging.getLogger(__name__).error("Answer log %s of match %s failed: %s", operation, match_id, e)
+            self._flush()
+
+    def _handle(self, match_id:str):
+        handle = self.files.get(match_id, None)
+        if handle is not None and os.fstat(handle.fileno()).st_nlink == 0:
+            # removed by another worker along with its match
+            self._close(match_id)
+            handle = None
+        if handle is None:
+            os.makedirs(self.directory, exist_ok=True)
+            handle = self.files[match_id] = open(self.path(match_id), 'a', encoding='utf-8')
+            while len(self.files) > self.max_open:
+                self._close(next(iter(self.files)))
+        else:
+            self.files.move_to_end(match_id)
+        return handle
+
+    def _close(self, match_id:str):
+        handle = self.files.pop(match_id, None)
+        if handle is not None:
+            handle.close()
+
+    def _flush(self):
+        for match_id, handle in list(self.files.items()):
+            try:
+                handle.flush()
+            except OSError as e:
+                self._close(match_id)
+                logging.getLogger(__name__).error("Answer log of match %s failed: %s", match_id, e)
+
+    def flush(self, timeout:float=5.0) -> bool:
+        # waits until everything this process queued so far is on disk
+        if self.pid != os.getpid():
+            return True
+        done = threading.Event()
+        self._submit("flush", None, done)
+        return done.wait(timeout)
+
+    def exists(self, match_id:str) -> bool:
+        self.flush()
+        return os.path.exists(self.path(match_id))
+
+    def stream(self, match_id:str, question_id:str='', player:str=''):
+        # yields matching NDJSON lines straight from disk, one at a time
+        # cheap substring checks first, only candidate lines are parsed
+        needles = [json.dumps(value, ensure_ascii=False)[1:-1] for value in (question_id, player) if value]
+        self.flush()
+        with open(self.path(match_id), 'r', encoding='utf-8') as handle:
+            for line in handle:
+                if needles:
+                    if any(needle not in line for needle in needles):
+                        continue
+                    record = json.loads(line)
+                    if question_id and record.get('question_id', None) != question_id:
+                        continue
+                    if player and player not in (record.get('user_name', None), record.get('user_id', None)):
+                        continue
+                yield line
+
+    def release(self, match_id:str):
+        # closes a match's handle once it takes no more answers, the next append reopens it
+        if self.pid == os.getpid():
+            self._submit("release", match_id)
+
+    def remove(self, match_id:str):
+        # deletes a match's log with the match, a match created again under the same id starts a new one
+        self._submit("remove", match_id)
+        self.flush()
+
+    def clear(self):
+        self._submit("clear", None)
+        self.flush()
+
+    def close(self):
+        # drains what is queued and closes every handle, safe to call more than once
+        if self.pid == os.getpid():
+            self._submit("close", None)
+            self.flush()
@@ -0,0 +1,266 @@
+"""
+# archive.py
+Cold storage for finished matches.
+
+Completed (99) and cancelled (-99) matches are written to one file per match once a grace period has passed, then
+dropped from the hot set. The file holds the match's scalar fields in a small JSON header followed by its scorers
+as columns: one dictionary-encoded column per player_info key and the receive times as integers. Archived
+matches are reloaded on demand as read-only views over a memory mapping, and only decoded when rendered.
+"""
+
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+MAGIC = b'RGNARC1\n'
+ABSENT = 0xFFFFFFFF  # string index of a player_info key a scorer does not have
+NAIVE = -2**31  # utc offset of a time received without a timezone
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+FINISHED_STATES = (99, -99)
+
+def _align(offset:int) -> int:
+    return (offset + 7) & ~7
+
+def write_archive(path:str, match) -> int:
+    # returns the size of the archive in bytes
+    scorers = list(match.scorers)
+    keys = list(dict.fromkeys(key for scorer in scorers for key in scorer.player_info))
+    strings: dict[str, int] = {}
+    columns: dict[str, array] = {}
+    for key in keys:
+        columns[f"player_info.{key}"] = array('I', (
+            strings.setdefault(str(scorer.player_info[key]), len(strings)) if key in scorer.player_info else ABSENT
+            for scorer in scorers))
+    micros, offsets = array('q'), array('i')
+    for scorer in scorers:
+        received = scorer.time_received
+        offset = received.utcoffset()
+        if offset is None:
+            micros.append((received - EPOCH.replace(tzinfo=None)) // timedelta(microseconds=1))
+            offsets.append(NAIVE)
+        else:
+            micros.append((received - EPOCH) // timedelta(microseconds=1))
+            offsets.append(int(offset.total_seconds()))
+    columns["time_received.micros"] = micros
+    columns["time_received.offset"] = offsets
+
+    layout, position = {}, 0
+    for name, values in columns.items():
+        layout[name] = [values.typecode, position, len(values)]
+        position = _align(position + len(values) * values.itemsize)
+    header = json.dumps({
+        "match": {
+            "match_type": type(match).__name__,
+            "match_id": match.match_id,
+            "comp_info": match.comp_info,
+            "home": match.home_team,
+            "away": match.away_team,
+            "home_score": match.home_score,
+            "away_score": match.away_score,
+            "rounds": match.rounds,
+            "state": match.state,
+            "start_time": match.start_time.isoformat() if match.start_time else None,
+            "end_time": match.end_time.isoformat() if match.end_time else None,
+            "progress": f"{match.questions.used}/{match.rounds * match.qpr}",
+            "seq": match.seq,
+        },
+        "count": len(scorers),
+        "keys": keys,
+        "strings": list(strings),
+        "byteorder": sys.byteorder,
+        "columns": layout,
+    }, separators=(',', ':')).encode()
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # a temp file of its own, workers sweeping the same match never write into each other's
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for name, values in columns.items():
+                handle.seek(data_start + layout[name][1])
+                values.tofile(handle)
+            size = handle.tell()
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return size
+
+class ArchivedMatch:
+    # read-only view of an archived match, answering the reads BaseMatch answers for a finished match
+    def __init__(self, path:str):
+        with open(path, 'rb') as handle:
+            self.mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a match archive")
+        header_start = len(MAGIC) + 4
+        (header_length,) = struct.unpack('<I', self.mapping[len(MAGIC):header_start])
+        header = json.loads(self.mapping[header_start:header_start + header_length])
+        self.data_start = _align(header_start + header_length)
+        self.count: int = header["count"]
+        self.keys: list[str] = header["keys"]
+        self.strings: list[str] = header["strings"]
+        self.swap = header["byteorder"] != sys.byteorder
+        self.layout: dict[str, list] = header["columns"]
+        details = header["match"]
+        self.details = details
+        self.match_type: str = details["match_type"]
+        self.match_id: str = details["match_id"]
+        self.comp_info: dict[str, str] = details["comp_info"]
+        self.home_team: str = details["home"]
+        self.away_team: str = details["away"]
+        self.home_score: float = details["home_score"]
+        self.away_score: float = details["away_score"]
+        self.state: int = details["state"]
+        self.seq: int = details["seq"]
+        self.start_time = datetime.fromisoformat(details["start_time"]) if details["start_time"] else None
+        self.end_time = datetime.fromisoformat(details["end_time"]) if details["end_time"] else None
+        # a finished match has no question, window or pre-rendered payload
+        self.current_question = None
+        self.answer_window = None
+        self.prerendered = (-1, None, b'')
+        self.version = 0
+
+    def column(self, name:str) -> array:
+        typecode, offset, length = self.layout[name]
+        values = array(typecode)
+        start = self.data_start + offset
+        values.frombytes(self.mapping[start:start + length * values.itemsize])
+        if self.swap:
+            values.byteswap()
+        return values
+
+    def scorers(self) -> list[dict]:
+        # decoded to the shape of Answer.to_dict()
+        columns = [(key, self.column(f"player_info.{key}")) for key in self.keys if key != 'user_id']
+        micros, offsets = self.column("time_received.micros"), self.column("time_received.offset")
+        strings = self.strings
+        epochs = {NAIVE: EPOCH.replace(tzinfo=None), 0: EPOCH}
+        scorers = []
+        for i in range(self.count):
+            epoch = epochs.get(offsets[i], None)
+            if epoch is None:
+                zone = timezone(timedelta(seconds=offsets[i]))
+                epoch = epochs[offsets[i]] = EPOCH.astimezone(zone)
+            received = epoch + timedelta(microseconds=micros[i])
+            scorers.append({
+                "player_info": {key: strings[column[i]] for key, column in columns if column[i] != ABSENT},
+                "time_received": received.isoformat(),
+            })
+        return scorers
+
+    def to_dict(self, fields:set[str]|None=None):
+        details = {
+            **self.comp_info,
+            "match_id": self.match_id,
+            "home": self.home_team,
+            "away": self.away_team,
+            "home_score": self.home_score,
+            "away_score": self.away_score,
+            "rounds": self.details["rounds"],
+            "state": self.state,
+            "scorers": None,
+            "start_time": self.details["start_time"],
+            "end_time": self.details["end_time"],
+            "progress": self.details["progress"],
+        }
+        if fields is None or "scorers" in fields:
+            details["scorers"] = self.scorers()
+        if fields is None:
+            return details
+        return {key: value for key, value in details.items() if key in fields}
+
+    def get_current_question(self):
+        raise ValueError("Match is not active")
+
+    def get_correct_answers(self):
+        raise ValueError("Match is not active")
+
+class MatchArchive:
+    def __init__(self, directory:str, grace:float=300.0, max_open:int=64):
+        self.directory = directory
+        self.grace = grace  # seconds a match stays hot after it is first seen finished
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.finished_at: dict[str, float] = {}
+        self.open: OrderedDict[str, ArchivedMatch] = OrderedDict()
+        self.archived = self.reloads = 0
+
+    def path(self, match_id:str) -> str:
+        # hashed, any two ids get their own file whatever characters they hold
+        name = hashlib.sha256(match_id.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.rga")
+
+    def due(self, match, now:float|None=None) -> bool:
+        now = time.time() if now is None else now
+        with self.lock:
+            if match.state not in FINISHED_STATES:
+                self.finished_at.pop(match.match_id, None)
+                return False
+            return now - self.finished_at.setdefault(match.match_id, now) >= self.grace
+
+    def store(self, match) -> int:
+        size = write_archive(self.path(match.match_id), match)
+        with self.lock:
+            self.finished_at.pop(match.match_id, None)
+            self.open.pop(match.match_id, None)
+            self.archived += 1
+        return size
+
+    def contains(self, match_id:str) -> bool:
+        return bool(match_id) and os.path.exists(self.path(match_id))
+
+    def load(self, match_id:str) -> ArchivedMatch|None:
+        with self.lock:
+            view = self.open.get(match_id, None)
+            if view is not None:
+                self.open.move_to_end(match_id)
+                return view
+        if not self.contains(match_id):
+            return None
+        view = ArchivedMatch(self.path(match_id))
+        if view.match_id != match_id:
+            raise ValueError(f"Archive of match {view.match_id} found for match {match_id}")
+        with self.lock:
+            self.open[match_id] = view
+            self.reloads += 1
+            if len(self.open) > self.max_open:
+                # dropped views unmap once the last reader lets go of them
+                self.open.popitem(last=False)
+        return view
+
+    def remove(self, match_id:str) -> bool:
+        with self.lock:
+            self.open.pop(match_id, None)
+            self.finished_at.pop(match_id, None)
+        if not self.contains(match_id):
+            return False
+        os.remove(self.path(match_id))
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.open.clear()
+            self.finished_at.clear()
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.rga'):
+                os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"archived": self.archived, "reloads": self.reloads, "open": len(self.open),
+                    "pending": len(self.finished_at), "grace": self.grace}
@@ -0,0 +1,922 @@
+#!/usr/bin/env python3
+"""
+Ragnarok benchmarks
+
+Usage:
+  python3 benchmarks.py [name ...] [--requests N] [--scorers N] [--matches N]
+                       [--scale S[,S...]] [--repeats N] [--passes N] [--min-time SECONDS] [--save PATH]
+                       [--compare PATH] [--threshold PCT]
+
+Runs in-process against ragnarok.app through Flask's test client, so no servers need to be running; the auth
+benchmark starts fake_cerberus on a local port itself, and the startup benchmark measures fresh interpreters.
+
+The engine benchmark times the match engine's core operations at each --scale: --passes runs of the whole suite,
+each in a fresh interpreter and taking --repeats samples of at least --min-time seconds per operation after a
+warm-up run. Its measurements can be saved with --save and checked against a saved run with --compare, which
+exits with status 1 when an operation's fastest sample got slower by more than --threshold percent and by more
+than the spread between median and fastest samples in either run:
+
+  python3 benchmarks.py engine --save baseline.json
+  python3 benchmarks.py engine --compare baseline.json --threshold 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import logging
+import math
+import multiprocessing
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+import fake_cerberus
+import ragnarok
+from adapters.abstract import FakeClock, using_clock
+from adapters.HouseBamzy import HouseBamzyMatch, MultiChoiceQuestion
+from archive import MatchArchive
+from flask.json.provider import DefaultJSONProvider
+from logpipeline import LogPipeline
+from matchjson import MatchEncoder
+from matchsearch import MatchSearchIndex
+from matchstore import SQLiteMatchStore
+from snapshots import SnapshotBoard
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+# -------------------------
+# Fixtures
+# -------------------------
+
+def make_match(match_id: str = "bench-match", scorers: int = 0, register: bool = True) -> HouseBamzyMatch:
+    """An active HouseBamzy match whose current question is already open, registered with ragnarok by default."""
+    match = HouseBamzyMatch(logger=None, kwargs={
+        "match_id": match_id,
+        "home_team": "Alpha Team",
+        "away_team": "Beta Team",
+        "comp_info": {"house": "House of Bamzy", "sub": "The Physics Vortex", "comp_type": "Interhouse"},
+    })
+    if register:
+        ragnarok.register_match(match)
+        ragnarok.MATCHES.add(match)
+    match.cooldown_duration = timedelta(0)
+    match.update_match(state=1)
+    match.start_time = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+    match.update_match(state=2)
+    now = datetime.now(tz=timezone.utc)
+    for i in range(scorers):
+        team = "Alpha Team" if i % 2 == 0 else "Beta Team"
+        match.scorers.append(MultiChoiceQuestion.Answer(
+            player_info={"user_id": f"u{i}", "user_name": f"player-{i}", "user_role": "user", "user_affiliation": team},
+            time_received=now, selected_option=0))
+    return match
+
+
+def rate(n: int, seconds: float) -> str:
+    return f"{n / seconds:,.0f} req/s ({seconds / n * 1e6:,.1f} us/req)"
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+
+def bench_question_open(args: argparse.Namespace) -> None:
+    """Extended match fetches during an open question, with and without the pre-rendered payload."""
+    ragnarok.MATCHES.clear()
+    match = make_match(scorers=args.scorers)
+    match.touch()  # scorers were added behind the match's back, invalidate and re-render
+    ragnarok.prerender_question(match, "question_opened")
+    client = ragnarok.app.test_client()
+    path = f"/matches/{match.match_id}?mode=extended"
+
+    prerendered = match.prerendered
+    results = {}
+    for label, cached in (("rendered per request", False), ("pre-rendered", True)):
+        match.prerendered = prerendered if cached else (-1, None, b'')
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(path)
+        results[label] = time.perf_counter() - start
+
+    # the part the cache removes: rendering and encoding the payload
+    render_start = time.perf_counter()
+    for _ in range(args.requests):
+        ragnarok.app.json.response(ragnarok.fimbulwinter.return_match_details_by_mode(match, 'extended')).get_data()
+    render = time.perf_counter() - render_start
+    lookup_start = time.perf_counter()
+    for _ in range(args.requests):
+        ragnarok.fimbulwinter.prerendered_details(match)
+    lookup = time.perf_counter() - lookup_start
+
+    print(f"  payload: {len(prerendered[2]):,} bytes, {args.scorers} scorers, {args.requests} requests")
+    for label, seconds in results.items():
+        print(f"  route, {label}: {rate(args.requests, seconds)}")
+    print(f"  route speedup: {results['rendered per request'] / results['pre-rendered']:.1f}x")
+    print(f"  payload, render + encode: {rate(args.requests, render)}")
+    print(f"  payload, cached lookup: {rate(args.requests, lookup)}")
+    print(f"  payload speedup: {render / lookup:.1f}x")
+    ragnarok.MATCHES.clear()
+
+
+def bench_compression(args: argparse.Namespace) -> None:
+    """CPU cost against bytes saved for gzip/deflate levels, and the cost of a compressed-cache hit."""
+    ragnarok.MATCHES.clear()
+    match = make_match(scorers=args.scorers)
+    for i in range(50):
+        make_match(match_id=f"bench-list-{i}")
+    payloads = {
+        "match": ragnarok.app.json.response(match.to_dict()).get_data(),
+        "list": ragnarok.app.json.response([m.to_dict() for m in ragnarok.MATCHES.matches()]).get_data(),
+    }
+    rounds = max(1, args.requests // 10)
+    for name, body in payloads.items():
+        print(f"  {name} payload: {len(body):,} bytes")
+        for encoding in ("gzip", "deflate"):
+            for level in (1, 6, 9):
+                cache = ragnarok.fimbulwinter.CompressionCache(level=level)
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    compressed = cache.compress(body, encoding)
+                elapsed = (time.perf_counter() - start) / rounds
+                saved = 1 - len(compressed) / len(body)
+                print(f"    {encoding} level {level}: {len(compressed):,} bytes ({saved:.1%} saved), "
+                      f"{elapsed * 1e6:,.1f} us/compress, "
+                      f"{(len(body) - len(compressed)) / (elapsed * 1e3):,.0f} bytes saved per CPU-ms")
+        cache = ragnarok.fimbulwinter.CompressionCache()
+        cache.get(body, "gzip")
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cache.get(body, "gzip")
+        print(f"    cached hit (digest + lookup): {(time.perf_counter() - start) / rounds * 1e6:,.1f} us")
+    ragnarok.MATCHES.clear()
+
+
+def bench_archive(args: argparse.Namespace) -> None:
+    """Archive size against the in-memory view, cold and warm reload latency, and hot-set scans before and after."""
+    ragnarok.MATCHES.clear()
+    count = 200
+    matches = [make_match(match_id=f"bench-archive-{i}", scorers=args.scorers) for i in range(count)]
+    for match in matches:
+        match.update_match(state=99)
+    rendered = sum(len(ragnarok.app.json.dumps(match.to_dict())) for match in matches)
+    rounds = max(1, args.requests // 10)
+
+    def scan() -> float:
+        hot_set = ragnarok.MATCHES.matches()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            ragnarok.fimbulwinter.lookup_match_by_id("missing", hot_set, silent=True)
+        return (time.perf_counter() - start) / rounds
+
+    hot_scan = scan()
+    with tempfile.TemporaryDirectory() as directory:
+        archive = MatchArchive(directory, grace=0)
+        start = time.perf_counter()
+        stored = sum(archive.store(match) for match in matches)
+        store = (time.perf_counter() - start) / count
+        ragnarok.MATCHES.clear()
+        cold_scan = scan()
+
+        # cold: every match faulted in from its file, warm: the mapped view is already open
+        start = time.perf_counter()
+        for match in matches:
+            MatchArchive(directory).load(match.match_id).to_dict()
+        cold = (time.perf_counter() - start) / count
+        archive.max_open = count
+        for match in matches:
+            archive.load(match.match_id)
+        start = time.perf_counter()
+        for i in range(rounds):
+            archive.load(matches[i % count].match_id).to_dict()
+        warm = (time.perf_counter() - start) / rounds
+        live = matches[0]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            live.to_dict()
+        hot = (time.perf_counter() - start) / rounds
+        assert archive.load(live.match_id).to_dict() == live.to_dict()
+        files = len(os.listdir(directory))
+
+    print(f"  {count} finished matches, {args.scorers} scorers each, {files} archive files")
+    print(f"  rendered JSON: {rendered / count:,.0f} bytes/match, archive: {stored / count:,.0f} bytes/match "
+          f"({stored / rendered:.1%})")
+    print(f"  archive write: {store * 1e6:,.1f} us/match")
+    print(f"  reload + render, cold: {cold * 1e6:,.1f} us, warm: {warm * 1e6:,.1f} us, hot match to_dict: {hot * 1e6:,.1f} us")
+    print(f"  hot-set miss scan: {hot_scan * 1e6:,.1f} us with {count} finished matches, {cold_scan * 1e6:,.1f} us after archiving")
+    ragnarok.MATCHES.clear()
+
+
+class SlowStream:
+    """A log destination that takes a fixed time per write, like a congested pipe or disk."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text: str) -> None:
+        time.sleep(self.delay)
+        self.writes += 1
+
+    def flush(self) -> None:
+        pass
+
+
+def bench_logging(args: argparse.Namespace) -> None:
+    """Caller-side cost of an info log line: synchronous handler vs the queued pipeline, against a slow destination."""
+    count = args.requests
+    results = {}
+    for label in ("synchronous", "queued"):
+        stream = SlowStream(delay=0.0002)
+        logger = logging.getLogger(f"bench.logging.{label}")
+        logger.propagate = False
+        if label == "synchronous":
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+            logger.handlers[:] = [handler]
+            logger.setLevel(logging.INFO)
+            pipeline = None
+        else:
+            pipeline = LogPipeline(fmt='json', max_queue=count + 1, stream=stream).install(logger)
+        start = time.perf_counter()
+        for i in range(count):
+            logger.info("Match %s updated successfully by %s", f"bench-{i}", "oracle")
+        results[label] = time.perf_counter() - start
+        if pipeline is not None:
+            pipeline.stop()
+        logger.handlers.clear()
+        assert stream.writes == count
+    for label, seconds in results.items():
+        print(f"  {label}: {seconds / count * 1e6:,.1f} us per log call on the request thread")
+    print(f"  speedup: {results['synchronous'] / results['queued']:.1f}x")
+
+
+def bench_json(args: argparse.Namespace) -> None:
+    """Encoding a 1k-scorer match: to_dict() + the stock provider against the scorer cache, cold and warm."""
+    ragnarok.MATCHES.clear()
+    match = make_match(scorers=1000)
+    stock = DefaultJSONProvider(ragnarok.app)
+    provider = ragnarok.app.json
+    payload = ragnarok.match_details(match, "extended")
+    rounds = max(1, args.requests // 10)
+    with ragnarok.app.app_context():
+        expected = stock.response(payload.to_dict()).get_data()
+        assert provider.response(payload).get_data() == expected
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            stock.response(payload.to_dict()).get_data()
+        baseline = (time.perf_counter() - start) / rounds
+
+        encoder = provider.encoder
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # a fresh encoder has no scorer encoded yet
+            provider.encoder = MatchEncoder(provider._compact_dumps)
+            provider.response(payload).get_data()
+        cold = (time.perf_counter() - start) / rounds
+        provider.encoder = encoder
+
+        provider.response(payload).get_data()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            provider.response(payload).get_data()
+        warm = (time.perf_counter() - start) / rounds
+    print(f"  payload: {len(expected):,} bytes, byte-identical: yes")
+    print(f"  to_dict + stock provider: {baseline * 1e6:,.1f} us")
+    print(f"  scorer cache, cold: {cold * 1e6:,.1f} us ({baseline / cold:.1f}x)")
+    print(f"  scorer cache, warm: {warm * 1e6:,.1f} us ({baseline / warm:.1f}x)")
+    ragnarok.MATCHES.clear()
+
+
+def bench_scoring(args: argparse.Namespace) -> None:
+    """Recording graded questions through the compiled scoring table, one and five correct answers per question."""
+    for per_question in (1, 5):
+        match = make_match(f"bench-scoring-{per_question}", scorers=args.scorers, register=False)
+        match._prep_current_question = lambda: None  # keep scoring the same open question
+        sent = match.current_question.sendDate
+        answers = [MultiChoiceQuestion.Answer(
+            player_info={"user_id": f"s{i}", "user_name": f"player-{i % 2}", "user_role": "user",
+                         "user_affiliation": "Alpha Team" if i % 2 == 0 else "Beta Team"},
+            time_received=sent + timedelta(seconds=i), selected_option=0) for i in range(per_question)]
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            match._record_correct_answers(answers)
+        elapsed = time.perf_counter() - start
+        shape = "one player on a growing streak" if per_question == 1 else "two players taking turns"
+        print(f"  {per_question} correct answer(s) per question, {shape}: {rate(args.requests, elapsed)}")
+
+
+def _store_worker(path: str, match_id: str, worker: int, operations: int, writes: bool, barrier) -> None:
+    store = SQLiteMatchStore(path)
+    barrier.wait()
+    for i in range(operations):
+        if writes:
+            player = {"user_id": f"w{worker}-{i % 50}", "user_name": f"worker-{worker}-{i % 50}", "user_role": "user",
+                      "user_affiliation": "Alpha Team" if i % 2 == 0 else "Beta Team"}
+            store.mutate(match_id, lambda match: match.store_answer(kwargs=player, data={"selected_option": 0}))
+        else:
+            store.get(match_id).to_dict()
+
+
+def bench_match_store(args: argparse.Namespace) -> None:
+    """SQLite (WAL) match store throughput with 1, 4 and 8 worker processes: answer writes and spectator reads."""
+    match = make_match(match_id="bench-store", scorers=args.scorers, register=False)
+    question = match.current_question
+    match.current_question = dataclasses.replace(question, duration=timedelta(hours=1))  # stays open for the whole run
+    match.answer_window = (match.answer_window[0], match.answer_window[0] + 3600)
+    context = multiprocessing.get_context("fork")
+    per_worker = max(1, args.requests // 4)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "matches.db")
+        SQLiteMatchStore(path).add(match)
+        print(f"  {args.scorers} scorers, {per_worker} operations per worker")
+        for label, writes in (("answer writes (BEGIN IMMEDIATE)", True), ("spectator reads", False)):
+            for workers in (1, 4, 8):
+                barrier = context.Barrier(workers + 1)
+                processes = [context.Process(target=_store_worker, args=(path, match.match_id, worker, per_worker, writes, barrier))
+                             for worker in range(workers)]
+                for process in processes:
+                    process.start()
+                barrier.wait()
+                start = time.perf_counter()
+                for process in processes:
+                    process.join()
+                elapsed = time.perf_counter() - start
+                assert all(process.exitcode == 0 for process in processes)
+                print(f"  {label}, {workers} worker(s): {rate(workers * per_worker, elapsed)}")
+    match._release_question_waiters()
+
+
+def _snapshot_reader(name: str, match_id: str, reads: int, barrier) -> None:
+    board = SnapshotBoard(name)
+    barrier.wait()
+    for _ in range(reads):
+        board.read(match_id)
+
+
+def bench_snapshots(args: argparse.Namespace) -> None:
+    """Spectator reads served from shared-memory snapshots: route cost against rendering, and 1/2/4/8 reader processes."""
+    ragnarok.MATCHES.clear()
+    match = make_match(scorers=args.scorers)
+    name = f"ragnarok-bench-{os.getpid()}"
+    board = SnapshotBoard(name, slots=16, slot_size=1024 * 1024, create=True)
+    role, ragnarok.SNAPSHOT_ROLE, ragnarok.SNAPSHOTS = ragnarok.SNAPSHOT_ROLE, "writer", board
+    try:
+        ragnarok.publish_snapshot(match)
+        client = ragnarok.app.test_client()
+        path = f"/matches/{match.match_id}"
+        results = {}
+        for label, reader in (("rendered from the match", False), ("served from the snapshot", True)):
+            ragnarok.SNAPSHOT_ROLE = "reader" if reader else ""
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(path)
+            results[label] = time.perf_counter() - start
+        print(f"  snapshot: {len(board.read(match.match_id).short):,} bytes short view, {args.scorers} scorers")
+        for label, seconds in results.items():
+            print(f"  route, {label}: {rate(args.requests, seconds)}")
+
+        context = multiprocessing.get_context("fork")
+        reads = args.requests * 5
+        for readers in (1, 2, 4, 8):
+            barrier = context.Barrier(readers + 1)
+            processes = [context.Process(target=_snapshot_reader, args=(name, match.match_id, reads, barrier))
+                         for _ in range(readers)]
+            for process in processes:
+                process.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+            print(f"  seqlock reads, {readers} reader process(es) on {os.cpu_count()} CPU(s): {rate(readers * reads, elapsed)}")
+    finally:
+        for timer in ragnarok.SNAPSHOT_TIMERS.values():
+            timer.cancel()
+        ragnarok.SNAPSHOT_TIMERS.clear()
+        ragnarok.SNAPSHOT_ROLE, ragnarok.SNAPSHOTS = role, None
+        board.close()
+        ragnarok.MATCHES.clear()
+
+
+AUTH_PROFILES = {
+    "healthy": {"latency": "none"},
+    "lognormal 5 ms": {"latency": "lognormal:0.005,0.5"},
+    "lognormal 5 ms, 5% errors": {"latency": "lognormal:0.005,0.5", "error_rate": 0.05},
+    "lognormal 5 ms, 2% timeouts": {"latency": "lognormal:0.005,0.5", "timeout_rate": 0.02},
+    "down": {"error_rate": 1.0},
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+def bench_auth(args: argparse.Namespace) -> None:
+    """Answer submissions through protected() against fake_cerberus over HTTP, healthy and degraded, 8 client threads, 100 players."""
+    server = make_server("127.0.0.1", 0, fake_cerberus.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    auth_url = ragnarok.AUTH_SERVICE_URL
+    ragnarok.AUTH_SERVICE_URL = f"http://127.0.0.1:{server.server_port}/introspect"
+    count = max(1, args.requests // 10)
+    try:
+        for label, conditions in AUTH_PROFILES.items():
+            ragnarok.MATCHES.clear()
+            match = make_match(match_id="bench-auth")
+            fake_cerberus.CONDITIONS.configure(**{"latency": "none", "error_rate": 0.0, "timeout_rate": 0.0, **conditions})
+            fake_cerberus.COUNTERS.reset()
+            ragnarok.IDENTITIES.clear()
+            ragnarok.AUTH_BREAKER.succeeded()
+
+            def submit(i: int):
+                client = ragnarok.app.test_client()
+                token = fake_cerberus.synthetic_token(i % 100)
+                start = time.perf_counter()
+                resp = client.post(f"/matches/{match.match_id}", json={"selected_option": 0},
+                                   headers={"Authorization": f"Bearer {token}"})
+                return resp.status_code, time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(submit, range(count)))
+            elapsed = time.perf_counter() - start
+            latencies = sorted(seconds for _, seconds in results)
+            statuses = Counter(status for status, _ in results)
+            served = fake_cerberus.COUNTERS.snapshot()
+            print(f"  {label}: {rate(count, elapsed)}, p50 {latencies[len(latencies) // 2] * 1e3:,.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:,.1f} ms, statuses {dict(sorted(statuses.items()))}, "
+                  f"cerberus {served['requests']} introspections ({served['errors']} errors, {served['timeouts']} timeouts, "
+                  f"max {served['max_in_flight']} in flight), breaker {ragnarok.AUTH_BREAKER.state}")
+    finally:
+        fake_cerberus.CONDITIONS.configure(latency="none", error_rate=0.0, timeout_rate=0.0)
+        ragnarok.AUTH_SERVICE_URL = auth_url
+        server.shutdown()
+        ragnarok.MATCHES.clear()
+
+
+SEARCH_SYLLABLES = ["ka", "lo", "mi", "ra", "zen", "tor", "vel", "qui", "dra", "sol", "bex", "nor", "fa", "gri", "um"]
+
+
+def _search_corpus(n: int, rng) -> List[types.SimpleNamespace]:
+    """Stand-ins carrying only what the index reads, so 100k matches fit in the benchmark's memory."""
+    word = lambda: "".join(rng.choice(SEARCH_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    teams = sorted({f"{word()} {word()}" for _ in range(2000)})
+    houses = sorted({f"House {word()}" for _ in range(30)})
+    first_day = datetime(2026, 1, 1, 9, tzinfo=timezone.utc)
+    corpus = []
+    for i in range(n):
+        home, away = rng.sample(teams, 2)
+        scorers = [MultiChoiceQuestion.Answer(player_info={"user_name": f"player-{rng.randrange(20000)}"})
+                   for _ in range(rng.randrange(6))]
+        corpus.append(types.SimpleNamespace(
+            match_id=f"search-{i}", seq=i + 1, home_team=home, away_team=away, scorers=scorers,
+            comp_info={"house": rng.choice(houses), "sub": f"Division {rng.randrange(8)}"},
+            state=rng.choice([0, 1, 2, 99, 99, 99]), start_time=first_day + timedelta(days=rng.randrange(365))))
+    return corpus
+
+
+def bench_search(args: argparse.Namespace) -> None:
+    """Match search index at --matches scale: build, incremental upkeep and query latency for typical filters."""
+    import random
+    rng = random.Random(49)
+    corpus = _search_corpus(args.matches, rng)
+    index = MatchSearchIndex()
+    start = time.perf_counter()
+    for match in corpus:
+        index.track(match)
+    print(f"  built over {args.matches:,} matches in {time.perf_counter() - start:,.2f} s: {index.stats()}")
+
+    updates = min(args.requests, len(corpus))
+    start = time.perf_counter()
+    for match in rng.sample(corpus, updates):
+        match.state = 2
+        index.track(match)
+    print(f"  re-index on update: {rate(updates, time.perf_counter() - start)}")
+    start = time.perf_counter()
+    for match in rng.sample(corpus, updates):
+        index.forget(match.match_id)
+        index.track(match)
+    print(f"  forget + add: {rate(updates, time.perf_counter() - start)}")
+
+    sample = corpus[0]
+    day = sample.start_time.date()
+    queries = {
+        "team": {"team": sample.home_team},
+        "team word prefix": {"team": sample.away_team[:3]},
+        "player": {"player": sample.scorers[0].player_info["user_name"] if sample.scorers else "player-1234"},
+        "player prefix": {"player": "player-123"},
+        "free text, two words": {"text": f"{sample.home_team.split()[0]} {sample.comp_info['house'].split()[1]}"},
+        "comp + state + date": {"comp": sample.comp_info["house"], "states": {99}, "day": day},
+        "state only (unselective)": {"states": {2}},
+        "no filter": {},
+    }
+    for label, query in queries.items():
+        start = time.perf_counter()
+        ids, more = index.search(limit=50, **query)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            index.search(limit=50, **query)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<26} {len(ids):>3}{'+' if more else ' '} hits: {elapsed / args.requests * 1e6:8,.1f} us/query,"
+              f" first {first * 1e6:8,.1f} us")
+
+
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import ragnarok
+started = time.perf_counter()
+from adapters import ADAPTERS
+eager = sorted(name for name in sys.modules if name.startswith('adapters.'))
+ADAPTERS['HouseBamzy']
+print(json.dumps({"startup": started - start, "first_use": time.perf_counter() - started, "imported": eager,
+                  "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def _startup_run() -> tuple[dict, list[tuple[int, int, str]]]:
+    """One cold `import ragnarok` in a fresh interpreter: its own timings and the -X importtime records."""
+    env = {**os.environ, "RAGNAROK_ARCHIVE_INTERVAL": "0", "RAGNAROK_LOG_LEVEL": "WARNING"}
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_PROBE], capture_output=True,
+                          text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    records = []
+    for line in done.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        records.append((int(own), int(cumulative), name[1:].rstrip()))
+    return json.loads(done.stdout.strip().splitlines()[-1]), records
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """Cold start of ragnarok in fresh interpreters: median import time, what it spends it on, first adapter use."""
+    runs = [_startup_run() for _ in range(5)]
+    startup = statistics.median(result["startup"] for result, _ in runs)
+    first_use = statistics.median(result["first_use"] for result, _ in runs)
+    result, records = runs[len(runs) // 2]
+    print(f"  import ragnarok: {startup * 1000:,.1f} ms median of {len(runs)}, max RSS {result['max_rss_kb'] / 1024:,.1f} MiB")
+    print(f"  adapter modules imported at startup: {', '.join(result['imported']) or 'none'}")
+    print(f"  first HouseBamzy match type lookup (lazy import): {first_use * 1000:,.2f} ms")
+    # a module's cost is charged to whoever imports it first; these are ragnarok's direct imports
+    direct = [(cumulative, name.strip()) for _, cumulative, name in records if name.startswith("  ") and not name.startswith("   ")]
+    total = next((cumulative for _, cumulative, name in records if name == "ragnarok"), 0)
+    print(f"  import-time breakdown of ragnarok ({total / 1000:,.1f} ms, -X importtime):")
+    for cumulative, name in sorted(direct, reverse=True)[:12]:
+        print(f"    {name:<24} {cumulative / 1000:8,.1f} ms")
+    print(f"    {'ragnarok itself':<24} {next((own for own, _, name in records if name == 'ragnarok'), 0) / 1000:8,.1f} ms")
+
+
+# -------------------------
+# Engine suite
+# -------------------------
+
+ENGINE_SCALES = {
+    "small": {"players": 10, "questions": 10, "matches": 100},
+    "medium": {"players": 100, "questions": 50, "matches": 1_000},
+    "large": {"players": 1_000, "questions": 200, "matches": 10_000},
+}
+
+RESULTS: List[dict] = []  # engine measurements of this run, what --save writes and --compare checks
+SAMPLES: Dict[str, dict] = {}  # engine measurement name -> its samples so far, pooled over every --passes
+
+
+def parse_scale(name: str) -> Dict[str, int]:
+    """A preset from ENGINE_SCALES, or PLAYERSxQUESTIONSxMATCHES such as 500x40x5000."""
+    if name in ENGINE_SCALES:
+        return ENGINE_SCALES[name]
+    try:
+        players, questions, matches = (int(part) for part in name.split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"unknown scale {name!r}, use one of {', '.join(ENGINE_SCALES)} or PxQxM")
+    if players < 1 or questions < 2 or matches < 1:
+        raise argparse.ArgumentTypeError(f"scale {name!r} needs at least 1 player, 2 questions and 1 match")
+    return {"players": players, "questions": questions, "matches": matches}
+
+
+def engine_match(match_id: str, questions: int) -> HouseBamzyMatch:
+    """An active, unregistered HouseBamzy match with at least questions questions, the first one open."""
+    rounds = -(-questions // 5)
+    match = HouseBamzyMatch(logger=None, kwargs={
+        "match_id": match_id,
+        "home_team": "Alpha Team",
+        "away_team": "Beta Team",
+        "comp_info": {"house": "House of Bamzy", "sub": "The Physics Vortex", "comp_type": "Interhouse"},
+        "rounds": rounds,
+        "tpq": [10.0] * rounds,
+    })
+    match.cooldown_duration = timedelta(0)
+    match.update_match(state=1)
+    match.start_time = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+    match.update_match(state=2)
+    return match
+
+
+def engine_roster(players: int) -> List[dict]:
+    return [{"user_id": f"u{i}", "user_name": f"player-{i}", "user_role": "user",
+             "user_affiliation": "Alpha Team" if i % 2 == 0 else "Beta Team"} for i in range(players)]
+
+
+def measure(operation: str, scale: str, params: Dict[str, int], batch: Callable[[], tuple[int, float]],
+            repeats: int, min_time: float) -> None:
+    """Takes repeats samples of batch, which returns how many operations it timed and the seconds they took.
+
+    A first, discarded run warms caches and sizes the samples: each sample runs batch as many times as it takes to
+    last min_time seconds.
+    """
+    operations, seconds = batch()
+    runs = max(1, math.ceil(min_time / seconds)) if seconds > 0 else 1
+    entry = SAMPLES.setdefault(f"{operation}[{scale}]", {"operation": operation, "scale": scale, "params": params,
+                                                         "runs": runs, "samples": []})
+    for _ in range(repeats):
+        operations = seconds = 0
+        for _ in range(runs):
+            timed_operations, timed_seconds = batch()
+            operations += timed_operations
+            seconds += timed_seconds
+        entry["samples"].append(seconds / operations)
+
+
+def summarize_samples() -> None:
+    # spread_pct is how far the median sample sits above the fastest one
+    for name, entry in SAMPLES.items():
+        samples = entry["samples"]
+        fastest, median = min(samples), statistics.median(samples)
+        result = {"name": name, "operation": entry["operation"], "scale": entry["scale"], "params": entry["params"],
+                  "median_us": median * 1e6, "min_us": fastest * 1e6, "spread_pct": (median / fastest - 1) * 100,
+                  "repeats": len(samples), "runs": entry["runs"]}
+        RESULTS.append(result)
+        print(f"  {name:<48} {result['min_us']:12,.2f} us/op min  "
+              f"(median {result['median_us']:,.2f}, spread {result['spread_pct']:.1f}%)")
+    SAMPLES.clear()
+
+
+def _engine_scale(args: argparse.Namespace, scale: str, params: Dict[str, int]) -> None:
+    players, questions, matches = params["players"], params["questions"], params["matches"]
+    roster = engine_roster(players)
+    options = [{"selected_option": i % 4} for i in range(players)]  # a quarter of the players answer correctly
+    calls = max(10, args.requests // 10)
+
+    match = engine_match(f"bench-engine-{scale}", questions)
+    sweeps = max(1, args.requests // players)
+
+    def store_answer() -> tuple[int, float]:
+        start = time.perf_counter()
+        for _ in range(sweeps):
+            match.current_answers = {}
+            for player_info, data in zip(roster, options):
+                match.store_answer(player_info, data)
+        return sweeps * players, time.perf_counter() - start
+
+    measure("store_answer", scale, params, store_answer, args.repeats, args.min_time)
+
+    def verify() -> tuple[int, float]:
+        # one match's worth of questions: all players answer, the window closes, the question is graded
+        with using_clock(FakeClock()) as clock:
+            graded = engine_match(f"bench-engine-{scale}-verify", questions)
+            seconds = 0.0
+            for _ in range(questions - 1):
+                for player_info, data in zip(roster, options):
+                    graded.store_answer(player_info, data)
+                clock.advance(graded.current_question.duration.total_seconds())
+                start = time.perf_counter()
+                graded.verify_answers_for_current_question()
+                seconds += time.perf_counter() - start
+            graded._release_question_waiters()
+        return questions - 1, seconds
+
+    measure("verify_answers_for_current_question", scale, params, verify, args.repeats, args.min_time)
+
+    sent = match.current_question.sendDate
+    correct = [MultiChoiceQuestion.Answer(player_info=player_info, time_received=sent + timedelta(seconds=1 + i % 3),
+                                          selected_option=0)
+               for i, player_info in enumerate(roster[::4])]
+    history = [MultiChoiceQuestion.Answer(player_info=roster[i % players], time_received=sent, selected_option=0)
+               for i in range(questions)]
+
+    def record() -> tuple[int, float]:
+        # graded questions on top of one scorer per question, the open question is scored again every time
+        match.scorers = list(history)
+        match._prep_current_question = lambda: None
+        start = time.perf_counter()
+        for _ in range(questions):
+            match._record_correct_answers(list(correct), points=1)
+        seconds = time.perf_counter() - start
+        del match._prep_current_question
+        return questions, seconds
+
+    measure("HouseBamzy._record_correct_answers", scale, params, record, args.repeats, args.min_time)
+
+    # a match that went the distance: one scorer per question, every player answered the open question
+    match.scorers = list(history)
+    match.current_answers = {}
+    for player_info, data in zip(roster, options):
+        match.store_answer(player_info, data)
+
+    def timed(call: Callable[[], object]) -> Callable[[], tuple[int, float]]:
+        def batch() -> tuple[int, float]:
+            start = time.perf_counter()
+            for _ in range(calls):
+                call()
+            return calls, time.perf_counter() - start
+        return batch
+
+    measure("to_dict", scale, params, timed(match.to_dict), args.repeats, args.min_time)
+    for mode in ("short", "extended"):
+        measure(f"return_match_details_by_mode.{mode}", scale, params,
+                timed(lambda: ragnarok.fimbulwinter.return_match_details_by_mode(match, mode)), args.repeats, args.min_time)
+    match._release_question_waiters()
+
+    import random
+    rng = random.Random(50)
+    first_day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    listed = []
+    for i in range(matches):
+        listed.append(HouseBamzyMatch(logger=None, kwargs={
+            "match_id": f"bench-engine-{scale}-{i}", "home_team": "Alpha Team", "away_team": "Beta Team",
+            "start_date": first_day + timedelta(days=rng.randrange(30), seconds=rng.randrange(86400))}))
+    lookups = [listed[rng.randrange(matches)].match_id for _ in range(calls)]
+    days = [(first_day + timedelta(days=rng.randrange(30))).date().isoformat() for _ in range(calls)]
+
+    def lookup() -> tuple[int, float]:
+        start = time.perf_counter()
+        for match_id in lookups:
+            ragnarok.fimbulwinter.lookup_match_by_id(match_id, listed)
+        return len(lookups), time.perf_counter() - start
+
+    def by_date() -> tuple[int, float]:
+        start = time.perf_counter()
+        for day in days:
+            ragnarok.fimbulwinter.filter_matches_by_date(listed, day)
+        return len(days), time.perf_counter() - start
+
+    measure("lookup_match_by_id", scale, params, lookup, args.repeats, args.min_time)
+    measure("filter_matches_by_date", scale, params, by_date, args.repeats, args.min_time)
+
+
+def bench_engine(args: argparse.Namespace) -> None:
+    """Core match engine operations at each --scale, with per-operation measurements for --save and --compare."""
+    for scale in args.scale:
+        params = parse_scale(scale)
+        print(f"  scale {scale}: {params['players']:,} players, {params['questions']:,} questions, "
+              f"{params['matches']:,} matches")
+    for _ in range(args.passes):
+        for name, entry in _engine_pass(args).items():
+            pooled = SAMPLES.setdefault(name, {**entry, "samples": []})
+            pooled["samples"].extend(entry["samples"])
+    summarize_samples()
+
+
+def _engine_pass(args: argparse.Namespace) -> Dict[str, dict]:
+    """One run of the engine suite in a fresh interpreter: its samples, by measurement name.
+
+    A process's memory layout and hash seed can slow some operations for its whole life, and the machine has slow
+    spells lasting seconds; passes in separate processes spread every operation's samples over both.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "engine", "--engine-pass", "--scale", ",".join(args.scale),
+               "--requests", str(args.requests), "--repeats", str(args.repeats), "--min-time", str(args.min_time)]
+    env = {**os.environ, "RAGNAROK_ARCHIVE_INTERVAL": "0", "RAGNAROK_LOG_LEVEL": "WARNING"}
+    done = subprocess.run(command, capture_output=True, text=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def save_results(path: str, args: argparse.Namespace) -> None:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {
+        "created": datetime.now(tz=timezone.utc).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "repeats": args.repeats,
+        "passes": args.passes,
+        "min_time": args.min_time,
+        "results": RESULTS,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(RESULTS)} engine measurements to {path}")
+
+
+def compare_results(path: str, threshold: float) -> List[str]:
+    """Prints each measurement against the baseline in path; returns the names that got slower by over threshold %.
+
+    Fastest samples are compared. A slowdown counts only when it is also larger than the spread either run saw
+    between its median and fastest sample, the noise of this machine at that moment.
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    print(f"Compared with {path} (commit {baseline.get('commit') or 'unknown'}, {baseline.get('created', '?')}), "
+          f"threshold {threshold:g}%:")
+    regressions = []
+    for result in RESULTS:
+        name = result["name"]
+        before = previous.get(name, None)
+        if before is None:
+            print(f"  {name:<48} {'':>12} {result['median_us']:12,.2f} us  new")
+            continue
+        if before["params"] != result["params"]:
+            print(f"  {name:<48} scale differs from the baseline, skipped")
+            continue
+        # baselines saved before min_us and spread_pct were kept compare by median, without a noise band
+        key = "min_us" if "min_us" in before and "spread_pct" in before else "median_us"
+        change = (result[key] / before[key] - 1) * 100 if before[key] else 0.0
+        noise = max(before.get("spread_pct", 0.0), result["spread_pct"])
+        verdict = ""
+        if change > threshold and change > noise:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold and -change > noise:
+            verdict = "faster"
+        elif abs(change) > threshold:
+            verdict = f"within noise ({noise:.0f}%)"
+        print(f"  {name:<48} {before[key]:12,.2f} {result[key]:12,.2f} us  {change:+7.1f}%  {verdict}")
+    missing = sorted(set(previous) - {result["name"] for result in RESULTS})
+    if missing:
+        print(f"  not measured this run: {', '.join(missing)}")
+    print(f"{len(regressions)} regression(s) beyond {threshold:g}%")
+    return regressions
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {
+    "question_open": bench_question_open,
+    "compression": bench_compression,
+    "archive": bench_archive,
+    "logging": bench_logging,
+    "match_store": bench_match_store,
+    "snapshots": bench_snapshots,
+    "auth": bench_auth,
+    "json": bench_json,
+    "scoring": bench_scoring,
+    "startup": bench_startup,
+    "search": bench_search,
+    "engine": bench_engine,
+}
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Ragnarok benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--scorers", type=int, default=200)
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--scale", type=lambda value: value.split(","), default=["small", "medium"],
+                        help=f"engine scales, presets {', '.join(ENGINE_SCALES)} or PxQxM (default: small,medium)")
+    parser.add_argument("--repeats", type=int, default=3, help="engine samples per measurement in each pass")
+    parser.add_argument("--passes", type=int, default=5,
+                        help="runs of the engine suite, each in a fresh interpreter, whose samples are pooled")
+    parser.add_argument("--engine-pass", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--min-time", type=float, default=0.02,
+                        help="seconds each engine sample runs for at least, after a warm-up run")
+    parser.add_argument("--save", metavar="PATH", help="write the engine measurements to PATH as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare the engine measurements with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="slowdown in %% that counts as a regression")
+    args = parser.parse_args(argv[1:])
+    for scale in args.scale:
+        try:
+            parse_scale(scale)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+
+    if args.engine_pass:
+        # one pass for bench_engine, which reads the samples from the last line
+        for scale in args.scale:
+            _engine_scale(args, scale, parse_scale(scale))
+        print(json.dumps(SAMPLES))
+        return
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name!r}")
+            sys.exit(2)
+    for name in names:
+        print(f"[BENCH {name}] {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name](args)
+    if args.save:
+        save_results(args.save, args)
+    if args.compare and compare_results(args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,12 +1,171 @@
+"""
+# fake_cerberus.py
+Local stand-in for the Cerberus auth service.
+
+Besides the fixed debug tokens it accepts synthetic tokens ('synthetic-<n>') for CERBERUS_SYNTHETIC_USERS
+generated users spread round-robin over CERBERUS_TEAMS. Each introspection is delayed by a latency distribution,
+fails or hangs past the client's timeout at configured rates, and is counted. That lets protected routes be
+measured against a healthy or a degraded auth service. GET /stats reads the counters, DELETE /stats resets them,
+and PUT /config changes the conditions of a running instance.
+"""
+
 from flask import Flask, request, jsonify
+from collections.abc import Callable
 from functools import wraps
+import math
+import os
+import random
+import threading
+import time
 
 app = Flask(__name__)
 
+TOKENS = {
+    "supersecrettoken": { "X-User-Id": "12345", "X-User-Role": "admin", "X-User-Name": "oracle", "X-User-Affiliation": "" },
+    "secrettoken1": { "X-User-Id": "67890", "X-User-Role": "user", "X-User-Name": "hero", "X-User-Affiliation": "Alpha Team" },
+    "secrettoken2": { "X-User-Id": "54321", "X-User-Role": "user", "X-User-Name": "villain", "X-User-Affiliation": "Beta Team" },
+    "secrettoken3": { "X-User-Id": "98765", "X-User-Role": "user", "X-User-Name": "impostor", "X-User-Affiliation": "Gamma Team" },
+    "relaytoken": { "X-User-Id": "24680", "X-User-Role": "relay", "X-User-Name": "classroom-relay", "X-User-Affiliation": "" },
+}
+SYNTHETIC_PREFIX = 'synthetic-'
+SYNTHETIC_USERS = int(os.getenv('CERBERUS_SYNTHETIC_USERS', '10000'))
+TEAMS = [team.strip() for team in os.getenv('CERBERUS_TEAMS', 'Alpha Team,Beta Team').split(',') if team.strip()]
+
+def synthetic_token(n:int) -> str:
+    return f"{SYNTHETIC_PREFIX}{n}"
+
+def identify(token:str) -> dict[str, str]|None:
+    identity = TOKENS.get(token, None)
+    if identity is not None or not token.startswith(SYNTHETIC_PREFIX):
+        return identity
+    n = token[len(SYNTHETIC_PREFIX):]
+    if not n.isdigit() or int(n) >= SYNTHETIC_USERS:
+        return None
+    n = int(n)
+    return {"X-User-Id": f"{1_000_000 + n}", "X-User-Role": "user", "X-User-Name": f"player{n}",
+            "X-User-Affiliation": TEAMS[n % len(TEAMS)] if TEAMS else ""}
+
+def parse_latency(spec:str) -> Callable[[random.Random], float]:
+    # 'none', 'fixed:S', 'uniform:LOW,HIGH', 'normal:MEAN,STDEV', 'lognormal:MEDIAN,SIGMA' or 'exponential:MEAN',
+    # all in seconds
+    kind, _, params = spec.partition(':')
+    kind = kind.strip().lower()
+    try:
+        values = [float(value) for value in params.split(',') if value.strip()]
+        if kind in ('', 'none'):
+            return lambda rng: 0.0
+        if kind == 'fixed':
+            (seconds,) = values
+            return lambda rng: seconds
+        if kind == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == 'normal':
+            mean, stdev = values
+            return lambda rng: max(0.0, rng.gauss(mean, stdev))
+        if kind == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == 'exponential':
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean)
+    except ValueError:
+        raise ValueError(f"Invalid latency distribution: {spec}")
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class Conditions:
+    def __init__(self, latency:str='none', error_rate:float=0.0, timeout_rate:float=0.0,
+                 timeout_seconds:float=5.0, error_status:int=503, seed:int|None=None):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.configure(latency=latency, error_rate=error_rate, timeout_rate=timeout_rate,
+                       timeout_seconds=timeout_seconds, error_status=error_status)
+
+    def configure(self, **changes):
+        settings = {**getattr(self, 'settings', {}), **changes}
+        unknown = set(settings) - {'latency', 'error_rate', 'timeout_rate', 'timeout_seconds', 'error_status'}
+        if unknown:
+            raise ValueError(f"Invalid setting: {', '.join(sorted(unknown))}")
+        latency = parse_latency(str(settings['latency']))
+        for key in ('error_rate', 'timeout_rate'):
+            settings[key] = float(settings[key])
+            if not 0.0 <= settings[key] <= 1.0:
+                raise ValueError(f"{key} must be between 0 and 1")
+        settings['timeout_seconds'] = float(settings['timeout_seconds'])
+        settings['error_status'] = int(settings['error_status'])
+        with self.lock:
+            self.settings, self.latency = settings, latency
+
+    def draw(self) -> tuple[float, str]:
+        # (delay in seconds, 'ok', 'error' or 'timeout') for one introspection
+        with self.lock:
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+            settings = self.settings
+        if roll < settings['timeout_rate']:
+            return delay + settings['timeout_seconds'], 'timeout'
+        if roll < settings['timeout_rate'] + settings['error_rate']:
+            return delay, 'error'
+        return delay, 'ok'
+
+class Counters:
+    FIELDS = ('requests', 'ok', 'unauthorized', 'errors', 'timeouts', 'in_flight', 'max_in_flight')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.values = dict.fromkeys(self.FIELDS, 0)
+            self.delay = 0.0
+
+    def enter(self):
+        with self.lock:
+            self.values['requests'] += 1
+            self.values['in_flight'] += 1
+            self.values['max_in_flight'] = max(self.values['max_in_flight'], self.values['in_flight'])
+
+    def count(self, outcome:str):
+        with self.lock:
+            self.values[outcome] += 1
+
+    def leave(self, delay:float):
+        with self.lock:
+            self.values['in_flight'] -= 1
+            self.delay += delay
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            served = self.values['requests'] - self.values['in_flight']
+            return {**self.values, "mean_delay": self.delay / served if served else 0.0}
+
+CONDITIONS = Conditions(
+    latency=os.getenv('CERBERUS_LATENCY', 'none'),
+    error_rate=float(os.getenv('CERBERUS_ERROR_RATE', '0')),
+    timeout_rate=float(os.getenv('CERBERUS_TIMEOUT_RATE', '0')),
+    timeout_seconds=float(os.getenv('CERBERUS_TIMEOUT_SECONDS', '5')),
+    error_status=int(os.getenv('CERBERUS_ERROR_STATUS', '503')),
+    seed=int(os.getenv('CERBERUS_SEED', '0')) or None,
+)
+COUNTERS = Counters()
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        COUNTERS.enter()
+        delay = 0.0
         try:
+            delay, outcome = CONDITIONS.draw()
+            if outcome != 'ok':
+                # counted up front, a hung request may outlive the client that is watching the counters
+                COUNTERS.count('timeouts' if outcome == 'timeout' else 'errors')
+            if delay > 0:
+                time.sleep(delay)
+            if outcome == 'timeout':
+                return jsonify({"message": "Timed out"}), 504, {"Cache-Control": "no-store"}
+            if outcome == 'error':
+                return jsonify({"message": "Service unavailable"}), CONDITIONS.settings['error_status'], {"Cache-Control": "no-store"}
             auth_header = request.headers.get('Authorization')
             token = ''
             if auth_header and auth_header.lower().startswith('bearer '):
@@ -15,18 +174,17 @@ def token_required(f):
                 token = request.cookies.get('jwt', '')
             if not token:
                 raise ValueError("Missing token")
-            if token == "supersecrettoken":
-                sub = { "X-User-Id": "12345", "X-User-Role": "admin", "X-User-Name": "oracle", "X-User-Affiliation": "" }
-            if token == "secrettoken1":
-                sub = { "X-User-Id": "67890", "X-User-Role": "user", "X-User-Name": "hero", "X-User-Affiliation": "Alpha Team" }
-            if token == "secrettoken2":
-                sub = { "X-User-Id": "54321", "X-User-Role": "user", "X-User-Name": "villain", "X-User-Affiliation": "Beta Team" }
-            if token == "secrettoken3":
-                sub = { "X-User-Id": "98765", "X-User-Role": "user", "X-User-Name": "impostor", "X-User-Affiliation": "Gamma Team" }
+            sub = identify(token)
+            if sub is None:
+                raise ValueError("Unknown token")
+            COUNTERS.count('ok')
             return f(*args, token_info=sub, **kwargs)
         except Exception as e:
-            print(e)
+            COUNTERS.count('unauthorized')
+            app.logger.info("Introspection refused: %s", e)
             return jsonify({"message": "Something went wrong"}), 401, {"Cache-Control": "no-store"}
+        finally:
+            COUNTERS.leave(delay)
     return decorated
 
 @app.route('/introspect', methods=['OPTIONS'])
@@ -39,7 +197,24 @@ def introspect(token_info:dict = {}):
         "X-User-Affiliation": token_info.get("X-User-Affiliation", "")
     }
     return '', 204, headers
-    
+
+@app.get('/stats')
+def get_stats():
+    return jsonify({**COUNTERS.snapshot(), "conditions": CONDITIONS.settings})
+
+@app.delete('/stats')
+def reset_stats():
+    COUNTERS.reset()
+    return jsonify({"message": "Counters reset"}), 200
+
+@app.put('/config')
+def configure():
+    try:
+        CONDITIONS.configure(**(request.get_json() or {}))
+    except (TypeError, ValueError) as ve:
+        return jsonify({"error": f"{ve}"}), 400
+    return jsonify({"conditions": CONDITIONS.settings}), 200
+
 
 if __name__ == '__main__':
-    app.run(port=5001, debug=True)
\ No newline at end of file
+    app.run(port=5001, debug=True, threaded=True)
@@ -1,10 +1,24 @@
-from adapters.abstract import BaseMatch
+from adapters.abstract import BaseMatch, epoch_now, utcnow
 from urllib.parse import urlparse
-from datetime import datetime
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+import base64
+import gzip
+import hashlib
+import itertools
+import math
 import os
+import threading
+import zlib
 import requests
 from flask import Request
 
+AUTH_SESSION = requests.Session()
+PURGE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-purge')
+
 def load_matches_from_io() -> list[BaseMatch]:
     matches: list[BaseMatch] = []
     return matches
@@ -17,21 +31,155 @@ def lookup_match_by_id(match_id: str, ALL_MATCHES: list[BaseMatch], silent:bool=
     if silent: return -1
     raise ValueError('Match not found')
 
-def filter_matches_by_date(ALL_MATCHES: list[BaseMatch], date_str: str) -> list[BaseMatch]:
+def iter_matches_by_date(ALL_MATCHES: list[BaseMatch], date_str: str, start: int = 0):
+    # lazily yields matches from position start on whose start_time falls on date_str's day;
+    # date_str is parsed here, so a bad one raises before any match is read
+    matches = itertools.islice(ALL_MATCHES, start, None)
     if not date_str:
-        return ALL_MATCHES
-    filtered_matches = []
+        return matches
     orig_date = datetime.fromisoformat(date_str)
     dy, m, yr = orig_date.day, orig_date.month, orig_date.year
     date = datetime(yr, m, dy) # normalize to midnight
-    for match in ALL_MATCHES:
-        start_time = match.start_time
-        if not start_time:
-            continue
-        match_date = datetime(start_time.year, start_time.month, start_time.day)
-        if match_date == date:
-            filtered_matches.append(match)
-    return filtered_matches
+    return (match for match in matches
+            if match.start_time and datetime(match.start_time.year, match.start_time.month, match.start_time.day) == date)
+
+def filter_matches_by_date(ALL_MATCHES: list[BaseMatch], date_str: str) -> list[BaseMatch]:
+    if not date_str:
+        return ALL_MATCHES
+    return list(iter_matches_by_date(ALL_MATCHES, date_str))
+
+def encode_cursor(match: BaseMatch) -> str:
+    return base64.urlsafe_b64encode(str(match.seq).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> int:
+    # the seq of the last match a page ended at, 0 for the first page
+    if not cursor:
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def parse_fields(fields: str) -> set[str]|None:
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    return names or None
+
+def stream_json_array(items, dumps):
+    # yields a JSON array one element at a time, so memory does not grow with the number of items
+    yield '['
+    first = True
+    for item in items:
+        yield dumps(item) if first else ',' + dumps(item)
+        first = False
+    yield ']\n'
+
+def check_answer_window(match: BaseMatch, now: float|None = None) -> tuple[str, int|None]:
+    # cheap pre-authentication check against the cached window; returns (error, retry_after seconds)
+    if match.state != 2:
+        return "Match is not active", None
+    window = match.answer_window
+    if window is None:
+        return "No current question to submit answer for", None
+    now = epoch_now() if now is None else now
+    opens_at, closes_at = window
+    if now < opens_at:
+        opens_at_iso = datetime.fromtimestamp(opens_at, tz=timezone.utc).isoformat()
+        return f"Cannot submit answer yet. Try again at {opens_at_iso}", max(1, math.ceil(opens_at - now))
+    if now > closes_at:
+        return "Answer submitted after time limit", None
+    return '', None
+
+def question_ready_at(match: BaseMatch) -> datetime|None:
+    # sendDate of the current question while it is still in its cooldown, otherwise None
+    question = match.current_question
+    if match.state != 2 or question is None or not isinstance(question.sendDate, datetime):
+        return None
+    return question.sendDate if question.sendDate > utcnow() else None
+
+def prerendered_details(match: BaseMatch, now: float|None = None) -> bytes|None:
+    # the pre-rendered extended payload, if it still matches the match and the question is open
+    version, question, body = match.prerendered
+    if not body or version != match.version or question is not match.current_question:
+        return None
+    window = match.answer_window
+    now = epoch_now() if now is None else now
+    if window is None or not (window[0] <= now <= window[1]):
+        return None
+    return body
+
+def next_transition(match: BaseMatch, now: datetime|None = None) -> datetime|None:
+    # the next scheduled instant at which the match's public view changes on its own
+    now = now or utcnow()
+    instants = [match.start_time]
+    question = match.current_question
+    if question is not None and isinstance(question.sendDate, datetime):
+        instants.append(question.sendDate)
+        if isinstance(question.duration, timedelta):
+            instants.append(question.sendDate + question.duration)
+    upcoming = [instant for instant in instants if isinstance(instant, datetime) and instant > now]
+    return min(upcoming) if upcoming else None
+
+def cache_max_age(matches: list[BaseMatch], cap: int, now: datetime|None = None) -> int:
+    # seconds a public view of these matches stays valid, never past the earliest scheduled transition
+    now = now or utcnow()
+    max_age = cap
+    for match in matches:
+        transition = next_transition(match, now)
+        if transition is not None:
+            max_age = min(max_age, int((transition - now).total_seconds()))
+    return max(0, max_age)
+
+def add_vary(headers, *fields: str):
+    present = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+    for name in fields:
+        if name.lower() not in (value.lower() for value in present):
+            present.append(name)
+    headers['Vary'] = ', '.join(present)
+
+def purge_cached_paths(purge_url: str, paths: list[str]):
+    # asks a caching reverse proxy to drop stale views, off the request path
+    if not purge_url:
+        return
+    def purge():
+        for path in paths:
+            try:
+                requests.request('PURGE', purge_url.rstrip('/') + path, timeout=2)
+            except requests.RequestException:
+                pass
+    PURGE_POOL.submit(purge)
+
+class CompressionCache:
+    # compressed bodies keyed by encoding and body digest (or strong ETag), so identical bytes are compressed once
+    def __init__(self, level: int = 6, min_size: int = 1024, max_entries: int = 256, max_body: int = 4 * 1024 * 1024):
+        self.level = level
+        self.min_size = min_size
+        self.max_entries = max_entries
+        self.max_body = max_body
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+        self.hits = self.misses = 0
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=self.level, mtime=0)
+        return zlib.compress(body, self.level)
+
+    def get(self, body: bytes, encoding: str, etag: str = '') -> bytes:
+        key = (encoding, etag.encode() if etag else hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            cached = self.entries.get(key, None)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        compressed = self.compress(body, encoding)
+        if len(body) <= self.max_body:
+            with self.lock:
+                self.entries[key] = compressed
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return compressed
 
 def environmentals(keys:str, defaults:str, delimiter:str=',') -> str:
     key_list = keys.split(delimiter)
@@ -42,27 +190,64 @@ def environmentals(keys:str, defaults:str, delimiter:str=',') -> str:
         env_vars.append(value)
     return delimiter.join(env_vars)
 
+class OriginPolicy:
+    # allowed hosts are matched exactly or, for '*.example.org' entries, by subdomain; decisions are cached per origin
+    def __init__(self, ALLOWED_ROOTS: list[str], cache_size: int = 1024):
+        roots = [root.strip().lower() for root in ALLOWED_ROOTS if root.strip()]
+        self.exact_hosts = frozenset(root for root in roots if not root.startswith('*.'))
+        self.wildcard_suffixes = tuple(root[1:] for root in roots if root.startswith('*.'))
+        self.allows = lru_cache(maxsize=cache_size)(self._decide)
+
+    def _decide(self, origin: str) -> bool:
+        if not origin:
+            return False
+        host = urlparse(origin).hostname
+        if not host:
+            return False
+        if host in self.exact_hosts:
+            return True
+        return any(host.endswith(suffix) for suffix in self.wildcard_suffixes)
+
 def is_allowed_origin(origin: str, ALLOWED_ROOTS: list[str]) -> bool:
-    if not origin:
-        return False
-    parsed = urlparse(origin)
-    host = parsed.hostname
-    if not host:
-        return False
-    return any(host == root for root in ALLOWED_ROOTS)
+    return OriginPolicy(ALLOWED_ROOTS, cache_size=0).allows(origin)
 
-def introspect_with_cerberus(AUTH_SERVICE_URL: str, request: Request):
+class PreflightMiddleware:
+    # answers CORS preflights before Flask builds a request context or routes anything
+    def __init__(self, wsgi_app, policy: OriginPolicy, headers: dict[str, str], max_age: int):
+        self.wsgi_app = wsgi_app
+        self.policy = policy
+        self.allowed_headers = [(name, value) for name, value in headers.items()]
+        self.allowed_headers.append(("Access-Control-Max-Age", str(max_age)))
+
+    def __call__(self, environ, start_response):
+        origin = environ.get('HTTP_ORIGIN', '')
+        if environ.get('REQUEST_METHOD') != 'OPTIONS' or not origin or 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' not in environ:
+            return self.wsgi_app(environ, start_response)
+        headers = [("Content-Length", "0"), ("Vary", "Origin, Access-Control-Request-Method, Access-Control-Request-Headers")]
+        if self.policy.allows(origin):
+            headers.append(("Access-Control-Allow-Origin", origin))
+            headers.extend(self.allowed_headers)
+        start_response("204 No Content", headers)
+        return [b'']
+
+def extract_token(request: Request) -> str:
     auth_header = request.headers.get('Authorization')
     token = ''
     if auth_header and auth_header.lower().startswith('bearer '):
         token = auth_header.split(' ', 1)[1].strip()
     if not token and 'jwt' in request.cookies:
         token = request.cookies.get('jwt', '')
+    return token
+
+def introspect_token(AUTH_SERVICE_URL: str, token: str) -> dict[str, str]:
     if not token:
         raise ValueError("Missing token")
-    res = requests.options(AUTH_SERVICE_URL, timeout=3, headers={
+    res = AUTH_SESSION.options(AUTH_SERVICE_URL, timeout=3, headers={
         "Authorization": f"Bearer {token}",
         })
+    if res.status_code >= 500:
+        # an outage, not a verdict on the token
+        raise requests.HTTPError(f"Auth service answered {res.status_code}", response=res)
     if res.status_code != 204:
         raise ValueError("Unauthenticated")
     res_headers = res.headers
@@ -73,19 +258,42 @@ def introspect_with_cerberus(AUTH_SERVICE_URL: str, request: Request):
         'user_affiliation': res_headers.get('X-User-Affiliation', res_headers['X-User-Name'])
     }
 
+def introspect_with_cerberus(AUTH_SERVICE_URL: str, request: Request):
+    return introspect_token(AUTH_SERVICE_URL, extract_token(request))
+
+def resolve_tokens(introspect: Callable[[str], dict], tokens: list[str], max_workers:int=8) -> dict[str, dict|Exception]:
+    # resolve each distinct token once, concurrently, over the shared keep-alive session
+    unique_tokens = list(dict.fromkeys(token for token in tokens if token))
+    results: dict[str, dict|Exception] = {}
+    if not unique_tokens:
+        return results
+    def resolve(token: str):
+        try:
+            return token, introspect(token)
+        except Exception as e:
+            return token, e
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_tokens)))) as pool:
+        for token, outcome in pool.map(resolve, unique_tokens):
+            results[token] = outcome
+    return results
+
 def return_match_details_by_mode(match: BaseMatch, mode: str) -> dict:
     details = match.to_dict()
-    if mode == 'short': return details
-    elif mode == 'extended':
-        try:
-            details.update({"question": match.get_current_question()})
-            details.update({"answers": match.get_correct_answers()})
-        except ValueError as ve:
-            if "current question" in str(ve).lower():
-                details.update({"question": {"error": str(ve)}})
-            elif "cannot verify" in str(ve).lower():
-                details.update({"answers": {"error": str(ve)}})
-            else: raise ve
-        except Exception as e: raise e
-        finally: return details
-    else: return details
\ No newline at end of file
+    if mode == 'extended':
+        details.update(extended_details(match))
+    return details
+
+def extended_details(match: BaseMatch) -> dict:
+    # the question and answers keys the extended view adds to the match's own
+    details = {}
+    try:
+        details.update({"question": match.get_current_question()})
+        details.update({"answers": match.get_correct_answers()})
+    except ValueError as ve:
+        if "current question" in str(ve).lower():
+            details.update({"question": {"error": str(ve)}})
+        elif "cannot verify" in str(ve).lower():
+            details.update({"answers": {"error": str(ve)}})
+        else: raise ve
+    except Exception as e: raise e
+    finally: return details
\ No newline at end of file
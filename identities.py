@@ -0,0 +1,226 @@
+"""
+# identities.py
+Keeps authentication working, and fast, while Cerberus is slow or down.
+
+Every introspection goes through a circuit breaker. After a run of consecutive failures (timeouts, connection
+errors, 5xx answers) it opens and callers fail immediately instead of waiting out the request timeout. Once a
+cool-down has passed it lets a single probe through and closes again if that probe succeeds.
+
+Verified identities are cached per token. Within the TTL they are served as they are. For a bounded stale window
+after that they are still served, while a background revalidation refreshes them, or drops them if Cerberus now
+rejects the token. While the breaker is open, identities inside their stale window are what keeps players signed in.
+"""
+
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
+
+from requests import RequestException
+
+class AuthUnavailable(RequestException):
+    # raised without calling Cerberus while the breaker is open
+    def __init__(self, message:str, retry_after:float=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold:int=5, reset_timeout:float=10.0,
+                 on_transition:Callable[[str, str], None]|None=None, history:int=50):
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be a positive integer")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_transition = on_transition
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0  # consecutive
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.transitions: deque[tuple[float, str, str]] = deque(maxlen=history)  # (wall time, from, to)
+
+    def _move(self, state:str) -> tuple[str, str]|None:
+        if state == self.state:
+            return None
+        change = (self.state, state)
+        self.state = state
+        self.transitions.append((time.time(), *change))
+        return change
+
+    def _notify(self, change:tuple[str, str]|None):
+        if change is not None and self.on_transition is not None:
+            self.on_transition(*change)
+
+    def allow(self) -> bool:
+        # True if a call to Cerberus may go ahead; in half-open state only one call at a time goes ahead
+        change = None
+        with self.lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                change = self._move(self.HALF_OPEN)
+                self.probing = False
+            if self.state == self.CLOSED:
+                allowed = True
+            elif self.state == self.HALF_OPEN and not self.probing:
+                allowed = self.probing = True
+            else:
+                allowed = False
+                self.rejected += 1
+        self._notify(change)
+        return allowed
+
+    def retry_after(self) -> float:
+        # seconds until the breaker lets a probe through
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            change = self._move(self.CLOSED)
+        self._notify(change)
+
+    def failed(self):
+        change = None
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                change = self._move(self.OPEN)
+        self._notify(change)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "rejected": self.rejected,
+                "transitions": [{"at": at, "from": before, "to": after} for at, before, after in self.transitions],
+            }
+
+class IdentityCache:
+    def __init__(self, introspect:Callable[[str], dict], breaker:CircuitBreaker, ttl:float=30.0,
+                 max_stale:float=300.0, max_entries:int=100_000, workers:int=2):
+        # introspect raises ValueError when Cerberus rejects a token and RequestException when it cannot answer
+        self.introspect = introspect
+        self.breaker = breaker
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()  # token digest -> (identity, verified at)
+        self.refreshing: set[bytes] = set()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='identity-refresh')
+        self.counts = dict.fromkeys(('fresh', 'stale', 'verified', 'rejected', 'unavailable', 'refreshed'), 0)
+
+    @staticmethod
+    def key(token:str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def _count(self, outcome:str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def resolve(self, token:str) -> dict:
+        if not token:
+            raise ValueError("Missing token")
+        key = self.key(token)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            identity, verified_at = entry
+            age = now - verified_at
+            if age < self.ttl:
+                self._count('fresh')
+                return identity
+            if age < self.ttl + self.max_stale:
+                self._count('stale')
+                self._refresh_later(token, key)
+                return identity
+        if not self.breaker.allow():
+            self._count('unavailable')
+            raise AuthUnavailable("Authentication service unavailable", self.breaker.retry_after())
+        return self._verify(token, key)
+
+    def known(self, token:str) -> dict|None:
+        # the identity a token was already verified as, without calling Cerberus; None for tokens never verified
+        if not token:
+            return None
+        with self.lock:
+            entry = self.entries.get(self.key(token), None)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl + self.max_stale:
+            return None
+        return entry[0]
+
+    def _verify(self, token:str, key:bytes) -> dict:
+        # the caller has been let through by the breaker
+        try:
+            identity = self.introspect(token)
+        except RequestException:
+            self.breaker.failed()
+            self._count('unavailable')
+            raise
+        except Exception as e:
+            # Cerberus answered, it just did not vouch for the token
+            self.breaker.succeeded()
+            if isinstance(e, ValueError):
+                with self.lock:
+                    self.entries.pop(key, None)
+                self._count('rejected')
+            raise
+        self.breaker.succeeded()
+        with self.lock:
+            self.entries[key] = (identity, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._count('verified')
+        return identity
+
+    def _refresh_later(self, token:str, key:bytes):
+        # one background revalidation per token at a time, none while the breaker holds calls back
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        if not self.breaker.allow():
+            with self.lock:
+                self.refreshing.discard(key)
+            return
+        self.pool.submit(self._refresh, token, key)
+
+    def _refresh(self, token:str, key:bytes):
+        try:
+            self._verify(token, key)
+            self._count('refreshed')
+        except Exception:
+            pass  # rejected tokens are dropped by _verify, outages leave the stale identity in place
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def forget(self, token:str):
+        with self.lock:
+            self.entries.pop(self.key(token), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "refreshing": len(self.refreshing), "ttl": self.ttl,
+                    "max_stale": self.max_stale, **self.counts}
@@ -0,0 +1,132 @@
+"""
+# logpipeline.py
+Logging that stays off the request path.
+
+Request threads only filter and enqueue records; a listener thread formats and writes them, so request latency no
+longer depends on how fast stdout or the disk is. Messages are %-formatted by the listener, except those with an
+argument that could still change after the call (anything but a string, number or None), which the caller formats.
+Info-level records from high-volume routes are sampled 1-in-N. When the queue is full records are dropped and counted
+rather than blocking the request.
+"""
+
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+
+from flask import has_request_context, request
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+SETTLED_TYPES = (str, int, float, type(None))
+
+def parse_sample_rates(spec:str) -> dict[str, float]:
+    # 'submit_answers_batch=0.1,werkzeug=0.5' -> {route or logger name: fraction of info records kept}
+    rates = {}
+    for entry in spec.split(','):
+        name, _, rate = entry.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+class RouteSampler(logging.Filter):
+    # keeps every warning and error, and 1 in round(1/rate) info records per route (or logger outside a request)
+    def __init__(self, rates:dict[str, float]):
+        super().__init__()
+        self.every = {name: round(1 / rate) if rate > 0 else 0 for name, rate in rates.items()}
+        self.counts: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        route = request.endpoint if has_request_context() else None
+        if route:
+            record.route = route
+        if record.levelno > logging.INFO:
+            return True
+        key = route if route in self.every else record.name
+        every = self.every.get(key, 1)
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        with self.lock:
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count % every:
+            return False
+        record.sampled = every
+        return True
+
+class DeferredQueueHandler(QueueHandler):
+    # enqueues the record as logged, the listener's formatter merges msg and args when they can't change meanwhile
+    def __init__(self, log_queue:queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # tracebacks pin frames and their locals, render them before letting go of the caller
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        args = record.args.values() if isinstance(record.args, dict) else record.args or ()
+        if not isinstance(record.msg, str) or not all(isinstance(arg, SETTLED_TYPES) for arg in args):
+            # the caller may mutate a dict or an object after logging it, format while it still reads as logged
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record:logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogPipeline:
+    def __init__(self, level:str='INFO', fmt:str='json', sample_rates:dict[str, float]|None=None,
+                max_queue:int=10_000, stream=None):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.handler = DeferredQueueHandler(self.queue)
+        self.sampler = RouteSampler(sample_rates or {})
+        self.handler.addFilter(self.sampler)
+        self.output = logging.StreamHandler(stream or sys.stderr)
+        self.output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        self.listener = QueueListener(self.queue, self.output, respect_handler_level=True)
+        self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+
+    def install(self, logger:logging.Logger|None=None):
+        # replaces the logger's handlers (the root logger's by default) with the queue
+        logger = logger or logging.getLogger()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(self.handler)
+        logger.setLevel(self.level)
+        self.listener.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        # drains what is queued, safe to call more than once
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "dropped": self.handler.dropped}
@@ -0,0 +1,123 @@
+"""
+# matchjson.py
+JSON encoding for match payloads that reuses the encoded scorers.
+
+Routes hand MatchPayload objects to Flask's JSON layer instead of match.to_dict() trees. A scorer never changes
+once recorded, so MatchJSONProvider keeps each one's encoded form and splices it into later responses for that
+match; everything else goes through the stock encoder with the settings jsonify uses, so responses stay
+byte-identical.
+"""
+
+from datetime import datetime, timedelta
+import json
+import threading
+import weakref
+
+from flask.json.provider import DefaultJSONProvider
+
+from adapters.abstract import BaseMatch
+
+class MatchPayload:
+    # a match's public view, optionally projected to fields and extended with question/answers keys
+    __slots__ = ('match', 'fields', 'extra')
+
+    def __init__(self, match, fields:set[str]|None=None, extra:dict|None=None):
+        self.match = match
+        self.fields = fields
+        self.extra = extra or {}
+
+    def to_dict(self) -> dict:
+        details = self.match.to_dict(self.fields)
+        details.update(self.extra)
+        return details
+
+class AllFieldsBut:
+    # a to_dict projection keeping every key but the given ones
+    def __init__(self, *keys:str):
+        self.keys = keys
+
+    def __contains__(self, key) -> bool:
+        return key not in self.keys
+
+WITHOUT_SCORERS = AllFieldsBut("scorers")
+
+class MatchEncoder:
+    def __init__(self, dumps):
+        self.dumps = dumps  # the stock encoder with the provider's settings, compact
+        self.lock = threading.Lock()
+        # match -> (scorers list, the answers encoded so far, their encoded list), dropped with the match
+        self.scorers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def scorer_list(self, match:BaseMatch) -> str:
+        scorers = match.scorers
+        with self.lock:
+            cached = self.scorers.get(match, None)
+            if cached is not None and cached[0] is scorers:
+                _, encoded, text = cached
+                # scorers only grow, anything but an append means encoding the list again
+                if len(scorers) >= len(encoded) and all(answer is scorer for answer, scorer in zip(encoded, scorers)):
+                    if len(scorers) == len(encoded):
+                        return text
+                    tail = self.dumps([scorer.to_dict() for scorer in scorers[len(encoded):]])
+                    text = tail if not encoded else text[:-1] + ',' + tail[1:]
+                    self.scorers[match] = (scorers, list(scorers), text)
+                    return text
+            text = self.dumps([scorer.to_dict() for scorer in scorers])
+            self.scorers[match] = (scorers, list(scorers), text)
+            return text
+
+    def compose(self, details:dict, fragments:dict[str, str]) -> str:
+        # an object of details and already encoded fragments, in sorted key order like sort_keys=True:
+        # each run of plain keys between fragments is one call to the stock encoder
+        parts, run = [], {}
+        for key in sorted({**details, **fragments}):
+            if key in fragments:
+                if run:
+                    parts.append(self.dumps(run)[1:-1])
+                    run = {}
+                parts.append(self.dumps(key) + ':' + fragments[key])
+            else:
+                run[key] = details[key]
+        if run:
+            parts.append(self.dumps(run)[1:-1])
+        return '{' + ','.join(parts) + '}'
+
+    def match(self, payload:MatchPayload) -> str:
+        match, fields, extra = payload.match, payload.fields, payload.extra
+        if (not isinstance(match, BaseMatch) or type(match).to_dict is not BaseMatch.to_dict
+                or "scorers" in extra or (fields is not None and "scorers" not in fields)):
+            return self.dumps(payload.to_dict())
+        details = match.to_dict(WITHOUT_SCORERS if fields is None else fields - {"scorers"})
+        details.update(extra)
+        if not all(type(key) is str for key in details):
+            return self.dumps(payload.to_dict())
+        return self.compose(details, {"scorers": self.scorer_list(match)})
+
+class MatchJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, MatchPayload):
+            return o.to_dict()
+        if isinstance(o, datetime):
+            return o.isoformat()
+        if isinstance(o, timedelta):
+            return o.total_seconds()
+        return DefaultJSONProvider.default(o)
+
+    def __init__(self, app):
+        super().__init__(app)
+        # one encoder built up front, json.dumps would build a new one per call given these arguments
+        self._compact_dumps = json.JSONEncoder(default=self.default, ensure_ascii=True, sort_keys=True,
+                                               separators=(',', ':')).encode
+        self.encoder = MatchEncoder(self._compact_dumps)
+
+    def dumps(self, obj, **kwargs) -> str:
+        # the fast path writes what the stock settings would, anything else takes the stock path. That includes
+        # pretty-printed output (indent=, as response() asks for in debug mode): cached scorers are compact and
+        # would have to be re-indented for the depth they end up at
+        if self.sort_keys and self.ensure_ascii and kwargs == {"separators": (",", ":")}:
+            if isinstance(obj, MatchPayload):
+                return self.encoder.match(obj)
+            if type(obj) is list and obj and all(isinstance(item, MatchPayload) for item in obj):
+                return '[' + ','.join([self.encoder.match(item) for item in obj]) + ']'
+        return super().dumps(obj, **kwargs)
@@ -0,0 +1,258 @@
+"""
+# matchsearch.py
+In-memory search over matches by team, competition and player, fed by match events.
+
+Team names, comp_info values and scorer names are split into lowercase words. Each field keeps an inverted
+index from word to match ids plus a sorted vocabulary, so a query word matches every indexed word it is a prefix
+of through one binary search; the union for a prefix that covers several words is kept until that field's postings
+change. State and match day (of start_time, as GET /matches?date= reads it) are indexed the
+same way. A selective query intersects its candidate sets, smallest first, and orders the survivors by registration
+seq; one with many candidates instead walks the matches in seq order and stops as soon as its page is full.
+
+A match is indexed once it is in the match store, re-indexed on "updated" and "reset", and each "scored" event
+adds its scorer; the routes forget matches they delete or archive. Results are match ids: the caller resolves them
+through the match store, which drops anything another worker removed in the meantime.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+import bisect
+import itertools
+import re
+import threading
+
+FIELDS = ('team', 'comp', 'player')
+WORD = re.compile(r'\w+')
+PREFIX_CACHE = 256  # prefix unions kept per index
+
+def words(text:str) -> set[str]:
+    return set(WORD.findall(text.casefold())) if isinstance(text, str) else set()
+
+def parse_day(date_str:str) -> date|None:
+    # the calendar day GET /matches?date= compares start_time against
+    if not date_str:
+        return None
+    return datetime.fromisoformat(date_str).date()
+
+@dataclass
+class Document:
+    terms: dict[str, set[str]] = field(default_factory=dict)
+    state: int|None = None
+    day: date|None = None
+    scorers: int = 0  # scorers indexed so far, a mismatch means the list was replaced
+
+class MatchSearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.docs: dict[str, Document] = {}
+        self.postings: dict[str, dict[str, set[str]]] = {name: {} for name in FIELDS}
+        self.vocabulary: dict[str, list[str]] = {name: [] for name in FIELDS}  # sorted keys of postings
+        self.by_state: dict[int, set[str]] = {}
+        self.by_day: dict[date, set[str]] = {}
+        self.seqs: dict[str, int] = {}
+        self.order: list[tuple[int, str]] = []  # (seq, match id) of every match, sorted
+        self.generations = dict.fromkeys(FIELDS, 0)  # bumped on every change to a field's postings
+        self.prefixes: OrderedDict[tuple[str, str], tuple[int, set[str]]] = OrderedDict()
+
+    def __call__(self, match, event:str, **details):
+        if event in ("updated", "reset"):
+            self.track(match)
+        elif event == "scored":
+            self.record_scorer(match, details.get('answer', None))
+
+    @staticmethod
+    def _player_terms(scorers:list) -> set[str]:
+        names = {scorer.player_info.get('user_name', '') for scorer in scorers}
+        return set().union(*[words(name) for name in names])
+
+    def _add_term(self, name:str, term:str, match_id:str):
+        self.generations[name] += 1
+        postings = self.postings[name]
+        ids = postings.get(term, None)
+        if ids is None:
+            ids = postings[term] = set()
+            bisect.insort(self.vocabulary[name], term)
+        ids.add(match_id)
+
+    def _remove_term(self, name:str, term:str, match_id:str):
+        self.generations[name] += 1
+        postings = self.postings[name]
+        ids = postings.get(term, None)
+        if ids is None:
+            return
+        ids.discard(match_id)
+        if not ids:
+            del postings[term]
+            vocabulary = self.vocabulary[name]
+            del vocabulary[bisect.bisect_left(vocabulary, term)]
+
+    @staticmethod
+    def _move(index:dict, before, after, match_id:str):
+        if before == after:
+            return
+        ids = index.get(before, None)
+        if ids is not None:
+            ids.discard(match_id)
+            if not ids:
+                del index[before]
+        if after is not None:
+            index.setdefault(after, set()).add(match_id)
+
+    def track(self, match):
+        # (re)indexes a match from its current state
+        match_id = match.match_id
+        comp_terms = set().union(*[words(value) for value in match.comp_info.values()])
+        start_time = match.start_time
+        with self.lock:
+            doc = self.docs.get(match_id, None)
+            if doc is None:
+                doc = self.docs[match_id] = Document({name: set() for name in FIELDS})
+            terms = {"team": words(match.home_team) | words(match.away_team), "comp": comp_terms}
+            scorers = match.scorers
+            terms["player"] = doc.terms["player"] if len(scorers) == doc.scorers else self._player_terms(scorers)
+            for name in FIELDS:
+                before, after = doc.terms[name], terms[name]
+                for term in before - after:
+                    self._remove_term(name, term, match_id)
+                for term in after - before:
+                    self._add_term(name, term, match_id)
+            doc.terms = terms
+            doc.scorers = len(scorers)
+            self._move(self.by_state, doc.state, match.state, match_id)
+            doc.state = match.state
+            if self.seqs.get(match_id, None) != match.seq:
+                self._unplace(match_id)
+                self.seqs[match_id] = match.seq
+                bisect.insort(self.order, (match.seq, match_id))
+            day = start_time.date() if isinstance(start_time, datetime) else None
+            self._move(self.by_day, doc.day, day, match_id)
+            doc.day = day
+
+    def record_scorer(self, match, answer):
+        if answer is None:
+            return
+        with self.lock:
+            doc = self.docs.get(match.match_id, None)
+            if doc is None:
+                return
+            doc.scorers += 1
+            for term in words(answer.player_info.get('user_name', '')) - doc.terms["player"]:
+                doc.terms["player"].add(term)
+                self._add_term("player", term, match.match_id)
+
+    def forget(self, match_id:str):
+        with self.lock:
+            doc = self.docs.pop(match_id, None)
+            if doc is None:
+                return
+            for name in FIELDS:
+                for term in doc.terms[name]:
+                    self._remove_term(name, term, match_id)
+            self._move(self.by_state, doc.state, None, match_id)
+            self._move(self.by_day, doc.day, None, match_id)
+            self._unplace(match_id)
+
+    def _unplace(self, match_id:str):
+        seq = self.seqs.pop(match_id, None)
+        if seq is None:
+            return
+        position = bisect.bisect_left(self.order, (seq, match_id))
+        if position < len(self.order) and self.order[position] == (seq, match_id):
+            del self.order[position]
+
+    def clear(self):
+        with self.lock:
+            self.docs.clear()
+            for name in FIELDS:
+                self.postings[name].clear()
+                self.vocabulary[name].clear()
+            self.by_state.clear()
+            self.by_day.clear()
+            self.seqs.clear()
+            self.order.clear()
+            self.prefixes.clear()
+
+    def _prefixed(self, name:str, prefix:str) -> list[set[str]]:
+        # ids of matches with a word in this field starting with prefix, as one set or none
+        vocabulary, postings = self.vocabulary[name], self.postings[name]
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\U0010ffff', start)
+        if end - start <= 1:
+            return [postings[term] for term in vocabulary[start:end]]
+        # short prefixes cover many words; their union is kept until the field changes
+        key, generation = (name, prefix), self.generations[name]
+        cached = self.prefixes.get(key, None)
+        if cached is not None and cached[0] == generation:
+            self.prefixes.move_to_end(key)
+            return [cached[1]]
+        union = set().union(*[postings[term] for term in vocabulary[start:end]])
+        self.prefixes[key] = (generation, union)
+        self.prefixes.move_to_end(key)
+        while len(self.prefixes) > PREFIX_CACHE:
+            self.prefixes.popitem(last=False)
+        return [union]
+
+    def search(self, text:str='', team:str='', comp:str='', player:str='', states:set[int]|None=None,
+               day:date|None=None, after:int=0, limit:int=50) -> tuple[list[str], bool]:
+        # ids of up to limit matching matches with seq > after in seq order, and whether more match
+        with self.lock:
+            filters: list[list[set[str]]] = []  # every filter must hold, one of each filter's sets must hold
+            for word in words(text):
+                filters.append([ids for name in FIELDS for ids in self._prefixed(name, word)])
+            for name, query in (("team", team), ("comp", comp), ("player", player)):
+                filters += [self._prefixed(name, word) for word in words(query)]
+            if states is not None:
+                filters.append([self.by_state[state] for state in states if state in self.by_state])
+            if day is not None:
+                filters.append([self.by_day[day]] if day in self.by_day else [])
+            filters.sort(key=lambda sets: sum(map(len, sets)))
+            smallest = sum(map(len, filters[0])) if filters else len(self.docs)
+            wanted = limit + 1
+            if limit and smallest * smallest > wanted * len(self.docs):
+                # walking matches in seq order until the page is full is expected to look at fewer matches than
+                # intersecting; the walk gives up past smallest matches, when intersecting would have been cheaper
+                page = self._scan(filters, after, wanted, budget=smallest)
+                if page is not None:
+                    return page[:limit], len(page) > limit
+            if not filters:
+                position = bisect.bisect_right(self.order, (after, '\U0010ffff'))
+                page = self.order[position:position + limit + 1] if limit else self.order[position:]
+                return [match_id for _, match_id in page[:limit or None]], bool(limit) and len(page) > limit
+            seq_of = self.seqs.__getitem__
+            hits = sorted(self._intersect(filters), key=seq_of)
+            position = bisect.bisect_right(hits, after, key=seq_of)
+        page = hits[position:position + limit + 1] if limit else hits[position:]
+        return page[:limit or None], bool(limit) and len(page) > limit
+
+    @staticmethod
+    def _intersect(filters:list[list[set[str]]]) -> set[str]:
+        first, rest = filters[0], filters[1:]
+        found = first[0] if len(first) == 1 else set().union(*first)
+        for sets in rest:
+            if not found:
+                break
+            found = found & sets[0] if len(sets) == 1 else set().union(*[found & ids for ids in sets])
+        return found
+
+    def _scan(self, filters:list[list[set[str]]], after:int, wanted:int, budget:int) -> list[str]|None:
+        # called with the lock held; None once more than budget matches were looked at
+        order = self.order
+        page = []
+        position = bisect.bisect_right(order, (after, '\U0010ffff'))
+        for _, match_id in itertools.islice(order, position, None):
+            budget -= 1
+            if budget < 0:
+                return None
+            for sets in filters:
+                if not any(match_id in ids for ids in sets):
+                    break
+            else:
+                page.append(match_id)
+                if len(page) == wanted:
+                    break
+        return page
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"matches": len(self.docs), **{f"{name}_terms": len(self.vocabulary[name]) for name in FIELDS}}
@@ -0,0 +1,381 @@
+"""
+# matchstore.py
+Where the routes find matches and apply changes to them.
+
+MemoryMatchStore keeps the match objects of a single process. SQLiteMatchStore shares them between worker
+processes through one SQLite database in WAL mode: each match is a row holding its pickled state and a row
+version bumped by every committed change, the answers to the current question are rows of their own so storing
+one answer never rewrites the match. Every change runs in a BEGIN IMMEDIATE transaction against the latest row;
+reads only compare the row version with the copy a worker already holds, fetch the answers stored since, and
+never block writers. Versions come from one store-wide counter and removals leave a tombstone, so indexes a
+worker keeps on the side catch up through changes() instead of reloading every match.
+"""
+
+from collections.abc import Callable
+from contextlib import contextmanager
+import bisect
+import itertools
+import pickle
+import sqlite3
+import threading
+
+from adapters.abstract import BaseMatch
+
+class MatchStore:
+    def __init__(self, on_load:Callable[[BaseMatch], None]|None=None):
+        # on_load is called with every match object the store rebuilds, to attach observers and loggers
+        self.on_load = on_load
+
+    def find(self, match_id:str) -> BaseMatch|None:
+        raise NotImplementedError("find must be implemented in subclasses")
+
+    def get(self, match_id:str) -> BaseMatch:
+        if not match_id:
+            raise ValueError('Match ID is required')
+        match = self.find(match_id)
+        if match is None:
+            raise ValueError('Match not found')
+        return match
+
+    def matches(self) -> list[BaseMatch]:
+        # every match, in registration (seq) order
+        raise NotImplementedError("matches must be implemented in subclasses")
+
+    def page(self, after:int, limit:int) -> list[BaseMatch]:
+        # up to limit matches registered after seq after, in seq order
+        raise NotImplementedError("page must be implemented in subclasses")
+
+    def count(self, after:int=0) -> int:
+        # how many matches were registered after seq after
+        raise NotImplementedError("count must be implemented in subclasses")
+
+    def iter_matches(self, after:int=0, batch:int=100):
+        # lazily walks the matches registered after seq after, only a batch is ever loaded at once
+        while True:
+            page = self.page(after, batch)
+            yield from page
+            if len(page) < batch:
+                return
+            after = page[-1].seq
+
+    def add(self, match:BaseMatch):
+        raise NotImplementedError("add must be implemented in subclasses")
+
+    def mutate(self, match_id:str, change:Callable[[BaseMatch], object]):
+        # applies change to the latest state of the match and keeps the result, returns what change returned
+        raise NotImplementedError("mutate must be implemented in subclasses")
+
+    def remove(self, match_id:str) -> bool:
+        raise NotImplementedError("remove must be implemented in subclasses")
+
+    def clear(self):
+        raise NotImplementedError("clear must be implemented in subclasses")
+
+class MemoryMatchStore(MatchStore):
+    def __init__(self, on_load:Callable[[BaseMatch], None]|None=None):
+        super().__init__(on_load)
+        self.lock = threading.Lock()
+        self.items: list[BaseMatch] = []
+        self.index: dict[str, BaseMatch] = {}
+        self.sequence = itertools.count(1)
+
+    def find(self, match_id:str) -> BaseMatch|None:
+        return self.index.get(match_id, None)
+
+    def matches(self) -> list[BaseMatch]:
+        with self.lock:
+            return list(self.items)
+
+    def page(self, after:int, limit:int) -> list[BaseMatch]:
+        with self.lock:
+            start = bisect.bisect_right(self.items, after, key=lambda match: match.seq)
+            return self.items[start:start + limit]
+
+    def count(self, after:int=0) -> int:
+        with self.lock:
+            return len(self.items) - bisect.bisect_right(self.items, after, key=lambda match: match.seq)
+
+    def add(self, match:BaseMatch):
+        with self.lock:
+            if match.match_id in self.index:
+                raise ValueError("Match with this ID already exists")
+            match.seq = next(self.sequence)
+            self.items.append(match)
+            self.index[match.match_id] = match
+
+    def mutate(self, match_id:str, change:Callable[[BaseMatch], object]):
+        match = self.get(match_id)
+        with match.lock:
+            return change(match)
+
+    def remove(self, match_id:str) -> bool:
+        with self.lock:
+            match = self.index.pop(match_id, None)
+            if match is None:
+                return False
+            self.items.remove(match)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.index.clear()
+
+class SQLiteMatchStore(MatchStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS matches (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_id TEXT NOT NULL UNIQUE,
+            version INTEGER NOT NULL,
+            body_version INTEGER NOT NULL,
+            body BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS answers (
+            match_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            PRIMARY KEY (match_id, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS removed (
+            match_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO counters (name, value) VALUES ('version', 0);
+        CREATE INDEX IF NOT EXISTS matches_body_version ON matches (body_version);
+    """
+
+    def __init__(self, path:str, on_load:Callable[[BaseMatch], None]|None=None, timeout:float=5.0):
+        super().__init__(on_load)
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()  # sqlite3 connections stay on the thread that opened them
+        self.lock = threading.Lock()
+        self.cache: dict[str, tuple[int, int, BaseMatch]] = {}  # match_id -> (row version, body version, match object)
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(self.SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # autocommit, transactions are opened explicitly around changes
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def snapshot(self, connection:sqlite3.Connection):
+        # reads of a row and its answers see one state of the database, in WAL mode this never blocks a writer
+        if connection.in_transaction:
+            yield
+            return
+        connection.execute("BEGIN")
+        try:
+            yield
+        finally:
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def _next_version(connection:sqlite3.Connection) -> int:
+        # versions come from one counter, so they never repeat even when a match id is removed and added again
+        connection.execute("UPDATE counters SET value = value + 1 WHERE name = 'version'")
+        (version,) = connection.execute("SELECT value FROM counters WHERE name = 'version'").fetchone()
+        return version
+
+    def _keep(self, match_id:str, entry:tuple[int, int, BaseMatch]|None):
+        with self.lock:
+            previous = self.cache.pop(match_id, None)
+            if entry is not None:
+                self.cache[match_id] = entry
+        if previous is not None and (entry is None or previous[2] is not entry[2]):
+            # a dropped copy must not keep a question timer running, its waiters go read the current copy
+            previous[2]._release_question_waiters()
+
+    def _load(self, connection:sqlite3.Connection, match_id:str, seq:int, version:int, body_version:int) -> BaseMatch:
+        with self.lock:
+            cached = self.cache.get(match_id, None)
+        if cached is not None and cached[0] >= version:
+            return cached[2]
+        if cached is not None and cached[1] == body_version:
+            # only answers were stored since the copy we hold, fetch just those
+            match = cached[2]
+            rows = connection.execute("SELECT user_id, body FROM answers WHERE match_id = ? AND version > ? AND version <= ?",
+                                      (match_id, cached[0], version)).fetchall()
+            with match.lock:
+                # a change committed by this process meanwhile has already moved the copy past these rows
+                with self.lock:
+                    current = self.cache.get(match_id, None) is cached
+                if current:
+                    match.current_answers.update((user_id, pickle.loads(body)) for user_id, body in rows)
+                    self._keep(match_id, (version, body_version, match))
+                    return match
+        (body,) = connection.execute("SELECT body FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        cls, state = pickle.loads(body)
+        match: BaseMatch = cls.__new__(cls)
+        match.__setstate__(state)
+        match.seq = seq
+        rows = connection.execute("SELECT user_id, body FROM answers WHERE match_id = ?", (match_id,)).fetchall()
+        match.current_answers = {user_id: pickle.loads(body) for user_id, body in rows}
+        if self.on_load is not None:
+            self.on_load(match)
+        self._keep(match_id, (version, body_version, match))
+        return match
+
+    def _write(self, connection:sqlite3.Connection, match:BaseMatch, version:int):
+        # the body leaves the answers out, they live in their own rows so storing one rewrites only that row
+        state = match.__getstate__()
+        state['current_answers'] = {}
+        body = pickle.dumps((type(match), state), pickle.HIGHEST_PROTOCOL)
+        connection.execute("INSERT INTO matches (match_id, version, body_version, body) VALUES (?, ?, ?, ?) "
+                           "ON CONFLICT (match_id) DO UPDATE SET version = excluded.version, "
+                           "body_version = excluded.body_version, body = excluded.body",
+                           (match.match_id, version, version, body))
+        connection.execute("DELETE FROM answers WHERE match_id = ?", (match.match_id,))
+        self._write_answers(connection, match, match.current_answers, version)
+
+    def _write_answers(self, connection:sqlite3.Connection, match:BaseMatch, user_ids, version:int):
+        connection.executemany("INSERT OR REPLACE INTO answers (match_id, user_id, version, body) VALUES (?, ?, ?, ?)",
+                               [(match.match_id, user_id, version, pickle.dumps(match.current_answers[user_id], pickle.HIGHEST_PROTOCOL))
+                                for user_id in user_ids])
+
+    def find(self, match_id:str) -> BaseMatch|None:
+        connection = self.connection()
+        with self.snapshot(connection):
+            row = connection.execute("SELECT seq, version, body_version FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            if row is None:
+                self._keep(match_id, None)
+                return None
+            return self._load(connection, match_id, *row)
+
+    def matches(self) -> list[BaseMatch]:
+        connection = self.connection()
+        with self.snapshot(connection):
+            rows = connection.execute("SELECT match_id, seq, version, body_version FROM matches ORDER BY seq").fetchall()
+            present = {row[0] for row in rows}
+            with self.lock:
+                gone = [match_id for match_id in self.cache if match_id not in present]
+            for match_id in gone:
+                self._keep(match_id, None)
+            return [self._load(connection, *row) for row in rows]
+
+    def page(self, after:int, limit:int) -> list[BaseMatch]:
+        # only the rows on the page are read and, unless already cached, unpickled
+        connection = self.connection()
+        with self.snapshot(connection):
+            rows = connection.execute("SELECT match_id, seq, version, body_version FROM matches WHERE seq > ? "
+                                      "ORDER BY seq LIMIT ?", (after, limit)).fetchall()
+            return [self._load(connection, *row) for row in rows]
+
+    def count(self, after:int=0) -> int:
+        (count,) = self.connection().execute("SELECT COUNT(*) FROM matches WHERE seq > ?", (after,)).fetchone()
+        return count
+
+    def changes(self, since:int) -> tuple[int, list[BaseMatch], list[str]]:
+        # (version, matches whose body changed, ids removed) after version since, for indexes kept per worker
+        connection = self.connection()
+        with self.snapshot(connection):
+            (version,) = connection.execute("SELECT value FROM counters WHERE name = 'version'").fetchone()
+            rows = connection.execute("SELECT match_id, seq, version, body_version FROM matches WHERE body_version > ? "
+                                      "ORDER BY seq", (since,)).fetchall()
+            removed = [match_id for (match_id,) in connection.execute("SELECT match_id FROM removed WHERE version > ?", (since,))]
+            return version, [self._load(connection, *row) for row in rows], removed
+
+    def add(self, match:BaseMatch):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("SELECT 1 FROM matches WHERE match_id = ?", (match.match_id,)).fetchone() is not None:
+                raise ValueError("Match with this ID already exists")
+            version = self._next_version(connection)
+            with match.lock:
+                self._write(connection, match, version)
+            (match.seq,) = connection.execute("SELECT seq FROM matches WHERE match_id = ?", (match.match_id,)).fetchone()
+            connection.execute("DELETE FROM removed WHERE match_id = ?", (match.match_id,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._keep(match.match_id, (version, version, match))
+
+    def mutate(self, match_id:str, change:Callable[[BaseMatch], object]):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT seq, version, body_version FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            if row is None:
+                raise ValueError('Match not found')
+            seq, version, body_version = row
+            match = self._load(connection, match_id, seq, version, body_version)
+            rejection, stored = None, []
+            def collect(match, event, answer=None, **details):
+                if event == "answer_stored":
+                    stored.append(answer.player_info['user_id'])
+            # the cache is updated before the match lock is released, readers never apply older answers over this change
+            with match.lock:
+                touched, answers = match.version, match.current_answers
+                match.observers.append(collect)
+                try:
+                    result = change(match)
+                except ValueError as ve:
+                    # a rejected change keeps whatever it already did, as it would in memory
+                    rejection, result = ve, None
+                finally:
+                    match.observers.remove(collect)
+                if match.version != touched or match.current_answers is not answers or (rejection is None and not stored):
+                    version = body_version = self._next_version(connection)
+                    self._write(connection, match, version)
+                elif stored:
+                    # answers were only added, the body stays as it is
+                    version = self._next_version(connection)
+                    self._write_answers(connection, match, dict.fromkeys(stored), version)
+                    connection.execute("UPDATE matches SET version = ? WHERE match_id = ?", (version, match_id))
+                connection.execute("COMMIT")
+                self._keep(match_id, (version, body_version, match))
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            # the cached object may hold the rolled back changes
+            self._keep(match_id, None)
+            raise
+        if rejection is not None:
+            raise rejection
+        return result
+
+    def remove(self, match_id:str) -> bool:
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            removed = connection.execute("DELETE FROM matches WHERE match_id = ?", (match_id,)).rowcount > 0
+            connection.execute("DELETE FROM answers WHERE match_id = ?", (match_id,))
+            if removed:
+                connection.execute("INSERT OR REPLACE INTO removed (match_id, version) VALUES (?, ?)",
+                                   (match_id, self._next_version(connection)))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._keep(match_id, None)
+        return removed
+
+    def clear(self):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("INSERT OR REPLACE INTO removed (match_id, version) SELECT match_id, ? FROM matches",
+                               (self._next_version(connection),))
+            connection.execute("DELETE FROM matches")
+            connection.execute("DELETE FROM answers")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        with self.lock:
+            dropped, self.cache = self.cache, {}
+        for _, _, match in dropped.values():
+            match._release_question_waiters()
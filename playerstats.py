@@ -0,0 +1,205 @@
+"""
+# playerstats.py
+Per-player performance index fed by match events.
+
+Every stored answer updates submission counts and reaction times, every graded question updates
+correctness, accuracy and streaks. Reaction-time percentiles use P-square estimators, so the memory
+held per player stays constant no matter how many answers they submit.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+import threading
+
+REACTION_QUANTILES = (0.5, 0.9, 0.99)
+
+class P2Quantile:
+    # Jain & Chlamtac's P-square algorithm: five markers track a single quantile of a stream
+    def __init__(self, q:float):
+        self.q = q
+        self.heights: list[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x:float):
+        h = self.heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= h[k + 1]:
+                k += 1
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+                h[i] = candidate
+                n[i] += step
+
+    def _parabolic(self, i:int, step:int) -> float:
+        h, n = self.heights, self.positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float|None:
+        h = self.heights
+        if not h:
+            return None
+        if len(h) < 5:
+            return h[min(len(h) - 1, int(round(self.q * (len(h) - 1))))]
+        return h[2]
+
+@dataclass
+class PlayerStats:
+    user_id: str
+    user_name: str = ''
+    team: str = ''
+    submitted: int = 0
+    graded: int = 0
+    correct: int = 0
+    current_streak: int = 0
+    best_streak: int = 0
+    w2s_hits: int = 0
+    reaction_count: int = 0
+    reaction_total: float = 0.0
+    reaction_quantiles: list[P2Quantile] = field(default_factory=lambda: [P2Quantile(q) for q in REACTION_QUANTILES])
+
+    def add_reaction(self, seconds:float):
+        self.reaction_count += 1
+        self.reaction_total += seconds
+        for estimator in self.reaction_quantiles:
+            estimator.add(seconds)
+
+    def add_grade(self, is_correct:bool):
+        self.graded += 1
+        if is_correct:
+            self.correct += 1
+            self.current_streak += 1
+            self.best_streak = max(self.best_streak, self.current_streak)
+        else:
+            self.current_streak = 0
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "user_name": self.user_name,
+            "team": self.team,
+            "submitted": self.submitted,
+            "graded": self.graded,
+            "correct": self.correct,
+            "accuracy": self.correct / self.graded if self.graded else None,
+            "current_streak": self.current_streak,
+            "best_streak": self.best_streak,
+            "w2s_hits": self.w2s_hits,
+            "reaction_time": {
+                "mean": self.reaction_total / self.reaction_count if self.reaction_count else None,
+                **{f"p{int(estimator.q * 100)}": estimator.value() for estimator in self.reaction_quantiles},
+            },
+        }
+
+class PlayerStatsIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.players: dict[str, PlayerStats] = {}  # user_id -> stats, names aren't unique and can change
+        self.teams: dict[str, set[str]] = {}  # team -> user_ids
+
+    def __call__(self, match, event:str, **details):
+        if event == "answer_stored":
+            self.record_submission(details.get('answer', None), details.get('question', None))
+        elif event == "graded":
+            self.record_grades(details.get('answers', []), details.get('correct_answers', []))
+        elif event == "bonus":
+            self.record_bonus(details.get('answer', None))
+
+    def _player(self, player_info:dict) -> PlayerStats|None:
+        user_id = player_info.get('user_id', '')
+        if not user_id:
+            return None
+        name = player_info.get('user_name', '')
+        team = player_info.get('user_affiliation', '')
+        stats = self.players.get(user_id, None)
+        if stats is None:
+            stats = self.players[user_id] = PlayerStats(user_id=user_id, user_name=name, team=team)
+        if name:
+            stats.user_name = name
+        if team and stats.team != team:
+            self.teams.get(stats.team, set()).discard(user_id)
+            stats.team = team
+        self.teams.setdefault(stats.team, set()).add(user_id)
+        return stats
+
+    def record_submission(self, answer, question):
+        if answer is None:
+            return
+        with self.lock:
+            stats = self._player(answer.player_info)
+            if stats is None:
+                return
+            stats.submitted += 1
+            sent_date = getattr(question, 'sendDate', None)
+            if isinstance(sent_date, datetime):
+                stats.add_reaction(max(0.0, (answer.time_received - sent_date).total_seconds()))
+
+    def record_grades(self, answers:list, correct_answers:list):
+        correct_ids = {id(ans) for ans in correct_answers}
+        with self.lock:
+            for ans in answers:
+                stats = self._player(ans.player_info)
+                if stats is not None:
+                    stats.add_grade(id(ans) in correct_ids)
+
+    def record_bonus(self, answer):
+        if answer is None:
+            return
+        with self.lock:
+            stats = self._player(answer.player_info)
+            if stats is not None:
+                stats.w2s_hits += 1
+
+    def player(self, user_id:str) -> dict:
+        with self.lock:
+            stats = self.players.get(user_id, None)
+            if stats is None:
+                raise ValueError('Player not found')
+            return stats.to_dict()
+
+    def team(self, team:str) -> dict:
+        with self.lock:
+            user_ids = self.teams.get(team, None)
+            if not user_ids:
+                raise ValueError('Team not found')
+            players = sorted((self.players[user_id] for user_id in user_ids), key=lambda stats: (stats.user_name, stats.user_id))
+            graded = sum(stats.graded for stats in players)
+            correct = sum(stats.correct for stats in players)
+            return {
+                "team": team,
+                "submitted": sum(stats.submitted for stats in players),
+                "graded": graded,
+                "correct": correct,
+                "accuracy": correct / graded if graded else None,
+                "w2s_hits": sum(stats.w2s_hits for stats in players),
+                "players": [stats.to_dict() for stats in players],
+            }
+
+    def clear(self):
+        with self.lock:
+            self.players.clear()
+            self.teams.clear()
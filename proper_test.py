@@ -3,7 +3,12 @@
 Ragnarok Conformance Runner (portable test runner)
 
 Usage:
-  python3 conformance_runner.py path/to/spec.json
+  python3 conformance_runner.py path/to/spec.json [--in-process] [--jobs=N]
+
+  --in-process  drive ragnarok.app through Flask's test client instead of HTTP, with fake_cerberus answering
+                token introspection in the same process and sleeps advancing a fake clock instead of blocking
+  --jobs=N      run up to N jobs at once: the chain of dependent cases is one job, every independent case another;
+                a case sending one of spec.exclusive_requests runs while no other case does
 
 Spec schema (high level):
 {
@@ -15,6 +20,7 @@ Spec schema (high level):
     {
       "id": "case-001",
       "name": "Create match",
+      "independent": false,
       "steps": [
         {
           "request": {
@@ -26,9 +32,10 @@ Spec schema (high level):
           },
           "expect": {
             "status": 201,
-            "capture": [ { "name": "match_id", "path": "$.match_id" } ],
+            "capture": [ { "name": "match_id", "path": "$.match_id" }, { "name": "next", "header": "X-Next-Cursor" } ],
             "assert_json": [ { "op": "exists", "path": "$.message" } ],
-            "assert_headers": [ { "op": "exists", "name": "Content-Type" } ]
+            "assert_headers": [ { "op": "exists", "name": "Content-Type" } ],
+            "skip_on": [ 501 ]
           }
         },
         { "action": { "type": "sleep", "seconds": 1.0 } }
@@ -42,7 +49,17 @@ Notes:
 - Substitutions:
     ${fixtures.match_id}, ${captures.some_value}, ${env.SOME_ENV}
 - wait_from_try_again_at:
-    parses an ISO8601 timestamp from captured text that contains "Try again at <timestamp>"
+    waits until the time the response a capture came from said to retry at: its "retry_at" field ($.retry_at
+    or $.question.retry_at), else its Retry-After header, else a "Try again at <timestamp>" in the captured text.
+    Without from_capture it uses the last response.
+- Cases run in spec order and share captures, stopping at the first failure. A case marked "independent"
+  runs on its own instead, possibly alongside the others, with fresh captures and every fixture named in
+  spec.namespaced_fixtures (default ["match_id"]) suffixed with its case id, so it never touches their matches.
+- A capture with "header" instead of "path" takes that response header, e.g. X-Next-Cursor.
+- expect.skip_on lists statuses that mean the server does not offer what the case tests (e.g. [501]): the
+  case stops there and counts as SKIP instead of FAIL, so give it to a step that runs before anything to undo.
+- A case sending a request that reaches past its own matches, one of spec.exclusive_requests given as
+  [method, path] (default [["DELETE", "/matches"]]), never runs alongside another case under --jobs.
 """
 
 from __future__ import annotations
@@ -51,12 +68,17 @@ import json
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
 
 
 # -------------------------
@@ -71,6 +93,10 @@ class AssertionFailure(Exception):
     pass
 
 
+class CaseSkipped(Exception):
+    pass
+
+
 # -------------------------
 # Utilities
 # -------------------------
@@ -90,16 +116,36 @@ def parse_iso8601(s: str) -> datetime:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(timezone.utc)
 
-def wait_from_try_again_at(text: str, fudge_seconds: float = 1.0) -> float:
-    m = ISO_RE.search(text.strip())
-    if not m:
-        raise AssertionFailure(f"Could not find 'Try again at <timestamp>' in: {text!r}")
-    when = parse_iso8601(m.group(1))
-    print(f"Parsed try again at: {when.isoformat()}, current time is {datetime.now(tz=timezone.utc).isoformat()}")
-    delta = (when - datetime.now(tz=timezone.utc)).total_seconds()
-    print(f"Waiting until {when.isoformat()} (in {delta:.2f} seconds)...")
+def retry_hint(ctx: Context, resp: Any, doc: Any) -> Optional[datetime]:
+    """
+    The structured time a response says to retry at: a retry_at field, else a Retry-After header.
+    """
+    if isinstance(doc, dict):
+        for holder in (doc, doc.get("question")):
+            if isinstance(holder, dict) and isinstance(holder.get("retry_at"), str):
+                return parse_iso8601(holder["retry_at"])
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after and retry_after.strip().isdigit():
+        return current_time(ctx) + timedelta(seconds=int(retry_after))
+    return None
+
+def wait_from_try_again_at(ctx: Context, text: str, fudge_seconds: float = 1.0,
+                           hint: Optional[datetime] = None) -> float:
+    source = "retry hint"
+    if hint is not None:
+        when = hint
+    else:
+        source = "message text"
+        m = ISO_RE.search(text.strip())
+        if not m:
+            raise AssertionFailure(f"No retry_at, Retry-After or 'Try again at <timestamp>' in: {text!r}")
+        when = parse_iso8601(m.group(1))
+    now = current_time(ctx)
+    ctx.log(f"Retry at {when.isoformat()} (from the {source}), current time is {now.isoformat()}")
+    delta = (when - now).total_seconds()
+    ctx.log(f"Waiting until {when.isoformat()} (in {delta:.2f} seconds)...")
     if delta > 0:
-        time.sleep(delta + fudge_seconds)
+        pause(ctx, delta + fudge_seconds)
     return max(delta, 0.0)
 
 
@@ -202,6 +248,33 @@ class Context:
     env: Dict[str, str] = field(default_factory=dict)
     tokens: Dict[str, str] = field(default_factory=dict)  # tokenName -> tokenValue
     sessions: Dict[str, requests.Session] = field(default_factory=dict)  # tokenName -> session
+    transport: Optional[InProcessTransport] = None  # None sends real HTTP requests to base_url
+    clock: Any = None  # the FakeClock the app reads for this context's requests, in-process only
+    slept: float = 0.0  # seconds spent in sleep and wait actions, virtual when there is a clock
+    retry_hints: Dict[str, Optional[datetime]] = field(default_factory=dict)  # capture name -> its response's retry time
+    last_retry_hint: Optional[datetime] = None
+    output: Optional[List[str]] = None  # buffered progress lines when cases run in parallel
+
+    def log(self, line: str) -> None:
+        if self.output is None:
+            print(line)
+        else:
+            self.output.append(line)
+
+def current_time(ctx: Context) -> datetime:
+    if ctx.clock is not None:
+        return ctx.clock.now()
+    return datetime.now(tz=timezone.utc)
+
+def pause(ctx: Context, seconds: float) -> None:
+    """
+    Sleeps for real over HTTP; in-process the context's clock is moved forward instead.
+    """
+    if ctx.clock is not None:
+        ctx.clock.advance(seconds)
+    else:
+        time.sleep(seconds)
+    ctx.slept += seconds
 
 def resolve_ref(ctx: Context, ref: str) -> Any:
     ref = ref.strip()
@@ -238,6 +311,74 @@ def substitute(ctx: Context, obj: Any) -> Any:
     return obj
 
 
+# -------------------------
+# In-process transport
+# -------------------------
+
+class InProcessResponse:
+    """
+    The parts of requests.Response the runner reads, over a Flask test response.
+    """
+    def __init__(self, resp: Any):
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self.text = resp.get_data(as_text=True)
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+class WSGIAdapter(BaseAdapter):
+    """
+    Answers requests sent through a requests.Session from a WSGI app in this process.
+    """
+    def __init__(self, app: Any):
+        super().__init__()
+        self.app = app
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        url = urlsplit(request.url)
+        resp = self.app.test_client().open(url.path, method=request.method, query_string=url.query,
+                                           headers=dict(request.headers), data=request.body)
+        response = requests.Response()
+        response.status_code = resp.status_code
+        response.reason = resp.status.partition(" ")[2]
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response._content = resp.get_data()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+class InProcessTransport:
+    """
+    Sends requests to ragnarok.app through Flask's test client, without a server.
+
+    Token introspection is answered by fake_cerberus.app in the same process. Each context has its own
+    FakeClock, which the match engine reads while it handles that context's requests.
+    """
+    def __init__(self) -> None:
+        import fake_cerberus
+        import fimbulwinter
+        import ragnarok
+        from adapters.abstract import FakeClock, using_clock
+
+        self.app = ragnarok.app
+        self.new_clock: Callable[[], Any] = FakeClock
+        self.using_clock = using_clock
+        fimbulwinter.AUTH_SESSION.mount(ragnarok.AUTH_SERVICE_URL, WSGIAdapter(fake_cerberus.app))
+
+    def request(self, ctx: Context, method: str, path: str, headers: Dict[str, str], body_json: Any,
+                cookies: Optional[Dict[str, str]]) -> InProcessResponse:
+        h = dict(headers)
+        if cookies:
+            h["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        with self.using_clock(ctx.clock):
+            resp = self.app.test_client().open(path, method=method, headers=h, json=body_json)
+            return InProcessResponse(resp)
+
+
 # -------------------------
 # Assertions
 # -------------------------
@@ -355,14 +496,19 @@ def load_spec(path: str) -> Dict[str, Any]:
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def build_context(spec: Dict[str, Any]) -> Context:
+def build_context(spec: Dict[str, Any], transport: Optional[InProcessTransport] = None,
+                  namespace: str = "") -> Context:
     base_env = spec.get("base_url_env", "RAGNAROK_BASE_URL")
     base_url = os.getenv(base_env, "http://localhost:5000").strip()
     if not base_url:
         raise SpecError(f"Missing base URL env var {base_env!r}")
     base_url = base_url.rstrip("/")
 
-    fixtures = spec.get("fixtures", {}) or {}
+    fixtures = dict(spec.get("fixtures", {}) or {})
+    if namespace:
+        for name in spec.get("namespaced_fixtures", ["match_id"]):
+            if isinstance(fixtures.get(name), str):
+                fixtures[name] = f"{fixtures[name]}-{namespace}"
 
     # Load token values from env var names
     token_env_map = spec.get("tokens", {}) or {}
@@ -380,7 +526,11 @@ def build_context(spec: Dict[str, Any]) -> Context:
         env=dict(os.environ),
         tokens=tokens,
         sessions={},
+        transport=transport,
+        clock=transport.new_clock() if transport is not None else None,
     )
+    if transport is not None:
+        return ctx
 
     # Create a session per token to preserve cookies if you later rely on them.
     for token_name, token_val in tokens.items():
@@ -393,7 +543,7 @@ def build_context(spec: Dict[str, Any]) -> Context:
 
     return ctx
 
-def send_request(ctx: Context, req: Dict[str, Any]) -> requests.Response:
+def send_request(ctx: Context, req: Dict[str, Any]) -> requests.Response|InProcessResponse:
     method = (req.get("method") or "").upper()
     path = req.get("path")
     token_name = req.get("token")  # may be None
@@ -414,6 +564,15 @@ def send_request(ctx: Context, req: Dict[str, Any]) -> requests.Response:
 
     url = ctx.base_url + path
 
+    if ctx.transport is not None:
+        h = {"Accept": "application/json"}
+        if token_name:
+            if token_name not in ctx.tokens:
+                raise SpecError(f"Unknown token name: {token_name!r}")
+            h["Authorization"] = f"Bearer {ctx.tokens[token_name]}"
+        h.update(headers)
+        return ctx.transport.request(ctx, method, path, h, body_json, cookies)
+
     sess: Optional[requests.Session] = None
     if token_name:
         if token_name not in ctx.sessions:
@@ -445,16 +604,19 @@ def run_step(ctx: Context, step: Dict[str, Any]) -> None:
         if atype == "sleep":
             seconds = float(action.get("seconds", 0))
             if seconds > 0:
-                time.sleep(seconds)
+                pause(ctx, seconds)
             return
 
         if atype == "wait_from_try_again_at":
             cap = action.get("from_capture")
             if not cap:
-                raise SpecError("wait_from_try_again_at requires from_capture")
+                if ctx.last_retry_hint is None:
+                    raise AssertionFailure("The last response gave no retry_at or Retry-After")
+                wait_from_try_again_at(ctx, "", hint=ctx.last_retry_hint)
+                return
             if cap not in ctx.captures:
                 raise AssertionFailure(f"Missing capture {cap!r} for wait_from_try_again_at")
-            wait_from_try_again_at(str(ctx.captures[cap]))
+            wait_from_try_again_at(ctx, str(ctx.captures[cap]), hint=ctx.retry_hints.get(cap))
             return
 
         if atype == "set_capture":
@@ -480,6 +642,10 @@ def run_step(ctx: Context, step: Dict[str, Any]) -> None:
     if want_status is None:
         raise SpecError("expect.status is required")
 
+    if resp.status_code in (exp.get("skip_on") or []):
+        preview = (resp.text or "")[:200].replace("\n", " ")
+        raise CaseSkipped(f"{req.get('method')} {req.get('path')} answered {resp.status_code}, body={preview!r}")
+
     if resp.status_code != int(want_status):
         # include a useful preview
         preview = (resp.text or "")[:600].replace("\n", " ")
@@ -495,6 +661,7 @@ def run_step(ctx: Context, step: Dict[str, Any]) -> None:
 
     # Parse JSON for captures and json assertions
     doc = parse_json_response(resp)
+    ctx.last_retry_hint = retry_hint(ctx, resp, doc)
 
     # Captures
     for cap in (exp.get("capture") or []):
@@ -502,10 +669,17 @@ def run_step(ctx: Context, step: Dict[str, Any]) -> None:
         path = cap.get("path", "$")
         if not name:
             raise SpecError("capture requires name")
+        if "header" in cap:
+            if cap["header"] not in resp.headers:
+                raise AssertionFailure(f"Cannot capture {name!r} because header {cap['header']!r} is missing")
+            ctx.captures[name] = resp.headers[cap["header"]]
+            ctx.retry_hints[name] = ctx.last_retry_hint
+            continue
         if doc is None:
             raise AssertionFailure(f"Cannot capture {name!r} because response is not JSON")
         val = get_by_path(doc, path)
         ctx.captures[name] = val
+        ctx.retry_hints[name] = ctx.last_retry_hint
 
     # JSON assertions
     for ja in (exp.get("assert_json") or []):
@@ -514,9 +688,111 @@ def run_step(ctx: Context, step: Dict[str, Any]) -> None:
         ja = substitute(ctx, ja)
         assert_json(ja, doc, ctx)
 
-def run_suite(spec_path: str) -> None:
+@dataclass
+class CaseResult:
+    case_id: str
+    name: str
+    status: str  # PASS, FAIL or SKIP
+    reason: str = ""
+    seconds: float = 0.0  # wall clock
+    slept: float = 0.0  # of which (or, in-process, in addition) spent in sleep and wait actions
+    output: List[str] = field(default_factory=list)
+
+def run_case(ctx: Context, case: Dict[str, Any]) -> CaseResult:
+    cid = case.get("id", "case-without-id")
+    name = case.get("name", "")
+    steps = case.get("steps") or []
+    if ctx.output is not None:
+        ctx.output = []
+
+    ctx.log("")
+    ctx.log(f"[CASE {cid}] {name}")
+
+    started, slept = time.perf_counter(), ctx.slept
+    result = CaseResult(cid, name, "PASS")
+    try:
+        for i, step in enumerate(steps, start=1):
+            ctx.log(f"  Step {i}/{len(steps)} ...")
+            run_step(ctx, step)
+        ctx.log(f"  Result: PASS")
+    except (AssertionFailure, SpecError) as e:
+        ctx.log(f"  Result: FAIL")
+        ctx.log(f"  Reason: {e}")
+        result.status, result.reason = "FAIL", str(e)
+    except CaseSkipped as e:
+        ctx.log(f"  Result: SKIP")
+        ctx.log(f"  Reason: {e}")
+        result.status, result.reason = "SKIP", str(e)
+    result.seconds = time.perf_counter() - started
+    result.slept = ctx.slept - slept
+    result.output = ctx.output or []
+    return result
+
+class CaseGate:
+    """
+    Lets any number of cases run at once, except exclusive ones, which wait for the others to finish
+    and hold back new ones until they are done.
+    """
+    def __init__(self, spec: Dict[str, Any]):
+        self.requests = {(method.upper(), path) for method, path in spec.get("exclusive_requests", [["DELETE", "/matches"]])}
+        self.changed = threading.Condition()
+        self.running = 0
+        self.exclusive = 0  # exclusive cases running or waiting to
+
+    def is_exclusive(self, case: Dict[str, Any]) -> bool:
+        for step in case.get("steps") or []:
+            req = step.get("request") or {}
+            if (str(req.get("method", "GET")).upper(), req.get("path", "")) in self.requests:
+                return True
+        return False
+
+    def run(self, ctx: Context, case: Dict[str, Any]) -> CaseResult:
+        exclusive = self.is_exclusive(case)
+        with self.changed:
+            if exclusive:
+                self.exclusive += 1
+                self.changed.wait_for(lambda: self.running == 0)
+            else:
+                self.changed.wait_for(lambda: self.exclusive == 0)
+            self.running += 1
+        try:
+            return run_case(ctx, case)
+        finally:
+            with self.changed:
+                self.running -= 1
+                if exclusive:
+                    self.exclusive -= 1
+                self.changed.notify_all()
+
+def run_chain(ctx: Context, cases: List[Dict[str, Any]], gate: CaseGate) -> List[CaseResult]:
+    """
+    Runs dependent cases in order on one context.
+    Stops at the first failure, since conformance suites are usually sequential.
+    """
+    results: List[CaseResult] = []
+    failed = ""
+    for case in cases:
+        if failed:
+            results.append(CaseResult(case.get("id", "case-without-id"), case.get("name", ""), "SKIP",
+                                      f"after {failed} failed"))
+            continue
+        results.append(gate.run(ctx, case))
+        failed = results[-1].case_id if results[-1].status == "FAIL" else ""
+    return results
+
+def print_timing(results: List[CaseResult], virtual: bool) -> None:
+    width = max(len(r.case_id) for r in results)
+    print("")
+    print("Timing:")
+    for r in results:
+        waited = f"virtual wait {r.slept:.2f}s" if virtual else f"of which waiting {r.slept:.2f}s"
+        print(f"  {r.case_id:<{width}}  {r.status:<4}  {r.seconds:8.3f}s  ({waited})")
+    print(f"  {'total':<{width}}        {sum(r.seconds for r in results):8.3f}s")
+
+def run_suite(spec_path: str, in_process: bool = False, jobs: int = 1) -> None:
     spec = load_spec(spec_path)
-    ctx = build_context(spec)
+    transport = InProcessTransport() if in_process else None
+    ctx = build_context(spec, transport)
 
     suite_id = spec.get("suite_id", "unnamed-suite")
     cases = spec.get("cases") or []
@@ -524,7 +800,7 @@ def run_suite(spec_path: str) -> None:
         raise SpecError("No cases in spec")
 
     print(f"Suite: {suite_id}")
-    print(f"Base URL: {ctx.base_url}")
+    print(f"Base URL: {'in-process' if in_process else ctx.base_url}")
     print(f"Cases: {len(cases)}")
 
     total_steps = 0
@@ -532,28 +808,44 @@ def run_suite(spec_path: str) -> None:
         total_steps += len(c.get("steps") or [])
     print(f"Total steps: {total_steps}")
 
-    failures: List[Tuple[str, str]] = []
-
-    for case in cases:
-        cid = case.get("id", "case-without-id")
-        name = case.get("name", "")
-        steps = case.get("steps") or []
-
-        print("")
-        print(f"[CASE {cid}] {name}")
-
-        try:
-            for i, step in enumerate(steps, start=1):
-                print(f"  Step {i}/{len(steps)} ...")
-                run_step(ctx, step)
-            print(f"  Result: PASS")
-        except (AssertionFailure, SpecError) as e:
-            print(f"  Result: FAIL")
-            print(f"  Reason: {e}")
-            failures.append((cid, str(e)))
-            # Stop immediately, since conformance suites are usually sequential.
-            break
-
+    chain = [c for c in cases if not c.get("independent")]
+    independent = [c for c in cases if c.get("independent")]
+    suite_started = time.perf_counter()
+    results: Dict[str, CaseResult] = {}
+
+    if jobs <= 1:
+        failed = ""
+        for case in cases:
+            cid = case.get("id", "case-without-id")
+            if case.get("independent"):
+                r = run_case(build_context(spec, transport, namespace=cid), case)
+            elif failed:
+                r = CaseResult(cid, case.get("name", ""), "SKIP", f"after {failed} failed")
+            else:
+                r = run_case(ctx, case)
+                failed = cid if r.status == "FAIL" else ""
+            results[cid] = r
+    else:
+        ctx.output = []
+        gate = CaseGate(spec)
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="case") as pool:
+            futures = [pool.submit(run_chain, ctx, chain, gate)] if chain else []
+            for case in independent:
+                case_ctx = build_context(spec, transport, namespace=case.get("id", "case-without-id"))
+                case_ctx.output = []
+                futures.append(pool.submit(lambda c, k: [gate.run(c, k)], case_ctx, case))
+            for future in as_completed(futures):
+                for r in future.result():
+                    for line in r.output:
+                        print(line)
+                    results[r.case_id] = r
+    elapsed = time.perf_counter() - suite_started
+
+    ordered = [results[c.get("id", "case-without-id")] for c in cases]
+    print_timing(ordered, virtual=in_process)
+    print(f"Suite wall time: {elapsed:.3f}s")
+
+    failures: List[Tuple[str, str]] = [(r.case_id, r.reason) for r in ordered if r.status == "FAIL"]
     print("")
     if failures:
         print("Suite result: FAIL")
@@ -565,10 +857,19 @@ def run_suite(spec_path: str) -> None:
 
 
 def main(argv: List[str]) -> None:
-    if len(argv) < 2:
-        print("Usage: python3 conformance_runner.py path/to/spec.json")
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    flags = [a for a in argv[1:] if a.startswith("--")]
+    jobs = 1
+    for flag in flags:
+        if flag.startswith("--jobs="):
+            jobs = int(flag.split("=", 1)[1])
+        elif flag != "--in-process":
+            print(f"Unknown option: {flag}")
+            sys.exit(2)
+    if len(args) != 1:
+        print("Usage: python3 conformance_runner.py path/to/spec.json [--in-process] [--jobs=N]")
         sys.exit(2)
-    run_suite(argv[1])
+    run_suite(args[0], in_process="--in-process" in flags, jobs=jobs)
 
 
 if __name__ == "__main__":
@@ -1,89 +1,604 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, url_for
 from requests import RequestException
 from functools import wraps
+from datetime import datetime, timezone
 from adapters import ADAPTERS
+from adapters.abstract import epoch_now
+from standings import StandingsBoard
+from playerstats import PlayerStatsIndex
+from admission import AdmissionController
+from answerlog import AnswerLog
+from identities import AuthUnavailable, CircuitBreaker, IdentityCache
+from archive import MatchArchive
+from logpipeline import LogPipeline, parse_sample_rates
+from matchjson import MatchJSONProvider, MatchPayload
+from matchsearch import MatchSearchIndex, parse_day
+from matchstore import MemoryMatchStore, SQLiteMatchStore
+from snapshots import SnapshotBoard
+import atexit
 import fimbulwinter
-import logging
+import itertools
+import math
+import threading
+import time
 
 app = Flask(__name__)
+app.json = MatchJSONProvider(app)
 app.config['SECRET_KEY'] = fimbulwinter.environmentals('RAGNAROK_SECRET_KEY', 'supersecrettoken')
-# set logging level
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s")
+# records are queued on the request thread and written by a listener thread
+LOGGING = LogPipeline(
+    level=fimbulwinter.environmentals('RAGNAROK_LOG_LEVEL', 'INFO'),
+    fmt=fimbulwinter.environmentals('RAGNAROK_LOG_FORMAT', 'json'),
+    sample_rates=parse_sample_rates(fimbulwinter.environmentals('RAGNAROK_LOG_SAMPLING', 'submit_answers_batch=0.1', delimiter=';')),
+    max_queue=int(fimbulwinter.environmentals('RAGNAROK_LOG_QUEUE', '10000')),
+).install()
 
-ALL_MATCHES = fimbulwinter.load_matches_from_io()
+MATCH_STORE = fimbulwinter.environmentals('RAGNAROK_MATCH_STORE', 'memory')
+MATCH_DB = fimbulwinter.environmentals('RAGNAROK_MATCH_DB', 'ragnarok.db')
+SNAPSHOT_ROLE = fimbulwinter.environmentals('RAGNAROK_SNAPSHOTS', '')  # '', 'writer' or 'reader'
+SNAPSHOT_NAME = fimbulwinter.environmentals('RAGNAROK_SNAPSHOT_NAME', 'ragnarok-snapshots')
+SNAPSHOT_SLOTS = int(fimbulwinter.environmentals('RAGNAROK_SNAPSHOT_SLOTS', '256'))
+SNAPSHOT_SLOT_SIZE = int(fimbulwinter.environmentals('RAGNAROK_SNAPSHOT_SLOT_SIZE', '131072'))
+STANDINGS = StandingsBoard()
+PLAYER_STATS = PlayerStatsIndex()
+SEARCH = MatchSearchIndex()
+ANSWER_LOG = AnswerLog(fimbulwinter.environmentals('RAGNAROK_ANSWER_LOG_DIR', 'answer_logs'),
+                       max_open=int(fimbulwinter.environmentals('RAGNAROK_ANSWER_LOG_MAX_OPEN', '64')))
+atexit.register(ANSWER_LOG.close)
+ARCHIVE = MatchArchive(
+    fimbulwinter.environmentals('RAGNAROK_ARCHIVE_DIR', 'match_archive'),
+    grace=float(fimbulwinter.environmentals('RAGNAROK_ARCHIVE_GRACE', '300')),
+)
+ARCHIVE_INTERVAL = float(fimbulwinter.environmentals('RAGNAROK_ARCHIVE_INTERVAL', '60'))
 
-ALLOWED_ROOTS = ["clash-of-prodigies.github.io", "room.clashofprodigies.org", "localhost",]
+ALLOWED_ROOTS = fimbulwinter.environmentals('RAGNAROK_ALLOWED_ROOTS',
+    'clash-of-prodigies.github.io,room.clashofprodigies.org,localhost', delimiter=';').split(',')
+ORIGIN_POLICY = fimbulwinter.OriginPolicy(ALLOWED_ROOTS)
+CORS_MAX_AGE = int(fimbulwinter.environmentals('RAGNAROK_CORS_MAX_AGE', '600'))
 AUTH_SERVICE_URL = fimbulwinter.environmentals('AUTH_SERVICE_URL', 'http://localhost:5001/introspect')
 AUTH_PAGE_URL = "https://auth.clashofprodigies.org/"
+AUTH_BREAKER = CircuitBreaker(
+    failure_threshold=int(fimbulwinter.environmentals('RAGNAROK_AUTH_FAILURES', '5')),
+    reset_timeout=float(fimbulwinter.environmentals('RAGNAROK_AUTH_RESET', '10')),
+    on_transition=lambda before, after: app.logger.warning("Auth circuit breaker %s -> %s", before, after),
+)
+IDENTITIES = IdentityCache(
+    lambda token: fimbulwinter.introspect_token(AUTH_SERVICE_URL, token),
+    AUTH_BREAKER,
+    ttl=float(fimbulwinter.environmentals('RAGNAROK_IDENTITY_TTL', '30')),
+    max_stale=float(fimbulwinter.environmentals('RAGNAROK_IDENTITY_MAX_STALE', '300')),
+)
+CACHE_MAX_AGE = int(fimbulwinter.environmentals('RAGNAROK_CACHE_MAX_AGE', '30'))
+CACHE_PURGE_URL = fimbulwinter.environmentals('RAGNAROK_CACHE_PURGE_URL', '')
+COMPRESSION = fimbulwinter.CompressionCache(
+    level=int(fimbulwinter.environmentals('RAGNAROK_COMPRESS_LEVEL', '6')),
+    min_size=int(fimbulwinter.environmentals('RAGNAROK_COMPRESS_MIN_SIZE', '1024')),
+)
+MAX_PAGE_SIZE = int(fimbulwinter.environmentals('RAGNAROK_MAX_PAGE_SIZE', '500'))
+MAX_LONG_POLL = float(fimbulwinter.environmentals('RAGNAROK_MAX_LONG_POLL', '30'))
+MAX_BATCH_SIZE = int(fimbulwinter.environmentals('RAGNAROK_MAX_BATCH_SIZE', '500'))
+RESERVED_MATCH_IDS = {'search'}  # fixed path segments under /matches/
+ADMISSION = AdmissionController(
+    max_concurrency=int(fimbulwinter.environmentals('RAGNAROK_MAX_CONCURRENCY', '64')),
+    read_share=float(fimbulwinter.environmentals('RAGNAROK_READ_SHARE', '0.75')),
+    answer_rate=float(fimbulwinter.environmentals('RAGNAROK_ANSWER_RATE', '5')),
+    answer_burst=float(fimbulwinter.environmentals('RAGNAROK_ANSWER_BURST', '10')),
+    answer_budget=float(fimbulwinter.environmentals('RAGNAROK_ANSWER_BUDGET', '0.25')),
+)
 standard_headers = {
     "Access-Control-Allow-Credentials": "true",
     "Access-Control-Allow-Headers": "Content-Type, Authorization, ngrok-skip-browser-warning",
-    "Access-Control-Allow-Methods": "GET, POST, OPTIONS, PUT, DELETE",
-    "Vary": "Origin",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS, PUT, PATCH, DELETE",
+    "Access-Control-Expose-Headers": "Retry-After, X-Next-Cursor, Link",
 }
 
 @app.after_request
 def add_cors_headers(response: Response):
     origin = request.headers.get("Origin")
-    if origin and fimbulwinter.is_allowed_origin(origin, ALLOWED_ROOTS):
+    if origin and ORIGIN_POLICY.allows(origin):
         response.headers["Access-Control-Allow-Origin"] = origin
         response.headers.update(standard_headers)
+    # cached public views must not be shared across origins, allowed or not
+    fimbulwinter.add_vary(response.headers, "Origin")
     return response
 
-def protected(role: str='user'):
+@app.after_request
+def compress_response(response: Response):
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in ('application/json', 'text/plain'):
+        return response
+    fimbulwinter.add_vary(response.headers, "Accept-Encoding")
+    encoding = request.accept_encodings.best_match(['gzip', 'deflate'])
+    body = response.get_data()
+    if not encoding or len(body) < COMPRESSION.min_size:
+        return response
+    etag, weak = response.get_etag()
+    response.set_data(COMPRESSION.get(body, encoding, etag or ''))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+app.wsgi_app = fimbulwinter.PreflightMiddleware(app.wsgi_app, ORIGIN_POLICY, standard_headers, CORS_MAX_AGE)
+
+def cacheable(response: Response, max_age: int):
+    if response.status_code != 200:
+        return response
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.s_maxage = max_age
+    response.add_etag(weak=True)  # weak, so the validator survives content-coding
+    return response.make_conditional(request)
+
+def invalidate_cached(match_id: str = ''):
+    paths = ['/matches'] + ([f'/matches/{match_id}'] if match_id else [])
+    fimbulwinter.purge_cached_paths(CACHE_PURGE_URL, paths)
+
+def invalidate_on_update(match, event, **details):
+    if event == "updated":
+        invalidate_cached(match.match_id)
+
+def prerender_question(match, event, **details):
+    # encode the extended payload once when a question opens, the route serves these bytes until it changes
+    if event != "question_opened":
+        return
+    # this runs on the question timer, take the lock writers hold so the payload is one consistent version
+    with match.lock:
+        version, question = match.version, match.current_question
+        details = MatchPayload(match, extra=fimbulwinter.extended_details(match))
+        match.prerendered = (version, question, app.json.response(details).get_data())
+
+def match_details(match, mode: str) -> MatchPayload:
+    # encoded by app.json, which reuses the match's encoded scorers, see matchjson
+    extra = fimbulwinter.extended_details(match) if mode == 'extended' else {}
+    ready_at = fimbulwinter.question_ready_at(match) if mode == 'extended' else None
+    if ready_at and isinstance(extra.get('question', None), dict) and 'error' in extra['question']:
+        extra['question'] = {**extra['question'], "retry_at": ready_at.isoformat()}
+    return MatchPayload(match, extra=extra)
+
+def retry_after(ready_at: float) -> str:
+    return str(max(1, math.ceil(ready_at - epoch_now())))
+
+SNAPSHOTS = None
+SNAPSHOT_TIMERS: dict[str, threading.Timer] = {}
+
+def snapshot_board():
+    # the writer creates the region up front, readers attach once the writer is up
+    global SNAPSHOTS
+    if SNAPSHOTS is None and SNAPSHOT_ROLE in ('writer', 'reader'):
+        try:
+            SNAPSHOTS = SnapshotBoard(SNAPSHOT_NAME, slots=SNAPSHOT_SLOTS, slot_size=SNAPSHOT_SLOT_SIZE,
+                                      create=SNAPSHOT_ROLE == 'writer')
+        except FileNotFoundError:
+            return None
+        if SNAPSHOT_ROLE == 'writer':
+            atexit.register(SNAPSHOTS.close)
+    return SNAPSHOTS
+
+def publish_snapshot(match):
+    board = snapshot_board()
+    if board is None:
+        return
+    short = app.json.response(match_details(match, 'short')).get_data()
+    extended = app.json.response(match_details(match, 'extended')).get_data()
+    transition = fimbulwinter.next_transition(match)
+    ready_at = fimbulwinter.question_ready_at(match)
+    if not board.publish(match.match_id, short, extended, transition.timestamp() if transition else 0.0,
+                         ready_at.timestamp() if ready_at else 0.0):
+        app.logger.warning("Snapshot of match %s not published (%s bytes)", match.match_id, len(short) + len(extended))
+    # the views change on their own at the next transition, publish them again then
+    previous = SNAPSHOT_TIMERS.pop(match.match_id, None)
+    if previous is not None:
+        previous.cancel()
+    if transition is not None:
+        timer = threading.Timer((transition - datetime.now(tz=timezone.utc)).total_seconds() + 0.001,
+                                republish_snapshot, args=(match.match_id,))
+        timer.daemon = True
+        SNAPSHOT_TIMERS[match.match_id] = timer
+        timer.start()
+
+def republish_snapshot(match_id: str):
+    try:
+        match = MATCHES.find(match_id)
+        if match is not None:
+            with match.lock:
+                publish_snapshot(match)
+    except Exception as e:
+        app.logger.error("Republishing snapshot of match %s failed: %s", match_id, e)
+
+def unpublish_snapshot(match_id: str = ''):
+    board = snapshot_board() if SNAPSHOT_ROLE == 'writer' else None
+    if board is None:
+        return
+    for key in [match_id] if match_id else list(SNAPSHOT_TIMERS):
+        timer = SNAPSHOT_TIMERS.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+    if match_id:
+        board.unpublish(match_id)
+    else:
+        board.clear()
+
+def snapshot_observer(match, event, **details):
+    if event in ("updated", "question_opened"):
+        publish_snapshot(match)
+
+def serve_snapshot(match_id: str, mode: str, wait: float) -> Response|None:
+    # reader processes answer from the writer's published views; None falls back to the match store
+    board = snapshot_board()
+    snapshot = board.read(match_id) if board is not None else None
+    if snapshot is None:
+        return None
+    now = time.time()
+    deadline = now + wait
+    if mode == 'extended' and wait and snapshot.ready_at > now:
+        with ADMISSION.parked_slot():
+            time.sleep(min(wait, snapshot.ready_at - now))
+    # past its transition the writer is about to publish again, give it a moment
+    while mode == 'extended' and snapshot.valid_until and time.time() >= snapshot.valid_until:
+        if time.time() > max(deadline, snapshot.valid_until + 0.1):
+            return None
+        time.sleep(0.005)
+        snapshot = board.read(match_id)
+        if snapshot is None:
+            return None
+    now = time.time()
+    response = app.response_class(snapshot.extended if mode == 'extended' else snapshot.short,
+                                  status=200, mimetype=app.json.mimetype)
+    if mode == 'extended' and snapshot.ready_at > now:
+        response.headers["Retry-After"] = retry_after(snapshot.ready_at)
+    max_age = min(CACHE_MAX_AGE, int(snapshot.valid_until - now)) if snapshot.valid_until else CACHE_MAX_AGE
+    return cacheable(response, max(0, max_age))
+
+# standings and player stats live in each worker's memory: with a shared store every worker would only count the
+# answers it happened to serve, so they are left out rather than served wrong
+PROCESS_INDEXES = MATCH_STORE != 'sqlite'
+MATCH_OBSERVERS = [SEARCH, ANSWER_LOG, prerender_question, invalidate_on_update]
+if PROCESS_INDEXES:
+    MATCH_OBSERVERS[:0] = [STANDINGS, PLAYER_STATS]
+if SNAPSHOT_ROLE == 'writer':
+    MATCH_OBSERVERS.append(snapshot_observer)
+
+def register_match(match):
+    match.observers.extend(MATCH_OBSERVERS)
+    if PROCESS_INDEXES:
+        STANDINGS.track(match)
+
+def load_match(match):
+    # matches rebuilt by a shared store, e.g. after another worker changed them
+    match.logger = app.logger
+    register_match(match)
+    SEARCH.track(match)
+
+if MATCH_STORE == 'sqlite':
+    MATCHES = SQLiteMatchStore(MATCH_DB, on_load=load_match)
+else:
+    MATCHES = MemoryMatchStore(on_load=load_match)
+
+for loaded_match in fimbulwinter.load_matches_from_io():
+    if MATCHES.find(loaded_match.match_id) is None:
+        register_match(loaded_match)
+        MATCHES.add(loaded_match)
+        SEARCH.track(loaded_match)  # indexed by the seq the store assigned
+
+def lookup_match(match_id: str):
+    # hot matches first, archived ones are faulted back in as read-only views
+    match = MATCHES.find(match_id) if match_id else None
+    if match is not None:
+        return match
+    if not match_id:
+        raise ValueError('Match ID is required')
+    archived = ARCHIVE.load(match_id)
+    if archived is None:
+        raise ValueError('Match not found')
+    return archived
+
+def sweep_archive(now: float|None = None) -> list[str]:
+    # moves finished matches past their grace period out of the hot set
+    archived = []
+    for match in [match for match in MATCHES.matches() if ARCHIVE.due(match, now)]:
+        with match.lock:
+            if not ARCHIVE.due(match, now):
+                continue
+            size = ARCHIVE.store(match)
+            MATCHES.remove(match.match_id)
+            SEARCH.forget(match.match_id)
+            unpublish_snapshot(match.match_id)
+            match._release_question_waiters()
+        ANSWER_LOG.release(match.match_id)
+        archived.append(match.match_id)
+        app.logger.info("Match %s archived (%s bytes)", match.match_id, size)
+    return archived
+
+def schedule_archive_sweep():
+    def run():
+        try:
+            sweep_archive()
+        except Exception as e:
+            app.logger.error("Archive sweep failed: %s", e)
+        finally:
+            schedule_archive_sweep()
+    timer = threading.Timer(ARCHIVE_INTERVAL, run)
+    timer.daemon = True
+    timer.start()
+
+if ARCHIVE_INTERVAL > 0:
+    schedule_archive_sweep()
+
+def submitted_answers() -> list[tuple[dict, dict]]:
+    # (identity if already verified, data) of every answer in this request, a relay's batch or a single one
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return []
+    entries = data.get('answers', None)
+    if isinstance(entries, list):
+        return [(IDENTITIES.known(entry.get('token', '')) or {}, {'selected_option': entry.get('selected_option', None)})
+                for entry in entries if isinstance(entry, dict)]
+    return [(IDENTITIES.known(fimbulwinter.extract_token(request)) or {}, {'selected_option': data.get('selected_option', None)})]
+
+def log_refused(match_id: str, refusals: list[tuple[dict, dict, str]]):
+    # answers refused before they reach the match go to its answer log like the ones the match rejects
+    match = MATCHES.find(match_id) if match_id and refusals else None
+    if match is None:
+        return
+    for player_info, data, reason in refusals:
+        match.notify("answer_rejected", player_info=player_info, data=data, answer=None,
+                     question=match.current_question, reason=reason)
+
+def protected(role: str='user', log_refusals: bool=False):
+    # log_refusals is for answer routes: what is refused here is logged as rejected submissions
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
+            def refuse(error: str, status: int, headers: dict|None=None):
+                if log_refusals:
+                    log_refused(kwargs.get('match_id', ''), [(player_info, data, error) for player_info, data in submitted_answers()])
+                return jsonify({"error": error}), status, headers or {}
             try:
-                identifiers = fimbulwinter.introspect_with_cerberus(AUTH_SERVICE_URL,request)
+                identifiers = IDENTITIES.resolve(fimbulwinter.extract_token(request))
                 user_role = identifiers.get('user_role', '')
                 if role != user_role:
-                    return jsonify({"error": "Insufficient permissions"}), 403
+                    return refuse("Insufficient permissions", 403)
             except KeyError as ke:
-                return jsonify({"error": f"Missing required header: {ke}"}), 401
+                return refuse(f"Missing required header: {ke}", 401)
             except ValueError as ve:
-                return jsonify({"error": f"{ve}"}), 401
+                return refuse(f"{ve}", 401)
+            except AuthUnavailable as au:
+                # the breaker is open, fail fast without logging every rejected request
+                return refuse(f"{au}", 503, {"Retry-After": str(max(1, math.ceil(au.retry_after)))})
             except RequestException as re:
-                app.logger.error(f"Error connecting to auth service: {re}")
-                return jsonify({"error": "Authentication service unavailable"}), 503
+                app.logger.error("Error connecting to auth service: %s", re)
+                return refuse("Authentication service unavailable", 503)
             except Exception as e:
-                app.logger.error(f"Unexpected error in protected decorator: {e}")
-                return jsonify({"error": "Internal Server Error"}), 500
+                app.logger.error("Unexpected error in protected decorator: %s", e)
+                return refuse("Internal Server Error", 500)
             else:
                 kwargs.update(identifiers)
                 return func(*args, **kwargs)
         return wrapper
     return decorator
 
+def admitted(priority: str='read', rate_limited: bool|None=None):
+    # answers are rate limited before authentication, so floods never reach Cerberus: per user once a token has
+    # been verified, per client address until then, so rotating unverified tokens never earns a fresh bucket
+    if rate_limited is None:
+        rate_limited = priority == 'answer'
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if rate_limited:
+                identity = IDENTITIES.known(fimbulwinter.extract_token(request))
+                if identity and identity.get('user_id', ''):
+                    wait = ADMISSION.take_token(f"user:{identity['user_id']}")
+                else:
+                    wait = ADMISSION.take_token(f"addr:{request.remote_addr or ''}")
+                if wait:
+                    return jsonify({"error": "Too many submissions"}), 429, {"Retry-After": str(max(1, math.ceil(wait)))}
+            if not ADMISSION.try_enter(priority):
+                retry_after = ADMISSION.retry_after(priority)
+                return jsonify({"error": "Server is busy, try again shortly"}), 503, {"Retry-After": str(retry_after)}
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                ADMISSION.leave(priority, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def process_indexed(func):
+    # routes served from an index kept in this process, which a shared match store cannot keep complete
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROCESS_INDEXES:
+            return jsonify({"error": f"Not available with RAGNAROK_MATCH_STORE={MATCH_STORE}"}), 501
+        return func(*args, **kwargs)
+    return wrapper
+
+def within_answer_window(func):
+    # rejects submissions outside the current question's window before they cost an auth round-trip
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        match_id = kwargs.get('match_id', '')
+        match = MATCHES.find(match_id) if match_id else None
+        if match is None:
+            error = "Match is not active" if ARCHIVE.contains(match_id) else "Match not found"
+            return jsonify({"error": error}), 400
+        error, retry_after = fimbulwinter.check_answer_window(match)
+        if error:
+            log_refused(match_id, [(player_info, data, error) for player_info, data in submitted_answers()])
+            headers = {"Retry-After": str(retry_after)} if retry_after else {}
+            return jsonify({"error": error}), 400, headers
+        return func(*args, **kwargs)
+    return wrapper
+
 @app.get('/matches/<match_id>')
+@admitted('read')
 def get_match(match_id):
+    try:
+        wait = float(request.args.get('wait', '0') or 0)
+    except ValueError:
+        wait = math.nan
+    if math.isnan(wait):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    wait = min(max(wait, 0.0), MAX_LONG_POLL)
     try:
         mode = request.args.get('mode', 'short')
-        match_index = fimbulwinter.lookup_match_by_id(match_id=match_id, ALL_MATCHES=ALL_MATCHES)
-        match = ALL_MATCHES[match_index]
-        details = fimbulwinter.return_match_details_by_mode(match, mode)
+        if SNAPSHOT_ROLE == 'reader' and mode in ('short', 'extended') and match_id:
+            response = serve_snapshot(match_id, mode, wait)
+            if response is not None:
+                return response
+        match = lookup_match(match_id)
+        if mode == 'extended' and wait and fimbulwinter.question_ready_at(match):
+            # a parked long-poll holds no admission slot, otherwise a room full of waiting players starves reads
+            with ADMISSION.parked_slot():
+                match.wait_for_current_question(wait)
+        if mode == 'extended':
+            body = fimbulwinter.prerendered_details(match)
+            if body is not None:
+                response = app.response_class(body, status=200, mimetype=app.json.mimetype)
+                return cacheable(response, fimbulwinter.cache_max_age([match], CACHE_MAX_AGE))
+        details = match_details(match, mode)
+        headers = {}
+        if isinstance(details.extra.get('question', None), dict) and 'retry_at' in details.extra['question']:
+            ready_at = fimbulwinter.question_ready_at(match)
+            if ready_at:
+                headers["Retry-After"] = retry_after(ready_at.timestamp())
     except ValueError as ve:
         return jsonify({"error": f"{ve}"}), 404
     except Exception as e:
-        app.logger.error(f"Unexpected error in get_match: {e}")
+        app.logger.error("Unexpected error in get_match: %s", e)
         return jsonify({"error": "Something went wrong"}), 500
     else:
-        return jsonify(details), 200
+        response = jsonify(details)
+        response.headers.update(headers)
+        return cacheable(response, fimbulwinter.cache_max_age([match], CACHE_MAX_AGE))
 
 @app.get('/matches')
+@admitted('read')
 def get_all_matches():
-    # Return all matches based on start time
-    start_time = request.args.get('date', '')
-    filtered_matches = fimbulwinter.filter_matches_by_date(ALL_MATCHES, start_time)
-    return jsonify([match.to_dict() for match in filtered_matches]), 200
+    # Return all matches based on start time, a page at a time when limit is given
+    try:
+        start_time = request.args.get('date', '')
+        fields = fimbulwinter.parse_fields(request.args.get('fields', ''))
+        limit = int(request.args.get('limit', '0') or 0)
+        if limit < 0 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        after = fimbulwinter.decode_cursor(request.args.get('cursor', ''))
+        # matches are read from the store a batch at a time, a page never loads the ones past it
+        matches = fimbulwinter.iter_matches_by_date(MATCHES.iter_matches(after, batch=limit + 1 if limit else 100), start_time)
+        stream = request.args.get('stream', '') in ('1', 'true') or (not limit and MATCHES.count(after) > MAX_PAGE_SIZE)
+    except ValueError as ve:
+        return jsonify({"error": f"{ve}"}), 400
+    if stream and not limit:
+        # exports: rendered one match at a time, never materialized
+        dumps = lambda obj: app.json.dumps(obj, separators=(",", ":"))
+        body = fimbulwinter.stream_json_array((MatchPayload(match, fields) for match in matches), dumps)
+        return app.response_class(stream_with_context(body), status=200, mimetype=app.json.mimetype)
+    page = list(itertools.islice(matches, limit)) if limit else list(matches)
+    response = jsonify([MatchPayload(match, fields) for match in page])
+    if limit and len(page) == limit and next(matches, None) is not None:
+        cursor = fimbulwinter.encode_cursor(page[-1])
+        response.headers["X-Next-Cursor"] = cursor
+        next_url = url_for('get_all_matches', **{**request.args.to_dict(), 'cursor': cursor})
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return cacheable(response, fimbulwinter.cache_max_age(page, CACHE_MAX_AGE))
+
+SEARCH_VERSION = 0  # store version the search index has caught up with
+
+def sync_search():
+    # matches other workers added, changed or removed since the last search reach this worker's index
+    global SEARCH_VERSION
+    version, changed, removed = MATCHES.changes(SEARCH_VERSION)
+    for match_id in removed:
+        SEARCH.forget(match_id)
+    for match in changed:
+        SEARCH.track(match)
+    SEARCH_VERSION = max(SEARCH_VERSION, version)
+
+@app.get('/matches/search')
+@admitted('read')
+def search_matches():
+    # q matches any field, team/comp/player one each; words match as prefixes and every one must match
+    try:
+        fields = fimbulwinter.parse_fields(request.args.get('fields', ''))
+        limit = int(request.args.get('limit', '50') or 0)
+        if limit <= 0 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        state = request.args.get('state', '')
+        states = {int(value) for value in state.split(',') if value.strip()} if state else None
+        query = dict(text=request.args.get('q', ''), team=request.args.get('team', ''),
+                     comp=request.args.get('comp', ''), player=request.args.get('player', ''),
+                     states=states, day=parse_day(request.args.get('date', '')),
+                     after=fimbulwinter.decode_cursor(request.args.get('cursor', '')), limit=limit)
+    except ValueError as ve:
+        return jsonify({"error": f"{ve}"}), 400
+    if MATCH_STORE == 'sqlite':
+        sync_search()
+    ids, more = SEARCH.search(**query)
+    page = []
+    for match_id in ids:
+        match = MATCHES.find(match_id)
+        if match is None:
+            SEARCH.forget(match_id)  # removed by another worker
+        else:
+            page.append(match)
+    response = jsonify([MatchPayload(match, fields) for match in page])
+    if more and page:
+        cursor = fimbulwinter.encode_cursor(page[-1])
+        response.headers["X-Next-Cursor"] = cursor
+        next_url = url_for('search_matches', **{**request.args.to_dict(), 'cursor': cursor})
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return cacheable(response, fimbulwinter.cache_max_age(page, CACHE_MAX_AGE))
+
+@app.get('/competitions/<comp_id>/standings')
+@admitted('read')
+@process_indexed
+def get_competition_standings(comp_id):
+    # comp_id is what standings.competition_id makes of a match's comp_info: its 'comp_id', else the slug of 'sub'
+    try:
+        limit = int(request.args.get('limit', '20'))
+        if limit <= 0:
+            raise ValueError("limit must be a positive integer")
+        standings = STANDINGS.standings(comp_id, limit)
+    except ValueError as ve:
+        status = 404 if "not found" in str(ve).lower() else 400
+        return jsonify({"error": f"{ve}"}), status
+    except Exception as e:
+        app.logger.error("Unexpected error in get_competition_standings: %s", e)
+        return jsonify({"error": "Something went wrong"}), 500
+    else:
+        return jsonify(standings), 200
+
+@app.get('/players/<user_id>/stats')
+@admitted('read')
+@process_indexed
+def get_player_stats(user_id):
+    try:
+        stats = PLAYER_STATS.player(user_id)
+    except ValueError as ve:
+        return jsonify({"error": f"{ve}"}), 404
+    else:
+        return jsonify(stats), 200
+
+@app.get('/teams/<team>/stats')
+@admitted('read')
+@process_indexed
+def get_team_stats(team):
+    try:
+        stats = PLAYER_STATS.team(team)
+    except ValueError as ve:
+        return jsonify({"error": f"{ve}"}), 404
+    else:
+        return jsonify(stats), 200
 
 @app.put('/matches/<match_id>')
+@admitted('admin')
 @protected('admin')
 def add_match(match_id='', **kwargs):
     if not match_id:
         return jsonify({"error": "Match ID is required"}), 400
+    if match_id in RESERVED_MATCH_IDS:
+        # GET /matches/search would never reach a match with this id
+        return jsonify({"error": f"Match ID '{match_id}' is reserved"}), 400
     try:
         data = request.get_json(silent=True)  or {}
         data['match_id'] = match_id
@@ -93,43 +608,56 @@ def add_match(match_id='', **kwargs):
         adapter = ADAPTERS.get(match_type, None) 
         if not adapter:
             return jsonify({"error": "Adapter not found"}), 500
-        app.logger.debug(f"Adding match with data: {data} {request.data}")
+        app.logger.debug("Adding match with data: %s %s", data, request.data)
         home, away = data.get('home_team', ''), data.get('away_team', '')
         if not home or not away: return jsonify({"error": "home_team and away_team are required"}), 400
-        if fimbulwinter.lookup_match_by_id(match_id, ALL_MATCHES, silent=True) != -1:
+        if MATCHES.find(match_id) is not None or ARCHIVE.contains(match_id):
             return jsonify({"error": "Match with this ID already exists"}), 400
         match = adapter(logger=app.logger, kwargs=data)
-        ALL_MATCHES.append(match)
+        register_match(match)
+        MATCHES.add(match)
+        SEARCH.track(match)
+        if SNAPSHOT_ROLE == 'writer':
+            publish_snapshot(match)
+        invalidate_cached(match_id)
     except KeyError as ke:
         return jsonify({"error": f"Missing required field: {ke}"}), 400
     except ValueError as ve:
         return jsonify({"error": f"{ve}"}), 400
     except Exception as e:
-        app.logger.error(f"Unexpected error in add_match: {e}")
+        app.logger.error("Unexpected error in add_match: %s", e)
         return jsonify({"error": "Something went wrong"}), 500
     else:
         user_name = kwargs.get('user_name', 'unknown')
-        app.logger.info(f"Match {match_id} added successfully by {user_name}")
+        app.logger.info("Match %s added successfully by %s", match_id, user_name)
         return jsonify({"message": "Match added successfully"}), 201
 
 @app.delete('/matches/<match_id>')
+@admitted('admin')
 @protected('admin')
 def remove_match(match_id='', user_name='', **kwargs):
     if not match_id:
         return jsonify({"error": "Match ID is required"}), 400
     try:
-        i = fimbulwinter.lookup_match_by_id(match_id=match_id, ALL_MATCHES=ALL_MATCHES)
-        del ALL_MATCHES[i]
+        removed = MATCHES.remove(match_id)
+        SEARCH.forget(match_id)
+        unpublish_snapshot(match_id)
+        if not ARCHIVE.remove(match_id) and not removed:
+            raise ValueError('Match not found')
+        STANDINGS.forget(match_id)
+        ANSWER_LOG.remove(match_id)
+        invalidate_cached(match_id)
     except ValueError as ve:
         return jsonify({"error": f"{ve}"}), 404
     except Exception as e:
-        app.logger.error(f"Unexpected error in remove_match: {e}")
+        app.logger.error("Unexpected error in remove_match: %s", e)
         return jsonify({"error": "Internal Server Error"}), 500
     else:
-        app.logger.info(f"Match {match_id} removed successfully by {user_name}")
+        app.logger.info("Match %s removed successfully by %s", match_id, user_name)
         return jsonify({"message": "Match removed successfully"}), 200
 
 @app.patch('/matches/<match_id>')
+@admitted('admin')
 @protected('admin')
 def update_match_state(match_id='', **kwargs):
     resp = "Successfully changed state"
@@ -138,42 +666,129 @@ def update_match_state(match_id='', **kwargs):
     try:
         data = request.get_json() or {}
         data['match_id'] = match_id
-        idx = fimbulwinter.lookup_match_by_id(match_id=match_id, ALL_MATCHES=ALL_MATCHES)
-        resp = ALL_MATCHES[idx].update_match(**data)
+        if MATCHES.find(match_id) is None:
+            raise ValueError("Match is archived and read-only" if ARCHIVE.contains(match_id) else "Match not found")
+        resp = MATCHES.mutate(match_id, lambda match: match.update_match(**data))
     except ValueError as ve:
         return jsonify({"error": f"{ve}"}), 400
     except Exception as e:
-        app.logger.error(f"Unexpected error in update_match_state: {e}")
+        app.logger.error("Unexpected error in update_match_state: %s", e)
         return jsonify({"error": "Something went wrong"}), 501
     else:
         user_name = kwargs.get('user_name', 'unknown')
-        app.logger.info(f"Match {match_id} updated successfully by {user_name}")
+        app.logger.info("Match %s updated successfully by %s", match_id, user_name)
         return jsonify({"message": resp}), 200
 
 @app.delete('/matches')
+@admitted('admin')
 @protected('admin')
 def clear_all_matches(**kwargs):
-   ALL_MATCHES.clear()
+   MATCHES.clear()
+   SEARCH.clear()
+   unpublish_snapshot()
+   ARCHIVE.clear()
+   STANDINGS.clear()
+   PLAYER_STATS.clear()
+   ANSWER_LOG.clear()
+   invalidate_cached()
    user_name = kwargs.get('user_name', 'unknown')
-   app.logger.info(f"All matches cleared by {user_name}")
+   app.logger.info("All matches cleared by %s", user_name)
    return jsonify({"message": "All matches cleared"}), 200
 
 @app.post('/matches/<match_id>')
-@protected('user')
+@admitted('answer')
+@within_answer_window
+@protected('user', log_refusals=True)
 def submit_answer(match_id='', **kwargs):
     if not match_id:
         return jsonify({"error": "Match ID is required"}), 400
     try:
-        match_index = fimbulwinter.lookup_match_by_id(match_id=match_id, ALL_MATCHES=ALL_MATCHES)
         data = request.get_json() or {}
-        ALL_MATCHES[match_index].store_answer(data=data, kwargs=kwargs or {})
+        MATCHES.mutate(match_id, lambda match: match.store_answer(data=data, kwargs=kwargs or {}))
     except ValueError as ve:    
         return jsonify({"error": f"{ve}"}), 400
     except Exception as e:
-        app.logger.error(f"Unexpected error in submit_answer: {e}")
+        app.logger.error("Unexpected error in submit_answer: %s", e)
         return jsonify({"error": "Something went wrong"}), 400
     else:
         return jsonify({"message": "Answer submitted successfully"}), 200
 
+@app.get('/matches/<match_id>/answers')
+@admitted('admin')
+@protected('admin')
+def export_answer_log(match_id='', **kwargs):
+    if not match_id:
+        return jsonify({"error": "Match ID is required"}), 400
+    if not ANSWER_LOG.exists(match_id):
+        return jsonify({"error": "No answers logged for this match"}), 404
+    question_id = request.args.get('question', '')
+    player = request.args.get('player', '')
+    user_name = kwargs.get('user_name', 'unknown')
+    app.logger.info("Answer log for match %s exported by %s", match_id, user_name)
+    lines = ANSWER_LOG.stream(match_id, question_id=question_id, player=player)
+    return app.response_class(stream_with_context(lines), status=200, mimetype='application/x-ndjson')
+
+@app.get('/auth/status')
+@admitted('admin')
+@protected('admin')
+def get_auth_status(**kwargs):
+    # an admin identity still inside its stale window gets through while Cerberus is down
+    return jsonify({"breaker": AUTH_BREAKER.stats(), "identities": IDENTITIES.stats()}), 200
+
+@app.post('/matches/<match_id>/answers')
+@admitted('answer', rate_limited=False)
+@within_answer_window
+@protected('relay', log_refusals=True)
+def submit_answers_batch(match_id='', **kwargs):
+    if not match_id:
+        return jsonify({"error": "Match ID is required"}), 400
+    try:
+        data = request.get_json() or {}
+        entries = data.get('answers', None)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("answers must be a non-empty list")
+        if len(entries) > MAX_BATCH_SIZE:
+            raise ValueError(f"A batch cannot contain more than {MAX_BATCH_SIZE} answers")
+        tokens = [entry.get('token', '') if isinstance(entry, dict) else '' for entry in entries]
+        identities = fimbulwinter.resolve_tokens(IDENTITIES.resolve, tokens)
+        results: list[dict|None] = [None] * len(entries)
+        submissions, positions, refusals = [], [], []
+        for i, entry in enumerate(entries):
+            identity = identities.get(tokens[i], ValueError("Missing token"))
+            answer_data = {'selected_option': entry.get('selected_option', -1) if isinstance(entry, dict) else None}
+            if isinstance(identity, RequestException):
+                results[i] = {"accepted": False, "error": "Authentication service unavailable"}
+            elif isinstance(identity, Exception):
+                results[i] = {"accepted": False, "error": f"{identity}"}
+            elif identity.get('user_role', '') != 'user':
+                results[i] = {"accepted": False, "error": "Insufficient permissions"}
+            else:
+                try:
+                    received = entry.get('time_received', '')
+                    time_received = datetime.fromisoformat(received) if received else None
+                    if time_received is not None and time_received.tzinfo is None:
+                        raise ValueError("time_received must include a timezone offset")
+                except (TypeError, ValueError) as ve:
+                    results[i] = {"accepted": False, "error": f"Invalid time_received: {ve}"}
+                else:
+                    submissions.append((identity, answer_data, time_received))
+                    positions.append(i)
+            if results[i] is not None:
+                refusals.append((identity if isinstance(identity, dict) else {}, answer_data, results[i]["error"]))
+        log_refused(match_id, refusals)
+        for i, result in zip(positions, MATCHES.mutate(match_id, lambda match: match.store_answers(submissions))):
+            results[i] = result
+    except ValueError as ve:
+        return jsonify({"error": f"{ve}"}), 400
+    except Exception as e:
+        app.logger.error("Unexpected error in submit_answers_batch: %s", e)
+        return jsonify({"error": "Something went wrong"}), 500
+    else:
+        accepted = sum(1 for result in results if result and result['accepted'])
+        relay_name = kwargs.get('user_name', 'unknown')
+        app.logger.info("Relay %s submitted %s/%s answers for match %s", relay_name, accepted, len(results), match_id)
+        return jsonify({"accepted": accepted, "rejected": len(results) - accepted,
+                        "results": [{"index": i, **(result or {})} for i, result in enumerate(results)]}), 200
+
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+# snapshots.py
+Rendered match views shared between processes through one shared memory region.
+
+A single writer process publishes, for each match, the short and extended GET /matches/<id> payloads it would
+serve. Reader processes serve those bytes without ever holding match objects. The region is split into fixed-size
+slots, one per match, and each slot is guarded by a sequence counter (a seqlock): the writer makes it odd while
+it rewrites the slot and even again once done, and a reader keeps a copy only if it saw the same even value
+before and after copying.
+"""
+
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+import inspect
+import struct
+import threading
+
+MAGIC = b'RGNSNAP1'
+HEADER = struct.Struct('<8sIIQ')  # magic, slot count, slot size, generation
+GENERATION_OFFSET = 16  # bumped whenever a match is given or loses a slot
+SEQ = struct.Struct('<Q')
+SLOT = struct.Struct('<QQddIIH')  # seq, version, valid_until, ready_at, short length, extended length, id length
+ID_SIZE = 128
+READ_RETRIES = 100
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    valid_until: float  # epoch seconds after which the extended view is stale, 0 when it never goes stale
+    ready_at: float  # epoch seconds at which the current question opens, 0 when it is not in its cooldown
+    short: bytes
+    extended: bytes
+
+class SnapshotBoard:
+    def __init__(self, name:str, slots:int=256, slot_size:int=128 * 1024, create:bool=False):
+        self.create = create
+        if create:
+            size = HEADER.size + slots * slot_size
+            try:
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # left behind by a writer that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.memory.buf[:size] = bytes(size)
+            HEADER.pack_into(self.memory.buf, 0, MAGIC, slots, slot_size, 0)
+        else:
+            self.memory = self._attach(name)
+            magic, slots, slot_size, _ = HEADER.unpack_from(self.memory.buf, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a snapshot region")
+        self.slots = slots
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT.size - ID_SIZE  # payload bytes per slot
+        self.lock = threading.Lock()
+        self.index: dict[str, int] = {}  # match_id -> slot, the writer's is authoritative, a reader's is a hint
+        self.free = list(range(slots - 1, -1, -1)) if create else []
+        self.published = 0
+        self.scanned = -1  # generation a reader's index was last rebuilt at
+
+    @staticmethod
+    def _attach(name:str) -> shared_memory.SharedMemory:
+        # readers must not unlink the writer's region when they exit
+        if 'track' in inspect.signature(shared_memory.SharedMemory).parameters:
+            return shared_memory.SharedMemory(name=name, track=False)
+        # before 3.13 attaching registers the region too, take this one segment back out of the tracker
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+    def _offset(self, slot:int) -> int:
+        return HEADER.size + slot * self.slot_size
+
+    def _generation(self) -> int:
+        return SEQ.unpack_from(self.memory.buf, GENERATION_OFFSET)[0]
+
+    def _bump_generation(self):
+        SEQ.pack_into(self.memory.buf, GENERATION_OFFSET, self._generation() + 1)
+
+    def _write(self, slot:int, version:int, valid_until:float, ready_at:float, match_id:bytes, short:bytes, extended:bytes):
+        buf = self.memory.buf
+        offset = self._offset(slot)
+        (seq,) = SEQ.unpack_from(buf, offset)
+        SEQ.pack_into(buf, offset, seq + 1)
+        SLOT.pack_into(buf, offset, seq + 1, version, valid_until, ready_at, len(short), len(extended), len(match_id))
+        start = offset + SLOT.size
+        buf[start:start + len(match_id)] = match_id
+        start += ID_SIZE
+        buf[start:start + len(short)] = short
+        buf[start + len(short):start + len(short) + len(extended)] = extended
+        SEQ.pack_into(buf, offset, seq + 2)
+
+    def publish(self, match_id:str, short:bytes, extended:bytes, valid_until:float=0.0, ready_at:float=0.0) -> bool:
+        # False when the views do not fit in a slot or every slot is taken; readers then fall back
+        key = match_id.encode()
+        if len(key) > ID_SIZE or len(short) + len(extended) > self.capacity:
+            self.unpublish(match_id)
+            return False
+        with self.lock:
+            slot = self.index.get(match_id, None)
+            if slot is None:
+                if not self.free:
+                    return False
+                slot = self.index[match_id] = self.free.pop()
+                self.published += 1
+                self._write(slot, self.published, valid_until, ready_at, key, short, extended)
+                self._bump_generation()
+                return True
+            self.published += 1
+            self._write(slot, self.published, valid_until, ready_at, key, short, extended)
+        return True
+
+    def unpublish(self, match_id:str):
+        with self.lock:
+            slot = self.index.pop(match_id, None)
+            if slot is None:
+                return
+            self.published += 1
+            self._write(slot, self.published, 0.0, 0.0, b'', b'', b'')
+            self._bump_generation()
+            self.free.append(slot)
+
+    def clear(self):
+        for match_id in list(self.index):
+            self.unpublish(match_id)
+
+    def _read_slot(self, slot:int, match_id:bytes|None) -> Snapshot|bytes|None:
+        # the slot's Snapshot if it holds match_id (its id when match_id is None), None if it holds another
+        # match or the writer kept it busy for every retry
+        buf = self.memory.buf
+        offset = self._offset(slot)
+        for _ in range(READ_RETRIES):
+            (before,) = SEQ.unpack_from(buf, offset)
+            if before & 1:
+                continue
+            _, version, valid_until, ready_at, short_length, extended_length, id_length = SLOT.unpack_from(buf, offset)
+            start = offset + SLOT.size
+            slot_id = bytes(buf[start:start + id_length])
+            if match_id is None or slot_id != match_id:
+                (after,) = SEQ.unpack_from(buf, offset)
+                if before != after:
+                    continue
+                return slot_id if match_id is None else None
+            start += ID_SIZE
+            short = bytes(buf[start:start + short_length])
+            extended = bytes(buf[start + short_length:start + short_length + extended_length])
+            (after,) = SEQ.unpack_from(buf, offset)
+            if before == after:
+                return Snapshot(version, valid_until, ready_at, short, extended)
+        return None
+
+    def _rescan(self):
+        index = {}
+        for slot in range(self.slots):
+            slot_id = self._read_slot(slot, None)
+            if slot_id:
+                index[slot_id.decode()] = slot
+        self.index = index
+
+    def read(self, match_id:str) -> Snapshot|None:
+        key = match_id.encode()
+        slot = self.index.get(match_id, None)
+        if slot is not None:
+            snapshot = self._read_slot(slot, key)
+            if snapshot is not None:
+                return snapshot
+        if self.create:
+            return None
+        # slots only move when the generation changes, so a reader rebuilds its index at most once per change
+        generation = self._generation()
+        if generation == self.scanned:
+            return None
+        self._rescan()
+        self.scanned = generation
+        slot = self.index.get(match_id, None)
+        return self._read_slot(slot, key) if slot is not None else None
+
+    def close(self):
+        self.memory.close()
+        if self.create:
+            self.memory.unlink()
@@ -51,8 +51,9 @@ export const api = {
   listMatches: (date) => request("/matches", {date: date.split('T')[0]}),
   getMatch: (matchId) => request(`/matches/${encodeURIComponent(matchId)}`),
 
-  getCurrentQuestion: (matchId) =>
-    request(`/matches/${encodeURIComponent(matchId)}`, { mode: "extended" }),
+  // long-polls: the server holds the request until the question opens (up to `wait` seconds)
+  getCurrentQuestion: (matchId, wait = 25) =>
+    request(`/matches/${encodeURIComponent(matchId)}`, { mode: "extended", wait }),
 
   submitAnswer: (matchId, selectedOption) =>
     request(`/matches/${encodeURIComponent(matchId)}`, {}, {
@@ -406,7 +406,13 @@ export default function MatchRoom() {
       const data = await api.getCurrentQuestion(id);
       if (!data) throw new Error("No question data received");
       if (!data?.question) throw new Error("Malformed question data received");
-      if ('error' in data.question) throw new Error('Error fetching question: ' + (data.current_question.error || 'Unknown error'));
+      if ('error' in data.question) {
+        if (data.question.retry_at) {
+          setQTryAgainAt(data.question.retry_at);
+          return;
+        }
+        throw new Error('Error fetching question: ' + (data.question.error || 'Unknown error'));
+      }
       setQuestion(data?.question);
       setSelectedOption(null);
       setVerifyResult(null);
@@ -0,0 +1,252 @@
+"""
+# standings.py
+Competition standings kept up to date from match events instead of being rebuilt from every match.
+
+A match contributes to the competition named by its comp_info ('comp_id', falling back to the slug of 'sub',
+the same slug the frontend uses for /competitions/<id>). Goals for/against follow the live scores, while
+played/won/drawn/lost and table points are applied once the match ends. A win is worth the adapter's PPW.
+"""
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+import re
+import threading
+
+DEFAULT_PPW = 3.0
+
+def competition_id(comp_info:dict) -> str:
+    comp_id = comp_info.get('comp_id') or comp_info.get('sub') or ''
+    return re.sub(r'\s+', '-', str(comp_id).strip()).lower()
+
+class RankedIndex:
+    # keeps items ordered by a sort key so the top k can be read with a slice
+    def __init__(self):
+        self.keys: dict = {}
+        self.order: list[tuple] = []
+
+    def update(self, item, sort_key):
+        old_key = self.keys.get(item, None)
+        if old_key is not None:
+            del self.order[bisect_left(self.order, (old_key, item))]
+        self.keys[item] = sort_key
+        insort(self.order, (sort_key, item))
+
+    def remove(self, item):
+        old_key = self.keys.pop(item, None)
+        if old_key is not None:
+            del self.order[bisect_left(self.order, (old_key, item))]
+
+    def top(self, k:int|None=None) -> list:
+        entries = self.order if k is None else self.order[:k]
+        return [item for _, item in entries]
+
+    def __len__(self):
+        return len(self.order)
+
+@dataclass
+class TeamRow:
+    team: str
+    played: int = 0
+    won: int = 0
+    drawn: int = 0
+    lost: int = 0
+    points: float = 0.0
+    score_for: float = 0.0
+    score_against: float = 0.0
+
+    def sort_key(self):
+        return (-self.points, -(self.score_for - self.score_against), -self.score_for, self.team)
+
+    def to_dict(self):
+        return {
+            "team": self.team,
+            "played": self.played,
+            "won": self.won,
+            "drawn": self.drawn,
+            "lost": self.lost,
+            "points": self.points,
+            "score_for": self.score_for,
+            "score_against": self.score_against,
+        }
+
+@dataclass
+class MatchEntry:
+    # what a single match has contributed so far, so it can be retracted on reset or removal
+    comp_id: str
+    home: str
+    away: str
+    ppw: float
+    home_score: float = 0.0
+    away_score: float = 0.0
+    goals: dict[tuple[str, str], int] = field(default_factory=dict)
+    result_applied: bool = False
+
+class Competition:
+    def __init__(self, comp_id:str):
+        self.comp_id = comp_id
+        self.teams: dict[str, TeamRow] = {}
+        self.table = RankedIndex()
+        self.entered: dict[str, int] = {}  # team -> matches it plays in here
+        self.goals: dict[tuple[str, str], int] = {}  # (user_name, team) -> goals
+        self.scorers = RankedIndex()
+
+    def team(self, name:str) -> TeamRow:
+        row = self.teams.get(name, None)
+        if row is None:
+            row = self.teams[name] = TeamRow(team=name)
+            self.table.update(name, row.sort_key())
+        return row
+
+    def enter(self, team:str):
+        self.entered[team] = self.entered.get(team, 0) + 1
+        self.team(team)
+
+    def leave(self, team:str):
+        # a team without matches left is dropped from the table, whatever the float sums left behind
+        remaining = self.entered.get(team, 0) - 1
+        if remaining > 0:
+            self.entered[team] = remaining
+            return
+        self.entered.pop(team, None)
+        self.teams.pop(team, None)
+        self.table.remove(team)
+
+    def add_scores(self, team:str, scored:float, conceded:float):
+        row = self.team(team)
+        row.score_for += scored
+        row.score_against += conceded
+        self.table.update(team, row.sort_key())
+
+    def add_result(self, team:str, scored:float, conceded:float, ppw:float, sign:int=1):
+        row = self.team(team)
+        row.played += sign
+        if scored > conceded:
+            row.won += sign
+            row.points += sign * ppw
+        elif scored < conceded:
+            row.lost += sign
+        else:
+            row.drawn += sign
+        self.table.update(team, row.sort_key())
+
+    def add_goals(self, scorer:tuple[str, str], goals:int):
+        total = self.goals.get(scorer, 0) + goals
+        if total <= 0:
+            self.goals.pop(scorer, None)
+            self.scorers.remove(scorer)
+        else:
+            self.goals[scorer] = total
+            self.scorers.update(scorer, (-total, scorer))
+
+    def to_dict(self, k:int|None=None):
+        return {
+            "comp_id": self.comp_id,
+            "table": [self.teams[team].to_dict() for team in self.table.top(k)],
+            "top_scorers": [{"user_name": name, "team": team, "goals": self.goals[(name, team)]}
+                            for name, team in self.scorers.top(k)],
+        }
+
+class StandingsBoard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.competitions: dict[str, Competition] = {}
+        self.matches: dict[str, MatchEntry] = {}
+
+    def __call__(self, match, event:str, **details):
+        if event == "scored":
+            self.record_goal(match, details.get('answer', None))
+        elif event == "ended":
+            self.record_result(match)
+        elif event == "reset":
+            self.forget(match.match_id, keep_entry=True)
+
+    def _competition(self, comp_id:str) -> Competition:
+        competition = self.competitions.get(comp_id, None)
+        if competition is None:
+            competition = self.competitions[comp_id] = Competition(comp_id)
+        return competition
+
+    def _entry(self, match) -> MatchEntry:
+        entry = self.matches.get(match.match_id, None)
+        if entry is None:
+            entry = self.matches[match.match_id] = MatchEntry(
+                comp_id=competition_id(match.comp_info), home=match.home_team, away=match.away_team,
+                ppw=float(getattr(match, 'PPW', DEFAULT_PPW)))
+            competition = self._competition(entry.comp_id)
+            competition.enter(entry.home)
+            competition.enter(entry.away)
+        return entry
+
+    def _sync_scores(self, entry:MatchEntry, match):
+        competition = self._competition(entry.comp_id)
+        home_delta = float(match.home_score) - entry.home_score
+        away_delta = float(match.away_score) - entry.away_score
+        if home_delta or away_delta:
+            competition.add_scores(entry.home, home_delta, away_delta)
+            competition.add_scores(entry.away, away_delta, home_delta)
+            entry.home_score += home_delta
+            entry.away_score += away_delta
+
+    def track(self, match):
+        with self.lock:
+            entry = self._entry(match)
+            self._sync_scores(entry, match)
+
+    def record_goal(self, match, answer):
+        with self.lock:
+            entry = self._entry(match)
+            self._sync_scores(entry, match)
+            if answer is None:
+                return
+            name = answer.player_info.get('user_name', '')
+            team = answer.player_info.get('user_affiliation', '')
+            if not name:
+                return
+            scorer = (name, team)
+            entry.goals[scorer] = entry.goals.get(scorer, 0) + 1
+            self._competition(entry.comp_id).add_goals(scorer, 1)
+
+    def record_result(self, match):
+        with self.lock:
+            entry = self._entry(match)
+            self._sync_scores(entry, match)
+            if entry.result_applied:
+                return
+            competition = self._competition(entry.comp_id)
+            competition.add_result(entry.home, entry.home_score, entry.away_score, entry.ppw)
+            competition.add_result(entry.away, entry.away_score, entry.home_score, entry.ppw)
+            entry.result_applied = True
+
+    def forget(self, match_id:str, keep_entry:bool=False):
+        # retract everything a match contributed, and the teams and competition it alone brought in
+        with self.lock:
+            entry = self.matches.pop(match_id, None)
+            if entry is None:
+                return
+            competition = self._competition(entry.comp_id)
+            if entry.result_applied:
+                competition.add_result(entry.home, entry.home_score, entry.away_score, entry.ppw, sign=-1)
+                competition.add_result(entry.away, entry.away_score, entry.home_score, entry.ppw, sign=-1)
+            competition.add_scores(entry.home, -entry.home_score, -entry.away_score)
+            competition.add_scores(entry.away, -entry.away_score, -entry.home_score)
+            for scorer, goals in entry.goals.items():
+                competition.add_goals(scorer, -goals)
+            if keep_entry:
+                self.matches[match_id] = MatchEntry(comp_id=entry.comp_id, home=entry.home, away=entry.away, ppw=entry.ppw)
+                return
+            competition.leave(entry.home)
+            competition.leave(entry.away)
+            if not competition.teams:
+                del self.competitions[entry.comp_id]
+
+    def clear(self):
+        with self.lock:
+            self.competitions.clear()
+            self.matches.clear()
+
+    def standings(self, comp_id:str, k:int|None=None) -> dict:
+        with self.lock:
+            competition = self.competitions.get(comp_id, None)
+            if competition is None:
+                raise ValueError('Competition not found')
+            return competition.to_dict(k)
@@ -0,0 +1,61 @@
+"""
+# test_admission.py
+Rate limiting of answer submissions in front of authentication.
+
+Run with: python -m unittest test_admission
+"""
+
+from unittest import mock
+import unittest
+
+from admission import AdmissionController
+from identities import CircuitBreaker, IdentityCache
+import ragnarok
+
+VERIFIED = {"token-a": {"user_id": "67890", "user_name": "hero"}, "token-b": {"user_id": "67890", "user_name": "hero"}}
+
+def introspect(token:str) -> dict:
+    if token not in VERIFIED:
+        raise ValueError("Invalid token")
+    return VERIFIED[token]
+
+class AnswerRateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.identities = IdentityCache(introspect, CircuitBreaker())
+        for patch in (mock.patch.object(ragnarok, 'ADMISSION', AdmissionController(answer_rate=0.01, answer_burst=3)),
+                      mock.patch.object(ragnarok, 'IDENTITIES', self.identities)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def submit(self, token:str, address:str) -> int:
+        client = ragnarok.app.test_client()
+        response = client.post('/matches/no-such-match', json={"selected_option": 0},
+                               headers={"Authorization": f"Bearer {token}"}, environ_overrides={"REMOTE_ADDR": address})
+        return response.status_code
+
+    def test_rotating_tokens(self):
+        # a new unverified token per request still draws from the client's bucket
+        statuses = [self.submit(f"garbage-{i}", "203.0.113.7") for i in range(4)]
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3], 429)
+        self.assertNotEqual(self.submit("garbage-x", "203.0.113.8"), 429)
+
+    def test_verified_user(self):
+        # once verified, a user's tokens share one bucket wherever they come from, and leave the address alone
+        self.identities.resolve("token-a")
+        self.identities.resolve("token-b")
+        statuses = [self.submit("token-a", "203.0.113.9"), self.submit("token-b", "198.51.100.1"),
+                    self.submit("token-a", "198.51.100.2"), self.submit("token-b", "198.51.100.3")]
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3], 429)
+        self.assertNotEqual(self.submit("garbage", "203.0.113.9"), 429)
+
+    def test_known(self):
+        self.assertIsNone(self.identities.known("token-a"))
+        self.identities.resolve("token-a")
+        self.assertEqual(self.identities.known("token-a"), VERIFIED["token-a"])
+        self.assertIsNone(self.identities.known("garbage"))
+        self.assertIsNone(self.identities.known(""))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+# test_logpipeline.py
+Records queued by the log pipeline read as they were when logged.
+
+Run with: python -m unittest test_logpipeline
+"""
+
+import io
+import json
+import logging
+import unittest
+
+from logpipeline import LogPipeline
+
+class DeferredFormattingTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger("test_logpipeline")
+        self.logger.propagate = False
+        self.pipeline = LogPipeline(fmt='json', stream=self.stream)
+        self.logger.addHandler(self.pipeline.handler)
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.removeHandler, self.pipeline.handler)
+
+    def messages(self) -> list[str]:
+        # the listener isn't started, the queue is drained here after the caller is done with its arguments
+        while not self.pipeline.queue.empty():
+            self.pipeline.output.handle(self.pipeline.queue.get_nowait())
+        return [json.loads(line)["message"] for line in self.stream.getvalue().splitlines()]
+
+    def test_mutated_after_logging(self):
+        scores = {"home": 1}
+        scorers = ["hero"]
+        self.logger.info("Scores %s by %s", scores, scorers)
+        self.logger.info("Scores %(scores)s", {"scores": scores})
+        self.logger.info(scorers)
+        scores["home"] = 2
+        scorers.append("villain")
+        self.assertEqual(self.messages(), ["Scores {'home': 1} by ['hero']", "Scores {'home': 1}", "['hero']"])
+
+    def test_settled_arguments_stay_deferred(self):
+        self.logger.info("Match %s at %d after %.1fs, %s", "m-1", 3, 2.5, None)
+        record = self.pipeline.queue.get_nowait()
+        self.assertEqual(record.args, ("m-1", 3, 2.5, None))
+        self.assertEqual(record.getMessage(), "Match m-1 at 3 after 2.5s, None")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+# test_matchstore.py
+Round trips of matches through the SQLite match store.
+
+Run with: python -m unittest test_matchstore
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import unittest
+
+from adapters.abstract import QuestionSource
+from adapters.HouseBamzy import HouseBamzyMatch
+from matchstore import SQLiteMatchStore
+
+def new_match(match_id:str, standby:bool=False) -> HouseBamzyMatch:
+    match = HouseBamzyMatch(logger=None, kwargs={"match_id": match_id, "home_team": "Alpha", "away_team": "Beta"})
+    if standby:
+        match._initialize_match()  # with the whole bank still unopened
+    return match
+
+class SQLiteMatchStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "matches.db")
+
+    def body(self, match_id:str) -> bytes:
+        with sqlite3.connect(self.path) as connection:
+            (body,) = connection.execute("SELECT body FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        return body
+
+    def test_unopened_questions(self):
+        match = new_match("standby", standby=True)
+        store = SQLiteMatchStore(self.path)
+        store.add(match)
+
+        # the bank pickles as its counters and arguments, not as another copy of the match
+        bare = new_match("bare", standby=True)
+        bare.questions = QuestionSource()
+        store.add(bare)
+        self.assertLess(len(self.body("standby")) - len(self.body("bare")), 64)
+
+        restored = SQLiteMatchStore(self.path).find("standby")
+        self.assertIsNot(restored, match)
+        self.assertIs(restored.questions.factory.func.__self__, restored)
+        self.assertEqual(len(restored.questions), len(match.questions))
+        self.assertEqual(list(restored.questions), list(match.questions))
+
+    def test_questions_after_pop(self):
+        match = new_match("popped", standby=True)
+        first = match.questions.pop()
+        restored = pickle.loads(pickle.dumps(match))
+        self.assertEqual(restored.questions.served, 1)
+        self.assertEqual(restored.questions.pop(), match.questions.pop())
+        self.assertNotEqual(first, match.questions.pop())
+
+    def test_empty_source(self):
+        restored = pickle.loads(pickle.dumps(new_match("upcoming")))
+        self.assertIsInstance(restored.questions, QuestionSource)
+        self.assertEqual(len(restored.questions), 0)
+
+if __name__ == '__main__':
+    unittest.main()
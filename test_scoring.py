@@ -0,0 +1,101 @@
+"""
+# test_scoring.py
+Pins HouseBamzy's compiled ScoreTable to the scores and events the per-step bonus and streak methods it replaced
+produced for the same answers.
+
+Run with: python -m unittest test_scoring
+"""
+
+from datetime import datetime, timedelta, timezone
+import pickle
+import unittest
+
+from adapters.HouseBamzy import HouseBamzyMatch, MultiChoiceQuestion
+from adapters.scoring import ScoringRules
+
+SENT = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HERO = ("hero", "Alpha", 7.0)  # (user_name, affiliation, seconds after sendDate), outside the W2S window
+
+def new_match(**kwargs) -> HouseBamzyMatch:
+    return HouseBamzyMatch(logger=None, kwargs={"match_id": "score-test", "home_team": "Alpha", "away_team": "Beta",
+                                                **kwargs})
+
+def play(match:HouseBamzyMatch, questions:list[tuple[list[tuple[str, str, float]], float]]):
+    # records each question's correct answers and returns the (home, away) score after each, plus the events
+    events = []
+    match.observers.append(lambda m, event, **details: events.append(
+        (event, details['answer'].player_info['user_name'], details.get('points', None)))
+        if event in ("bonus", "scored") else None)
+    match.state = 2
+    scores = []
+    for answers, points in questions:
+        question = MultiChoiceQuestion(question_id="q", points=1, sendDate=SENT, duration=timedelta(seconds=10))
+        correct = [MultiChoiceQuestion.Answer(player_info={"user_name": name, "user_affiliation": team, "user_id": name},
+                                              time_received=SENT + timedelta(seconds=seconds), selected_option=0)
+                   for name, team, seconds in answers]
+        match.scoring.record(match, question, correct, points)
+        scores.append((match.home_score, match.away_score))
+    return scores, events
+
+class ScoreTableTest(unittest.TestCase):
+    def test_compiled_rules(self):
+        table = new_match().scoring
+        self.assertEqual(table.by_streak, (1, 1, 1, 2, 3))
+        self.assertEqual(table.streak_reset, 4)
+        self.assertEqual(table.time_bonuses, ((2.0, 5.0),))
+        self.assertTrue(table.carry_points)
+        self.assertEqual(ScoringRules().compile().by_streak, (1, 1))
+        with self.assertRaises(ValueError):
+            ScoringRules(multipliers=((0, 2),)).compile()
+
+    def test_streak(self):
+        # double on the third in a row, triple on the fourth; the run is counted from the scorers again afterwards,
+        # so it keeps tripling
+        scores, _ = play(new_match(), [([HERO], 0.0)] * 6)
+        self.assertEqual(scores, [(1.0, 0), (2.0, 0), (4.0, 0), (7.0, 0), (10.0, 0), (13.0, 0)])
+        scores, _ = play(new_match(), [([HERO], 2.0)] * 6)
+        self.assertEqual(scores, [(2.0, 0), (4.0, 0), (8.0, 0), (14.0, 0), (20.0, 0), (26.0, 0)])
+
+    def test_streak_broken(self):
+        scores, _ = play(new_match(), [([HERO], 0.0), ([HERO], 0.0), ([("villain", "Beta", 7.0)], 0.0), ([HERO], 0.0)])
+        self.assertEqual(scores, [(1.0, 0), (2.0, 0), (2.0, 1.0), (3.0, 1.0)])
+
+    def test_carry_points(self):
+        # multiplied points carry into the next correct answers of the same question, for either team
+        questions = [([HERO], 0.0)] * 2 + [([HERO, ("ace", "Alpha", 7.0), ("villain", "Beta", 7.0)], 0.0)]
+        scores, events = play(new_match(), questions)
+        self.assertEqual(scores, [(1.0, 0), (2.0, 0), (8.0, 8.0)])
+        self.assertEqual([name for _, name, _ in events], ["hero", "hero", "hero", "ace", "villain"])
+        questions[-1] = (questions[-1][0], 2.0)
+        scores, _ = play(new_match(), questions)
+        self.assertEqual(scores, [(1.0, 0), (2.0, 0), (14.0, 16.0)])
+
+    def test_bonus(self):
+        # the window includes its edge, and answers from neither team score nothing
+        questions = [([("hero", "Alpha", 2.0)], 0.0), ([("villain", "Beta", 2.5)], 0.0),
+                     ([("impostor", "Gamma", 1.0)], 0.0)]
+        scores, events = play(new_match(), questions)
+        self.assertEqual(scores, [(6.0, 0), (6.0, 1.0), (6.0, 1.0)])
+        self.assertEqual(events, [("bonus", "hero", 5.0), ("scored", "hero", None), ("scored", "villain", None)])
+
+    def test_zero_bonus(self):
+        # a W2S of 0.0 still reports the bonus, worth nothing
+        match = new_match()
+        match.state = -1
+        match.update_match(W2S=0.0)
+        self.assertEqual(match.scoring.time_bonuses, ((2.0, 0.0),))
+        scores, events = play(match, [([("hero", "Alpha", 0.5)], 0.0)])
+        self.assertEqual(scores, [(1.0, 0)])
+        self.assertEqual(events, [("bonus", "hero", 0.0), ("scored", "hero", None)])
+
+    def test_pickle(self):
+        match = new_match()
+        self.assertEqual(pickle.loads(pickle.dumps(match)).scoring, match.scoring)
+        state = match.__getstate__()
+        del state['scoring']  # pickled before matches kept their table
+        restored = HouseBamzyMatch.__new__(HouseBamzyMatch)
+        restored.__setstate__(state)
+        self.assertEqual(restored.scoring, match.scoring)
+
+if __name__ == '__main__':
+    unittest.main()